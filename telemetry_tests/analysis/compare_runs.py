@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# metrics.py (imported by the workers) lives next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+'''
+Compare every run under a results tree (baseline, loss_5, delay_jitter,
+reorder, ...) in one table plus overlay plots.
+
+Each log is summarized once with metrics.StreamingSummary (constant
+memory) in a process pool. The summary is cached next to the log as
+<log>.summary.json, keyed by the log's size and mtime. On a rerun,
+unchanged logs cost one stat() and one small JSON read. The plots are
+stamped with the runs they show (run directory and cache key of each
+log); when the stamp still matches and the outputs exist, they are not
+redrawn either, so pandas and matplotlib are never imported. Adding,
+removing or renaming a run changes the stamp and forces a replot.
+
+    python compare_runs.py --results ../results
+'''
+
+CACHE_VERSION = 2          # 2: packet and byte counts weighted by sample_weight
+CACHE_SUFFIX = ".summary.json"
+LOG_NAMES = ("logging.csv", "logging.bin")
+SERIES_POINTS = 512        # points per cached over-time series
+RUN_STAMP = re.compile(r"_\d{8}_\d{6}$")     # run dirs end in _YYYYmmdd_HHMMSS
+
+TABLE_FILE = "comparison.csv"
+PLOT_FILES = ("compare_latency_cdf.png", "compare_jitter.png", "compare_throughput.png")
+PLOT_STAMP = ".compare_plots.json"     # runs the current plots were drawn from
+
+COLUMNS = [
+    # (header, metrics key, format)
+    ("packets", "packets", "{:.0f}"),
+    ("dup%", "dup_rate", "{:.2%}"),
+    ("reorder%", "reorder_rate", "{:.2%}"),
+    ("gaps", "gaps", "{:.0f}"),
+    ("lat_avg", "avg_latency", "{:.1f}"),
+    ("lat_p99", "latency_p99", "{:.1f}"),
+    ("jit_avg", "avg_jitter", "{:.1f}"),
+    ("jit_p99", "jitter_p99", "{:.1f}"),
+    ("bytes/s", "throughput", "{:.1f}"),
+]
+
+
+# ===========================================================
+# DISCOVERY
+# ===========================================================
+def find_logs(root):
+    logs = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in LOG_NAMES:
+            if name in filenames:
+                logs.append(os.path.join(dirpath, name))
+    return sorted(logs)
+
+
+def scenario_of(log_path):
+    return RUN_STAMP.sub("", os.path.basename(os.path.dirname(log_path)))
+
+
+def cache_key(log_path):
+    st = os.stat(log_path)
+    return {"version": CACHE_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+# ===========================================================
+# CACHE
+# ===========================================================
+def load_cached(log_path, key):
+    try:
+        with open(log_path + CACHE_SUFFIX) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached if cached.get("key") == key else None
+
+
+def summarize_run(log_path):
+    """Worker: streams one log and writes its cache file. Returns the summary."""
+    from metrics import stream_summary, QUANTILES
+
+    key = cache_key(log_path)
+    summary = stream_summary(log_path)
+    if summary.packets == 0:
+        result = {"key": key, "metrics": None}
+    else:
+        metrics = summary.result()
+        flat = {k: float(v) for k, v in metrics.items() if not k.endswith("_quantiles")}
+        for name in ("latency", "jitter"):
+            for q, value in zip(QUANTILES, metrics[f"{name}_quantiles"]):
+                flat[f"{name}_p{q * 100:g}"] = float(value)
+
+        values, counts = summary.latency_sketch.buckets()
+        result = {
+            "key": key,
+            "metrics": flat,
+            "latency_buckets": [values.tolist(), counts.tolist()],
+            "jitter_series": _series(summary.jitter_series),
+            "throughput_series": _series(summary.throughput_series),
+        }
+
+    # write-then-rename: an interrupted run never leaves a half-written cache
+    tmp_path = log_path + CACHE_SUFFIX + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, log_path + CACHE_SUFFIX)
+    return result
+
+
+def _series(downsampler):
+    index, means = downsampler.series()
+    step = max(1, -(-len(index) // SERIES_POINTS))
+    return [index[::step].tolist(), means[::step].tolist()]
+
+
+def collect(logs, workers=None):
+    """Summaries for all logs; only stale or missing ones are recomputed."""
+    summaries, stale = {}, []
+    for log_path in logs:
+        cached = load_cached(log_path, cache_key(log_path))
+        if cached is None:
+            stale.append(log_path)
+        else:
+            summaries[log_path] = cached
+
+    if len(stale) == 1 or workers == 1:
+        results = [summarize_run(log_path) for log_path in stale]
+    elif stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(summarize_run, stale))
+    else:
+        results = []
+
+    for log_path, result in zip(stale, results):
+        summaries[log_path] = result
+        print(f"[SUMMARY] {log_path}")
+
+    return summaries, len(stale)
+
+
+# ===========================================================
+# OUTPUT
+# ===========================================================
+def print_table(rows, out_path):
+    name_width = max([len("run")] + [len(name) for name, _ in rows])
+    header = f"{'run':<{name_width}} " + " ".join(f"{h:>10}" for h, _, _ in COLUMNS)
+    print(header)
+    print("-" * len(header))
+
+    with open(out_path, "w") as f:
+        f.write(",".join(["run", "scenario"] + [key for _, key, _ in COLUMNS]) + "\n")
+        for name, summary in rows:
+            m = summary["metrics"]
+            if m is None:
+                print(f"{name:<{name_width}} (empty log)")
+                continue
+            print(f"{name:<{name_width}} " +
+                  " ".join(f"{fmt.format(m[key]):>10}" for _, key, fmt in COLUMNS))
+            f.write(",".join([name, summary["scenario"]] +
+                             [repr(m[key]) for _, key, _ in COLUMNS]) + "\n")
+
+
+def plot_overlays(rows, out_dir):
+    import numpy as np
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    scenarios = sorted({summary["scenario"] for _, summary in rows})
+    colors = {s: plt.cm.tab10(i % 10) for i, s in enumerate(scenarios)}
+
+    figures = [plt.figure(figsize=(8, 5)) for _ in PLOT_FILES]
+    labelled = set()
+    for name, summary in rows:
+        if summary["metrics"] is None:
+            continue
+        scenario = summary["scenario"]
+        style = dict(color=colors[scenario], alpha=0.8,
+                     label=None if scenario in labelled else scenario)
+        labelled.add(scenario)
+
+        values, counts = summary["latency_buckets"]
+        cdf = np.cumsum(counts) / max(sum(counts), 1)
+        figures[0].gca().step(values, cdf, where="post", **style)
+        figures[1].gca().plot(*summary["jitter_series"], **style)
+        figures[2].gca().plot(*summary["throughput_series"], **style)
+
+    titles = [("Latency CDF", "Latency (ms)", "Fraction of packets"),
+              ("Jitter Over Time", "Packet Index", "Jitter (ms)"),
+              ("Throughput Over Time", "Packet Index", "Bytes/sec")]
+    for figure, (title, xlabel, ylabel), filename in zip(figures, titles, PLOT_FILES):
+        ax = figure.gca()
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.grid(True)
+        ax.legend()
+        figure.savefig(os.path.join(out_dir, filename))
+        plt.close(figure)
+
+
+def plot_stamp(rows):
+    return {"version": CACHE_VERSION,
+            "runs": sorted([name, summary["key"]] for name, summary in rows)}
+
+
+def load_stamp(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def compare(root, workers=None, force_plots=False):
+    started = time.perf_counter()
+    logs = find_logs(root)
+    if not logs:
+        print(f"No {' / '.join(LOG_NAMES)} under {root}")
+        return
+
+    summaries, recomputed = collect(logs, workers)
+
+    rows = []
+    for log_path in logs:
+        summary = summaries[log_path]
+        summary["scenario"] = scenario_of(log_path)
+        rows.append((os.path.relpath(os.path.dirname(log_path), root), summary))
+    rows.sort(key=lambda row: (row[1]["scenario"], row[0]))
+
+    print_table(rows, os.path.join(root, TABLE_FILE))
+
+    outputs = [os.path.join(root, name) for name in PLOT_FILES]
+    stamp_path = os.path.join(root, PLOT_STAMP)
+    stamp = plot_stamp(rows)
+    if (recomputed or force_plots or load_stamp(stamp_path) != stamp
+            or not all(os.path.exists(p) for p in outputs)):
+        plot_overlays(rows, root)
+        with open(stamp_path, "w") as f:
+            json.dump(stamp, f)
+        plotted = "redrawn"
+    else:
+        plotted = "unchanged"
+
+    print(f"\n[COMPARE] {len(logs)} runs ({recomputed} summarized, "
+          f"{len(logs) - recomputed} cached) | plots {plotted} | "
+          f"{time.perf_counter() - started:.2f}s")
+    print(f"Saved in: {root} ({TABLE_FILE}, {', '.join(PLOT_FILES)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results"),
+                        help="Results tree to scan for logging.csv / logging.bin")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for summarizing runs (default: CPU count)")
+    parser.add_argument("--replot", action="store_true",
+                        help="Redraw the overlay plots even if no run changed")
+    args = parser.parse_args()
+
+    compare(os.path.abspath(args.results), workers=args.workers, force_plots=args.replot)
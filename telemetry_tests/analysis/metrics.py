@@ -1,94 +1,395 @@
 import pandas as pd
 import argparse
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
-def analyze_csv(csv_file):
-    df = pd.read_csv(csv_file)
+# binary log reader lives next to the server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "project"))
+from binlog import BinaryLogReader, is_binary_log
+from sketch import QuantileSketch, Downsampler, SKETCH_ALPHA, MAX_POINTS
 
-    if len(df) == 0:
-        print("Empty CSV!")
-        return
+CHUNK_ROWS = 100_000       # rows per chunk in --stream mode
+THROUGHPUT_WINDOW = 20     # packets in the sliding throughput window
+QUANTILES = (0.5, 0.95, 0.99)
+JITTER_GAIN = 1 / 16       # RFC 3550 interarrival jitter filter gain
+TS_WRAP = 1 << 32          # sender timestamps are 32-bit milliseconds
 
-    print("\n==============================")
-    print(f" ANALYZING: {csv_file}")
-    print("==============================")
 
-    packets = len(df)
+def with_weights(df):
+    """
+    Logs from before sample_weight (or without --shed-rows sampling): every
+    row stands for one packet.
+    """
+    if "sample_weight" not in df:
+        df["sample_weight"] = 1
+    return df
+
+
+def split_events(df):
+    """
+    (packet rows, event rows). Event rows (disconnects and handovers logged
+    by the server's liveness monitor) are not packets and stay out of every
+    packet metric. Logs from before the event column have none.
+    """
+    if "event" not in df:
+        return df, df.iloc[:0].assign(event="")
+    is_event = df["event"].fillna("") != ""
+    if not is_event.any():
+        return df, df.iloc[:0]
+    return df[~is_event].reset_index(drop=True), df[is_event]
 
-    # -------------------------
-    # BASIC STATS
-    # -------------------------
-    dup_rate = df["duplicate_flag"].sum() / packets
-    gaps = df["gap_flag"].sum()
-    reorder_rate = df["reorder_flag"].sum() / packets
 
-    avg_payload = df["payload_size"].mean()
-    bytes_per_report = 10 + avg_payload
-    batch_percent = (df["is_batch"].sum() / packets) * 100
+def load_log(path):
+    # binary logs (TLOG magic) are memory-mapped, no text parsing
+    if is_binary_log(path):
+        return BinaryLogReader(path).to_dataframe()
+    return with_weights(pd.read_csv(path))
+
+
+# ===========================================================
+# IN-MEMORY SUMMARY
+# ===========================================================
+def summarize(df, events=None):
+    """
+    Metrics of a whole log's packet rows (see split_events); adds the
+    `latency` column to df. Packet and byte counts are weighted by
+    sample_weight (clean rows sampled out under load); latency and jitter
+    are over the logged rows.
+    """
+    weight = df["sample_weight"]
+    packets = int(weight.sum())
 
     # -------------------------
     # LATENCY CALCULATION
     # -------------------------
     df["latency"] = df["arrival_time"].diff().fillna(0)
 
-
-    avg_latency = df["latency"].mean()
-    max_latency = df["latency"].max()
-
     # -------------------------
     # JITTER CALCULATION
     # -------------------------
     latency_diff = df["latency"].diff().abs().dropna()
-    avg_jitter = latency_diff.mean()
-
-    print("\n--- JITTER ---")
-    print(f"Avg jitter (ms)  : {avg_jitter:.2f}")
 
     # -------------------------
     # THROUGHPUT (bytes per second)
     # -------------------------
-    total_bytes = df["payload_size"].sum()
-    
+    total_bytes = (df["payload_size"] * weight).sum()
+
     # total test duration in seconds
     start_time = df["arrival_time"].min()
     end_time = df["arrival_time"].max()
-    duration_ms = end_time - start_time
-    duration_sec = max(duration_ms / 1000, 1e-9)
+    duration_sec = max((end_time - start_time) / 1000, 1e-9)
+
+    return {
+        "packets": packets,
+        "rows": len(df),
+        "dup_rate": df["duplicate_flag"].sum() / packets,
+        "reorder_rate": df["reorder_flag"].sum() / packets,
+        "gaps": int(df["gap_flag"].sum()),
+        "avg_payload": total_bytes / packets,
+        "batch_percent": ((df["is_batch"] * weight).sum() / packets) * 100,
+        "avg_latency": df["latency"].mean(),
+        "max_latency": df["latency"].max(),
+        "latency_quantiles": np.quantile(df["latency"], QUANTILES, method="lower"),
+        "avg_jitter": latency_diff.mean(),
+        "jitter_quantiles": np.quantile(latency_diff, QUANTILES, method="lower") if len(latency_diff) else
+                            np.full(len(QUANTILES), np.nan),
+        "total_bytes": int(total_bytes),
+        "duration_sec": duration_sec,
+        "throughput": total_bytes / duration_sec,
+        "disconnects": 0 if events is None else int((events["event"] == "disconnect").sum()),
+    }, latency_diff
+
+
+# ===========================================================
+# PER-DEVICE ONE-WAY DELAY AND RFC 3550 JITTER
+# ===========================================================
+def unwrap_timestamps(device, timestamp):
+    """
+    32-bit sender timestamps -> monotonic per device, in log order. A step
+    back by more than half the range is a wrap; a step forward by more
+    than half is a reordered packet from before the wrap.
+    """
+    timestamp = timestamp.astype("int64")
+    step = timestamp.groupby(device).diff()
+    wraps = (step < -TS_WRAP // 2).astype("int64") - (step > TS_WRAP // 2).astype("int64")
+    return timestamp + wraps.groupby(device).cumsum() * TS_WRAP
+
+
+def per_device_delay(df):
+    """
+    Per-device one-way delay and RFC 3550 interarrival jitter, all grouped
+    pandas operations (no per-row or per-device Python loop).
+
+    delay   arrival_time - unwrapped sender timestamp, minus the device's
+            minimum: the unknown clock offset between sender and server
+            cancels out, leaving the delay above the fastest packet
+    jitter  J += (|D| - J) / 16 with D the delay difference of consecutive
+            packets (RFC 3550 6.4.1): an EWM with alpha=1/16 that starts
+            at 0 for each device
+
+    Duplicates are left out. Returns one row per device.
+    """
+    data = df.loc[df["duplicate_flag"] == 0, ["device_id", "timestamp", "arrival_time"]]
+    device = data["device_id"]
+
+    sent = unwrap_timestamps(device, data["timestamp"])
+    delay = (data["arrival_time"] - sent).astype("float64")
+    delay -= delay.groupby(device).transform("min")
+
+    transit_change = delay.groupby(device).diff().abs().fillna(0.0)
+    jitter = (transit_change.groupby(device)
+              .ewm(alpha=JITTER_GAIN, adjust=False).mean()
+              .droplevel(0))
+
+    frame = pd.DataFrame({"delay": delay, "jitter": jitter})
+    grouped = frame.groupby(device)
+
+    table = grouped.quantile(list(QUANTILES), interpolation="lower").unstack()
+    table.columns = [f"{column}_p{q * 100:g}" for column, q in table.columns]
+    table.insert(0, "packets", grouped.size())
+    table["jitter_last"] = grouped["jitter"].last()
+    return table
+
+
+def print_per_device(table, output_dir, worst=5):
+    print("\n--- PER-DEVICE DELAY / RFC 3550 JITTER ---")
+    print(f"Devices           : {len(table)}")
+    for column in ("delay", "jitter"):
+        p99 = table[f"{column}_p99"]
+        print(f"{column.capitalize():<6} p99 (ms)   : median device={p99.median():.2f} "
+              f"worst device={p99.max():.2f}")
+
+    print(f"Worst {min(worst, len(table))} devices by jitter p99:")
+    print(table.nlargest(worst, "jitter_p99").round(2).to_string())
+
+    path = os.path.join(output_dir, "per_device_delay.csv")
+    table.round(3).to_csv(path)
+    print(f"Per-device table  : {path}")
+
+
+# ===========================================================
+# STREAMING SUMMARY
+# ===========================================================
+class StreamingSummary:
+    """
+    Same metrics as summarize(), fed one chunk at a time. Counters are
+    plain sums, latency/jitter quantiles come from QuantileSketch, and the
+    over-time series from Downsampler, so memory does not grow with the
+    log. Inter-arrival state is carried across chunk boundaries, which
+    makes the result independent of the chunk size.
+    """
+
+    def __init__(self, alpha=SKETCH_ALPHA, max_points=MAX_POINTS):
+        self.packets = 0           # weighted by sample_weight
+        self.rows = 0
+        self.duplicates = 0
+        self.reorders = 0
+        self.gaps = 0
+        self.batches = 0
+        self.disconnects = 0       # event rows, not counted as packets
+        self.total_bytes = 0
+        self.start_time = None
+        self.end_time = None
+
+        self.latency_sum = 0.0
+        self.latency_max = -np.inf
+        self.jitter_sum = 0.0
+        self.jitter_count = 0
+        self.latency_sketch = QuantileSketch(alpha)
+        self.jitter_sketch = QuantileSketch(alpha)
+
+        self.jitter_series = Downsampler(max_points)
+        self.throughput_series = Downsampler(max_points)
+
+        self._last_arrival = None
+        self._last_latency = None
+        self._window_tail = np.empty(0)     # last payload sizes for the rolling window
 
-    throughput = total_bytes / duration_sec
+    def update(self, chunk):
+        chunk, events = split_events(chunk)
+        self.disconnects += int((events["event"] == "disconnect").sum())
+        n = len(chunk)
+        if n == 0:
+            return
+        weight = chunk["sample_weight"].to_numpy(dtype=np.int64)
+        self.rows += n
+        self.packets += int(weight.sum())
+        self.duplicates += int(chunk["duplicate_flag"].sum())
+        self.reorders += int(chunk["reorder_flag"].sum())
+        self.gaps += int(chunk["gap_flag"].sum())
+        self.batches += int((chunk["is_batch"].to_numpy() * weight).sum())
 
+        payload = chunk["payload_size"].to_numpy(dtype=np.float64) * weight
+        self.total_bytes += int(payload.sum())
 
-    print(f"Packets received  : {packets}")
-    print(f"Duplicate rate    : {dup_rate:.2%}")
-    print(f"Reorder rate      : {reorder_rate:.2%}")
-    print(f"Sequence gaps     : {gaps}")
-    print(f"Avg payload bytes : {avg_payload:.2f}")
+        arrival = chunk["arrival_time"].to_numpy(dtype=np.int64)
+        lo, hi = int(arrival.min()), int(arrival.max())
+        self.start_time = lo if self.start_time is None else min(self.start_time, lo)
+        self.end_time = hi if self.end_time is None else max(self.end_time, hi)
+
+        # latency: arrival diff, 0 for the very first row (fillna(0))
+        first = arrival[0] if self._last_arrival is None else self._last_arrival
+        latency = np.diff(arrival, prepend=first).astype(np.float64)
+        self.latency_sum += float(latency.sum())
+        self.latency_max = max(self.latency_max, float(latency.max()))
+        self.latency_sketch.update(latency)
+
+        # jitter: |latency diff|, none for the very first row (dropna)
+        if self._last_latency is None:
+            jitter = np.abs(np.diff(latency))
+        else:
+            jitter = np.abs(np.diff(latency, prepend=self._last_latency))
+        self.jitter_sum += float(jitter.sum())
+        self.jitter_count += len(jitter)
+        self.jitter_sketch.update(jitter)
+        self.jitter_series.update(jitter)
+
+        # rolling window over the packet index, continued across chunks
+        window = np.concatenate([self._window_tail, payload])
+        sums = np.convolve(window, np.ones(THROUGHPUT_WINDOW), mode="valid")
+        self.throughput_series.update(sums * (1000 / THROUGHPUT_WINDOW))
+        self._window_tail = window[-(THROUGHPUT_WINDOW - 1):]
+
+        self._last_arrival = int(arrival[-1])
+        self._last_latency = float(latency[-1])
+
+    def result(self):
+        packets = max(self.packets, 1)
+        duration_sec = max((self.end_time - self.start_time) / 1000, 1e-9)
+        return {
+            "packets": self.packets,
+            "rows": self.rows,
+            "dup_rate": self.duplicates / packets,
+            "reorder_rate": self.reorders / packets,
+            "gaps": self.gaps,
+            "avg_payload": self.total_bytes / packets,
+            "batch_percent": self.batches / packets * 100,
+            "avg_latency": self.latency_sum / max(self.rows, 1),
+            "max_latency": self.latency_max,
+            "latency_quantiles": np.array([self.latency_sketch.quantile(q) for q in QUANTILES]),
+            "avg_jitter": self.jitter_sum / self.jitter_count if self.jitter_count else np.nan,
+            "jitter_quantiles": np.array([self.jitter_sketch.quantile(q) for q in QUANTILES]),
+            "total_bytes": self.total_bytes,
+            "duration_sec": duration_sec,
+            "throughput": self.total_bytes / duration_sec,
+            "disconnects": self.disconnects,
+        }
+
+
+def iter_log_chunks(path, chunksize=CHUNK_ROWS):
+    if is_binary_log(path):
+        return BinaryLogReader(path).iter_dataframes(chunksize)
+    return (with_weights(chunk) for chunk in pd.read_csv(path, chunksize=chunksize))
+
+
+def stream_summary(path, chunksize=CHUNK_ROWS):
+    summary = StreamingSummary()
+    for chunk in iter_log_chunks(path, chunksize):
+        summary.update(chunk)
+    return summary
+
+
+# ===========================================================
+# REPORT
+# ===========================================================
+def _quantiles(values):
+    return " ".join(f"p{q * 100:g}={v:.2f}" for q, v in zip(QUANTILES, values))
+
+
+def print_metrics(m):
+    bytes_per_report = 10 + m["avg_payload"]
+
+    print(f"Packets received  : {m['packets']}")
+    if m["rows"] != m["packets"]:
+        print(f"Rows logged       : {m['rows']} (clean rows sampled under load, "
+              f"counts scaled by sample_weight)")
+    print(f"Duplicate rate    : {m['dup_rate']:.2%}")
+    print(f"Reorder rate      : {m['reorder_rate']:.2%}")
+    print(f"Sequence gaps     : {m['gaps']}")
+    print(f"Avg payload bytes : {m['avg_payload']:.2f}")
     print(f"Bytes/report      : {bytes_per_report:.2f}")
-    print(f"Batch %           : {batch_percent:.1f}%")
+    print(f"Batch %           : {m['batch_percent']:.1f}%")
+    if m["disconnects"]:
+        print(f"Disconnects       : {m['disconnects']}")
 
     print("\n--- LATENCY ---")
-    print(f"Avg latency (ms)  : {avg_latency:.2f}")
-    print(f"Max latency (ms)  : {max_latency:.2f}")
+    print(f"Avg latency (ms)  : {m['avg_latency']:.2f}")
+    print(f"Max latency (ms)  : {m['max_latency']:.2f}")
+    print(f"Quantiles (ms)    : {_quantiles(m['latency_quantiles'])}")
 
     print("\n--- JITTER ---")
-    print(f"Avg jitter (ms)   : {avg_jitter:.2f}")
+    print(f"Avg jitter (ms)   : {m['avg_jitter']:.2f}")
+    print(f"Quantiles (ms)    : {_quantiles(m['jitter_quantiles'])}")
 
     print("\n--- THROUGHPUT ---")
-    print(f"Throughput (bytes/sec): {throughput:.2f}")
+    print(f"Throughput (bytes/sec): {m['throughput']:.2f}")
+
+
+def _header(csv_file):
+    print("\n==============================")
+    print(f" ANALYZING: {csv_file}")
+    print("==============================")
 
 
-    # ---------------------------------------------------------------------------
-    # ---------------------------------------------------------------------------
-    #                               PLOTTING
-    # ---------------------------------------------------------------------------
-    # ---------------------------------------------------------------------------
-    output_dir = os.path.dirname(csv_file)
+def analyze_csv(csv_file, stream=False, chunksize=CHUNK_ROWS, per_device=False):
+    if stream:
+        if per_device:
+            print("[per-device] tables need the whole log; skipped in --stream mode")
+        return analyze_stream(csv_file, chunksize)
 
+    df, events = split_events(load_log(csv_file))
+
+    if len(df) == 0:
+        print("Empty CSV!")
+        return
+
+    _header(csv_file)
+    metrics, latency_diff = summarize(df, events)
+    print_metrics(metrics)
+
+    window_size = THROUGHPUT_WINDOW
+    df["throughput_window"] = (df["payload_size"] * df["sample_weight"]).rolling(window_size).sum() \
+        * (1000 / window_size)
+
+    plot_metrics(os.path.dirname(csv_file), df["latency"],
+                 pd.Series(latency_diff.values), df["throughput_window"])
+
+    if per_device:
+        print_per_device(per_device_delay(df), os.path.dirname(csv_file))
+
+
+def analyze_stream(csv_file, chunksize=CHUNK_ROWS):
+    """analyze_csv() in constant memory: the log is read chunk by chunk."""
+    summary = stream_summary(csv_file, chunksize)
+
+    if summary.packets == 0:
+        print("Empty CSV!")
+        return
+
+    _header(csv_file)
+    print_metrics(summary.result())
+
+    # plots from the sketch buckets and the downsampled series
+    latency, counts = summary.latency_sketch.buckets()
+    jitter_index, jitter = summary.jitter_series.series()
+    window_index, throughput = summary.throughput_series.series()
+    plot_metrics(os.path.dirname(csv_file), latency,
+                 pd.Series(jitter, index=jitter_index),
+                 pd.Series(throughput, index=window_index + THROUGHPUT_WINDOW - 1),
+                 latency_weights=counts)
+
+
+# ---------------------------------------------------------------------------
+# ---------------------------------------------------------------------------
+#                               PLOTTING
+# ---------------------------------------------------------------------------
+# ---------------------------------------------------------------------------
+def plot_metrics(output_dir, latency, jitter, throughput, latency_weights=None):
     # 1. Latency Distribution
     plt.figure(figsize=(8, 5))
-    plt.hist(df["latency"], bins=30, color='blue', alpha=0.7)
+    plt.hist(latency, bins=30, weights=latency_weights, color='blue', alpha=0.7)
     plt.title("Latency Distribution")
     plt.xlabel("Latency (ms)")
     plt.ylabel("Frequency")
@@ -98,7 +399,7 @@ def analyze_csv(csv_file):
 
     # 2. Jitter Over Time
     plt.figure(figsize=(8, 5))
-    plt.plot(latency_diff.values, color='purple')
+    plt.plot(jitter, color='purple')
     plt.title("Jitter Over Time")
     plt.xlabel("Packet Index")
     plt.ylabel("Jitter (ms)")
@@ -107,11 +408,8 @@ def analyze_csv(csv_file):
     plt.close()
 
     # 3. Throughput Over Time (Sliding window)
-    window_size = 20
-    df["throughput_window"] = df["payload_size"].rolling(window_size).sum() * (1000 / window_size)
-
     plt.figure(figsize=(8, 5))
-    plt.plot(df["throughput_window"], color='green')
+    plt.plot(throughput, color='green')
     plt.title("Throughput Over Time")
     plt.xlabel("Packet Index")
     plt.ylabel("Bytes/sec")
@@ -143,7 +441,14 @@ def analyze_csv(csv_file):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--csv", required=True, help="Path to CSV log file")
+    parser.add_argument("--csv", required=True, help="Path to CSV (or .bin) log file")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the log in chunks with constant memory (for very large logs)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS,
+                        help="Rows per chunk in --stream mode")
+    parser.add_argument("--per-device", action="store_true",
+                        help="Per-device one-way delay and RFC 3550 jitter percentiles")
     args = parser.parse_args()
 
-    analyze_csv(args.csv)
+    analyze_csv(args.csv, stream=args.stream, chunksize=args.chunksize,
+                per_device=args.per_device)
@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+
+'''
+Bounded-memory summaries for streaming log analysis.
+
+QuantileSketch   log-bucketed quantile sketch (DDSketch style). Every
+                 value lands in bucket ceil(log_gamma(|x|)), so any
+                 quantile is returned within `alpha` relative error.
+                 Two sketches merge by adding bucket counts, so per-chunk
+                 or per-file sketches combine into exactly the sketch of
+                 the concatenated data.
+Downsampler      keeps at most `max_points` means of a series. When full,
+                 neighbouring points are averaged pairwise and the points
+                 cover twice as many samples from then on.
+'''
+
+SKETCH_ALPHA = 0.01        # 1% relative error on quantiles
+MAX_POINTS = 2048          # plotted points per time series
+
+
+# ===========================================================
+# QUANTILE SKETCH
+# ===========================================================
+class QuantileSketch:
+    def __init__(self, alpha=SKETCH_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}         # bucket index -> count
+        self.negative = {}         # same, for -x of negative values
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _add(self, store, values):
+        index = np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+        buckets, counts = np.unique(index, return_counts=True)
+        for bucket, n in zip(buckets.tolist(), counts.tolist()):
+            store[bucket] = store.get(bucket, 0) + n
+
+    def update(self, values):
+        """Adds an array of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > 0]
+        negative = values[values < 0]
+        self.zeros += len(values) - len(positive) - len(negative)
+        if len(positive):
+            self._add(self.positive, positive)
+        if len(negative):
+            self._add(self.negative, -negative)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different alpha")
+        for store, other_store in ((self.positive, other.positive),
+                                   (self.negative, other.negative)):
+            for bucket, n in other_store.items():
+                store[bucket] = store.get(bucket, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _value(self, bucket):
+        # midpoint (in relative terms) of (gamma^(i-1), gamma^i]
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def buckets(self):
+        """(representative values, counts) in ascending order, for histograms."""
+        values, counts = [], []
+        for bucket in sorted(self.negative, reverse=True):
+            values.append(-self._value(bucket))
+            counts.append(self.negative[bucket])
+        if self.zeros:
+            values.append(0.0)
+            counts.append(self.zeros)
+        for bucket in sorted(self.positive):
+            values.append(self._value(bucket))
+            counts.append(self.positive[bucket])
+        return np.array(values), np.array(counts)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        values, counts = self.buckets()
+        for value, n in zip(values, counts):
+            seen += n
+            if seen > rank:
+                return min(max(float(value), self.min), self.max)
+        return self.max
+
+
+# ===========================================================
+# SERIES DOWNSAMPLER
+# ===========================================================
+class Downsampler:
+    def __init__(self, max_points=MAX_POINTS):
+        self.max_points = max_points - max_points % 2
+        self.step = 1              # samples per finished point
+        self.points = []           # (first sample index, mean)
+        self._index = 0            # samples seen so far
+        self._sum = 0.0
+        self._n = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        pos = 0
+        while pos < len(values):
+            take = min(self.step - self._n, len(values) - pos)
+            self._sum += float(values[pos:pos + take].sum())
+            self._n += take
+            pos += take
+            if self._n == self.step:
+                self._close()
+
+    def _close(self):
+        self.points.append((self._index, self._sum / self._n))
+        self._index += self._n
+        self._sum = 0.0
+        self._n = 0
+        if len(self.points) == self.max_points:
+            self.points = [
+                (a[0], (a[1] + b[1]) / 2)
+                for a, b in zip(self.points[::2], self.points[1::2])
+            ]
+            self.step *= 2
+
+    def series(self):
+        """(sample indices, means); includes the partially filled last point."""
+        points = list(self.points)
+        if self._n:
+            points.append((self._index, self._sum / self._n))
+        if not points:
+            return np.array([]), np.array([])
+        index, means = zip(*points)
+        return np.array(index), np.array(means)
@@ -0,0 +1,135 @@
+from protocol import (HEADER_SIZE, DELTA_SCALE, MAX_READINGS, encode_readings,
+                      encoding_flags, varint_size, zigzag)
+
+'''
+Adaptive batch builder for the client.
+
+Readings are added one at a time with their sample time. A batch is sent
+when the next reading would push the payload over the byte budget, or when
+the oldest reading in it has waited max_age_ms, whichever comes first. With
+the delta encoding a full batch carries a few hundred readings under one
+10-byte header, so the packet rate drops with the budget/age instead of
+being fixed at one packet per BATCH_SIZE readings.
+
+The byte budget is capped so header + payload always fits a 1500-byte MTU
+path without IP fragmentation.
+'''
+
+PATH_MTU = 1500
+IP_UDP_OVERHEAD = 28                          # IPv4 (20) + UDP (8)
+MAX_PAYLOAD = PATH_MTU - IP_UDP_OVERHEAD - HEADER_SIZE
+BYTE_BUDGET = 1200                            # leaves room for tunnels/VPN headers
+MAX_AGE_MS = 1000
+
+
+class AdaptiveBatcher:
+    def __init__(self, encoding="delta", byte_budget=BYTE_BUDGET, max_age_ms=MAX_AGE_MS):
+        self.encoding = encoding
+        self.flags = encoding_flags(encoding)
+        self.byte_budget = min(byte_budget, MAX_PAYLOAD)
+        self.max_age_ms = max_age_ms
+
+        self.values = []
+        self.times = []
+        self.size = 0                  # encoded payload size of the current batch
+
+        # report counters
+        self.packets = 0
+        self.readings = 0
+        self.payload_bytes = 0
+        self.text_bytes = 0            # what the same readings cost as text
+        self.latency_total = 0         # ms the oldest reading of each batch waited
+        self.latency_max = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    # ---------- size accounting ----------
+    def _cost(self, value, t_ms):
+        """Bytes the payload grows by when this reading is appended."""
+        n = len(self.values)
+        encoding = self.encoding
+
+        if encoding == "delta":
+            if n == 0:
+                dv, dt, count_growth = round(value * DELTA_SCALE), 0, 1
+            else:
+                dv = round(value * DELTA_SCALE) - round(self.values[-1] * DELTA_SCALE)
+                dt = t_ms - self.times[-1]
+                count_growth = varint_size(n + 1) - varint_size(n)
+            return count_growth + varint_size(zigzag(dv)) + varint_size(zigzag(dt))
+        if encoding == "f32":
+            return 5 if n == 0 else 4
+        if encoding == "i16":
+            return 3 if n == 0 else 2
+        return len(str(value)) + (1 if n else 0)
+
+    def _full(self, cost):
+        if self.size + cost > self.byte_budget:
+            return True
+        return self.encoding in ("f32", "i16") and len(self.values) >= MAX_READINGS
+
+    # ---------- batching ----------
+    def add(self, value, t_ms):
+        """
+        Adds one reading. Returns a packet (timestamp, payload, flags, count)
+        when the batch had to be closed to respect the byte budget, else None.
+        """
+        packet = None
+        cost = self._cost(value, t_ms)
+        if self.values and self._full(cost):
+            packet = self.flush(t_ms)
+            cost = self._cost(value, t_ms)
+
+        self.values.append(value)
+        self.times.append(t_ms)
+        self.size += cost
+        return packet
+
+    def poll(self, now_ms):
+        """Closes the batch once its oldest reading reached max_age_ms."""
+        if self.values and now_ms - self.times[0] >= self.max_age_ms:
+            return self.flush(now_ms)
+        return None
+
+    def deadline(self):
+        """Time (same clock as add()) at which poll() closes the batch, or None."""
+        if not self.values:
+            return None
+        return self.times[0] + self.max_age_ms
+
+    def flush(self, now_ms):
+        if not self.values:
+            return None
+
+        base = self.times[0]
+        offsets = [t - base for t in self.times]
+        payload = encode_readings(self.values, self.encoding, offsets)
+
+        count = len(self.values)
+        latency = now_ms - base
+        self.packets += 1
+        self.readings += count
+        self.payload_bytes += len(payload)
+        self.text_bytes += len(encode_readings(self.values, "text"))
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+        self.values = []
+        self.times = []
+        self.size = 0
+        return base, payload, self.flags, count
+
+    # ---------- reporting ----------
+    def report(self):
+        if not self.packets:
+            print("[BATCHER] nothing sent")
+            return
+        ratio = self.text_bytes / max(self.payload_bytes, 1)
+        wire = self.payload_bytes + self.packets * (HEADER_SIZE + IP_UDP_OVERHEAD)
+        print(f"[BATCHER] {self.encoding} | packets={self.packets} readings={self.readings} "
+              f"({self.readings / self.packets:.1f}/packet) | payload={self.payload_bytes}B "
+              f"text-equivalent={self.text_bytes}B ratio={ratio:.2f}x | "
+              f"wire={wire / self.readings:.2f}B/reading | "
+              f"batching latency avg={self.latency_total / self.packets:.0f}ms "
+              f"max={self.latency_max}ms")
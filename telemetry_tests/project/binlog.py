@@ -0,0 +1,380 @@
+import csv
+import mmap
+import os
+import struct
+
+from protocol import clamp_mode, MODE_NAME_SIZE
+
+try:
+    import numpy as np
+except ImportError:        # the server only needs the writer side
+    np = None
+
+'''
+Compact binary telemetry log.
+
+Same rows as the CSV log, stored as fixed-width little-endian records so a
+day of telemetry can be memory-mapped and used as NumPy columns without
+parsing any text.
+
+File layout
+-----------
+Header (HEADER_SIZE bytes):
+    magic        4s   b"TLOG"
+    version      H
+    record_size  H
+    mode_count   H
+    reserved     6x
+    mode table   MAX_MODES x 16s, NUL padded (index = mode code)
+
+Records (RECORD_SIZE bytes each, back to back until EOF):
+    timestamp     q   unwrapped sender timestamp (ms)
+    arrival_time  q   server arrival time (ms)
+    device_id     H
+    seq           H
+    payload_size  H   (event rows: index into EVENTS)
+    flags         B   bit0 duplicate, bit1 gap, bit2 reorder, bit3 is_batch,
+                      bits4-6 log2(sample_weight) (version 2; 0 in version 1),
+                      bit7 event row (version 2: disconnect/handover, weight 0)
+    mode          B   index into the mode table; codes past mode_count
+                      (UNKNOWN_MODE once the table is full) read as "unknown"
+'''
+
+MAGIC = b"TLOG"
+VERSION = 2
+READ_VERSIONS = (1, 2)     # version 1 has no sample_weight bits (weight 1)
+MAX_MODES = 31
+UNKNOWN_MODE = 0xFF        # modes that no longer fit the table
+
+PREAMBLE = struct.Struct("<4sHHH6x")
+MODE_SLOT = struct.Struct(f"<{MODE_NAME_SIZE}s")
+HEADER_SIZE = PREAMBLE.size + MAX_MODES * MODE_SLOT.size     # 512 bytes
+
+RECORD = struct.Struct("<qqHHHBB")
+RECORD_SIZE = RECORD.size                                     # 24 bytes
+
+CONVERT_CHUNK = 65536      # rows per chunk when converting / iterating
+
+# flag bits
+F_DUPLICATE = 0x01
+F_GAP = 0x02
+F_REORDER = 0x04
+F_BATCH = 0x08
+WEIGHT_SHIFT = 4
+WEIGHT_MASK = 0x07         # sample_weight up to 2^7
+F_EVENT = 0x80
+
+# event row names by code; unknown names are logged as code 0
+EVENTS = ["event", "disconnect", "handover"]
+EVENT_CODES = {name: code for code, name in enumerate(EVENTS)}
+
+FLAG_COLUMNS = {
+    "duplicate_flag": F_DUPLICATE,
+    "gap_flag": F_GAP,
+    "reorder_flag": F_REORDER,
+    "is_batch": F_BATCH,
+}
+
+# CSV column order (same as oop_server.CSV_HEADER)
+CSV_COLUMNS = [
+    "device_id", "seq", "timestamp", "arrival_time",
+    "duplicate_flag", "gap_flag", "reorder_flag", "payload_size",
+    "is_batch", "mode", "sample_weight", "event"
+]
+
+# defaults for columns missing from older CSV logs
+LEGACY_COLUMNS = {"sample_weight": 1, "event": ""}
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ("timestamp", "<i8"),
+        ("arrival_time", "<i8"),
+        ("device_id", "<u2"),
+        ("seq", "<u2"),
+        ("payload_size", "<u2"),
+        ("flags", "u1"),
+        ("mode", "u1"),
+    ])
+    assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+
+def is_binary_log(path):
+    """True if the file starts with the binary log magic, whatever its name."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+# ===========================================================
+# WRITER (log sink)
+# ===========================================================
+class BinarySink:
+    """
+    Drop-in replacement for log_writer.CsvSink: takes the same row tuples
+    (CSV column order) and appends fixed-width records.
+    """
+
+    def __init__(self, filename, header=None):
+        self.filename = filename
+        self.file = open(filename, "wb")
+        self.modes = {}            # mode as logged -> code
+        self.names = {}            # name in the table -> code
+        self.unknown_rows = 0      # rows logged as UNKNOWN_MODE
+        self._buf = bytearray()
+
+        self.file.write(PREAMBLE.pack(MAGIC, VERSION, RECORD_SIZE, 0))
+        self.file.write(bytes(MAX_MODES * MODE_SLOT.size))
+        self.file.flush()
+
+    def _mode_code(self, mode):
+        code = self.modes.get(mode)
+        if code is not None:
+            return code
+
+        # names are stored cut to MODE_NAME_SIZE bytes: modes that only
+        # differ past that share a code
+        name = clamp_mode(str(mode)) or "unknown"
+        code = self.names.get(name)
+        if code is None:
+            if len(self.names) >= MAX_MODES:
+                # a full table must not stop the log: the row is kept, its
+                # mode reads back as "unknown" (not cached, so a flood of
+                # distinct names cannot grow self.modes)
+                if not self.unknown_rows:
+                    print(f"[BINLOG] mode table full ({MAX_MODES}): further modes "
+                          f"logged as unknown")
+                self.unknown_rows += 1
+                return UNKNOWN_MODE
+
+            code = self.names[name] = len(self.names)
+            # header lives at a fixed offset: patch it in place, records keep appending
+            fd = self.file.fileno()
+            os.pwrite(fd, MODE_SLOT.pack(name.encode("utf-8")),
+                      PREAMBLE.size + code * MODE_SLOT.size)
+            os.pwrite(fd, PREAMBLE.pack(MAGIC, VERSION, RECORD_SIZE, len(self.names)), 0)
+
+        if name == mode:
+            self.modes[mode] = code
+        return code
+
+    def writerows(self, rows):
+        buf = self._buf
+        start = len(buf)
+        buf.extend(bytes(RECORD_SIZE * len(rows)))
+        pack_into = RECORD.pack_into
+        mode_code = self._mode_code
+        modes = self.modes
+
+        offset = start
+        try:
+            for (device_id, seq, timestamp, arrival, dup, gap, reorder,
+                 payload_size, is_batch, mode, weight, event) in rows:
+                if event:
+                    # not a packet: payload_size carries the event code
+                    payload_size = EVENT_CODES.get(event, 0)
+                    flags = F_EVENT
+                else:
+                    flags = (
+                        (F_DUPLICATE if int(dup) else 0)
+                        | (F_GAP if int(gap) else 0)
+                        | (F_REORDER if int(reorder) else 0)
+                        | (F_BATCH if int(is_batch) else 0)
+                        | (min(int(weight).bit_length() - 1, WEIGHT_MASK) << WEIGHT_SHIFT
+                           if weight != 1 else 0)
+                    )
+                code = modes.get(mode)
+                if code is None:
+                    code = mode_code(mode)
+                pack_into(buf, offset, int(timestamp), int(arrival), int(device_id),
+                          int(seq), int(payload_size), flags, code)
+                offset += RECORD_SIZE
+        except Exception:
+            # a bad row fails the whole group: no zero-filled records left behind
+            del buf[start:]
+            raise
+
+    def flush(self):
+        if self._buf:
+            # a failed write drops the group instead of retrying it forever
+            buf, self._buf = self._buf, bytearray()
+            self.file.write(buf)
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# ===========================================================
+# MEMORY-MAPPED READER
+# ===========================================================
+class BinaryLogReader:
+    """
+    Maps the whole log and exposes each fixed field as a zero-copy NumPy
+    view (`reader["seq"]`, `reader["arrival_time"]`, ...). Flag columns are
+    derived from the packed flags byte; event rows read back with
+    payload_size and sample_weight 0 and their name in the "event" column.
+    """
+
+    def __init__(self, path):
+        if np is None:
+            raise ImportError("BinaryLogReader requires numpy")
+
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER_SIZE:
+                raise ValueError(f"{path}: truncated binary log header")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, record_size, mode_count = PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a binary telemetry log")
+        if version not in READ_VERSIONS or record_size != RECORD_SIZE:
+            raise ValueError(f"{path}: unsupported log version {version}/{record_size}")
+
+        self.modes = [
+            MODE_SLOT.unpack_from(self._mm, PREAMBLE.size + i * MODE_SLOT.size)[0]
+            .rstrip(b"\0").decode("utf-8")
+            for i in range(mode_count)
+        ]
+
+        # a crash can leave a partial record at the end: ignore it
+        count = (size - HEADER_SIZE) // RECORD_SIZE
+        self.records = np.frombuffer(self._mm, dtype=RECORD_DTYPE,
+                                     count=count, offset=HEADER_SIZE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, column):
+        return self._column(self.records, column)
+
+    @staticmethod
+    def _column(records, column):
+        flags = records["flags"]
+        if column in FLAG_COLUMNS:
+            return (flags & FLAG_COLUMNS[column]) != 0
+        if column == "sample_weight":
+            weight = np.left_shift(1, (flags >> WEIGHT_SHIFT) & WEIGHT_MASK)
+            return np.where(flags & F_EVENT, 0, weight)
+        if column == "payload_size":
+            return np.where(flags & F_EVENT, 0, records["payload_size"])
+        if column == "event":
+            code = records["payload_size"]
+            names = np.array(EVENTS, dtype=object)[np.where(code < len(EVENTS), code, 0)]
+            return np.where(flags & F_EVENT, names, "")
+        return records[column]
+
+    def mode_names(self, records=None):
+        if records is None:
+            records = self.records
+        return np.array(self.modes + ["unknown"], dtype=object)[
+            np.minimum(records["mode"], len(self.modes))
+        ]
+
+    def to_dataframe(self, start=0, stop=None):
+        import pandas as pd
+
+        records = self.records[start:stop]
+        df = pd.DataFrame({
+            name: self._column(records, name) if name != "mode" else self.mode_names(records)
+            for name in CSV_COLUMNS
+        })
+        # same dtypes as pd.read_csv on the text log (no unsigned wraparound in diff())
+        for name in ("device_id", "seq", "payload_size", "sample_weight", *FLAG_COLUMNS):
+            df[name] = df[name].astype("int64")
+        return df
+
+    def iter_dataframes(self, rows=CONVERT_CHUNK):
+        """to_dataframe() over consecutive slices of `rows` records."""
+        for start in range(0, len(self.records), rows):
+            yield self.to_dataframe(start, start + rows)
+
+    def iter_rows(self):
+        """Rows as CSV-ordered tuples (for converters and merges)."""
+        modes = self.modes
+        for start in range(0, len(self.records), CONVERT_CHUNK):
+            chunk = self.records[start:start + CONVERT_CHUNK].tolist()
+            for ts, arrival, device_id, seq, payload_size, flags, mode in chunk:
+                if flags & F_EVENT:
+                    yield (
+                        device_id, seq, ts, arrival, 0, 0, 0, 0, 0,
+                        modes[mode] if mode < len(modes) else "unknown", 0,
+                        EVENTS[payload_size] if payload_size < len(EVENTS) else EVENTS[0],
+                    )
+                    continue
+                yield (
+                    device_id, seq, ts, arrival,
+                    int(bool(flags & F_DUPLICATE)), int(bool(flags & F_GAP)),
+                    int(bool(flags & F_REORDER)), payload_size,
+                    int(bool(flags & F_BATCH)),
+                    modes[mode] if mode < len(modes) else "unknown",
+                    1 << ((flags >> WEIGHT_SHIFT) & WEIGHT_MASK), "",
+                )
+
+    def close(self):
+        self.records = None
+        self._mm.close()
+
+
+# ===========================================================
+# CSV <-> BINARY CONVERSION
+# ===========================================================
+
+def csv_to_binary(csv_path, bin_path):
+    sink = BinarySink(bin_path)
+    rows = 0
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        # logs from before sample_weight / event: every row is one packet
+        missing = CSV_COLUMNS[len(header):]
+        if header != CSV_COLUMNS[:len(header)] or not set(missing) <= LEGACY_COLUMNS.keys():
+            raise ValueError(f"{csv_path}: unexpected columns {header}")
+        missing = [LEGACY_COLUMNS[name] for name in missing]
+
+        chunk = []
+        for row in reader:
+            if missing:
+                row.extend(missing)
+            chunk.append(row)
+            if len(chunk) >= CONVERT_CHUNK:
+                sink.writerows(chunk)
+                sink.flush()
+                rows += len(chunk)
+                chunk = []
+        sink.writerows(chunk)
+        rows += len(chunk)
+
+    sink.close()
+    return rows
+
+
+def binary_to_csv(bin_path, csv_path):
+    reader = BinaryLogReader(bin_path)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(reader.iter_rows())
+    rows = len(reader)
+    reader.close()
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert telemetry logs between CSV and binary")
+    parser.add_argument("direction", choices=["to-bin", "to-csv"])
+    parser.add_argument("src", help="Input log file")
+    parser.add_argument("dst", help="Output log file")
+    args = parser.parse_args()
+
+    if args.direction == "to-bin":
+        n = csv_to_binary(args.src, args.dst)
+    else:
+        n = binary_to_csv(args.src, args.dst)
+    print(f"[CONVERT] {n} rows: {args.src} → {args.dst}")
@@ -0,0 +1,72 @@
+import time
+
+'''
+Leveled, rate-limited console output for the server's per-packet lines.
+
+Every line has a level and a tag ("DATA", "RECV", "INIT", ...). Lines
+below the configured level are never formatted. The rest pass a token
+bucket per tag: RATE_LIMIT lines per second, with bursts of up to
+RATE_BURST. Suppressed lines are counted and summarized once per stats
+report:
+
+    [LOG] rate-limited: DATA=48211 RECV=48230
+
+On the hot path, callers test allow() before building the f-string, so a
+suppressed line costs one clock read and a dict lookup:
+
+    if verbose and log.allow(DEBUG, "DATA"):
+        print(f"[DATA] ...")
+'''
+
+DEBUG = 10                 # one line per packet
+INFO = 20                  # device lifecycle (INIT, CONFIG)
+WARNING = 30
+ERROR = 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+RATE_LIMIT = 20.0          # lines per second per tag (0 = unlimited)
+RATE_BURST = 50            # lines a tag may print back-to-back
+
+
+class ConsoleLog:
+    def __init__(self, level=DEBUG, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.level = LEVELS.get(level, level)
+        self.verbose = self.level <= DEBUG        # per-packet lines wanted at all
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.buckets = {}                         # tag -> [tokens, last refill]
+        self.suppressed = {}                      # tag -> lines since last report
+        self._clock = time.monotonic
+
+    def allow(self, level, tag):
+        """Whether a line may be printed now; counts it as suppressed if not."""
+        if level < self.level:
+            return False
+        if not self.rate:
+            return True
+
+        now = self._clock()
+        bucket = self.buckets.get(tag)
+        if bucket is None:
+            bucket = self.buckets[tag] = [float(self.burst), now]
+        tokens = bucket[0] + (now - bucket[1]) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True
+        bucket[0] = tokens
+        self.suppressed[tag] = self.suppressed.get(tag, 0) + 1
+        return False
+
+    def log(self, level, tag, message):
+        if self.allow(level, tag):
+            print(f"[{tag}] {message}")
+
+    def report(self):
+        if not self.suppressed:
+            return
+        counts = " ".join(f"{tag}={n}" for tag, n in sorted(self.suppressed.items()))
+        print(f"[LOG] rate-limited: {counts}")
+        self.suppressed = {}
@@ -0,0 +1,87 @@
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:        # Windows
+    fcntl = None
+    import msvcrt
+
+'''
+Device ID allocation shared by oop_client.py and load_generator.py.
+
+The last issued ID lives in client_ids.txt next to this file. Reading and
+rewriting it is guarded by an OS lock on client_ids.txt.lock (flock on
+Linux, msvcrt.locking on Windows), so clients started at the same moment
+(or a load generator reserving a block of thousands of IDs) never get
+overlapping IDs. The OS drops the lock when its holder exits, even on a
+crash: there are no stale locks to detect or reclaim, and the lock file
+itself is never removed.
+'''
+
+BASE_ID = 1000
+COUNTER_FILE = "client_ids.txt"
+LOCK_TIMEOUT = 5.0         # give up waiting for a live holder after this long
+
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _acquire(lock_path):
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while not _try_lock(fd):
+        if time.monotonic() > deadline:
+            os.close(fd)
+            raise TimeoutError(f"device ID lock {lock_path} is held")
+        time.sleep(0.01)
+    return fd
+
+
+def allocate_device_ids(count=1, base_id=BASE_ID, counter_file=COUNTER_FILE):
+    """Reserves `count` consecutive device IDs and returns the first one."""
+    dir_path = os.path.dirname(os.path.abspath(__file__))
+    file_path = os.path.join(dir_path, counter_file)
+    lock_path = file_path + ".lock"
+
+    fd = _acquire(lock_path)
+    try:
+        try:
+            with open(file_path, "r") as f:
+                content = f.read().strip()
+                last_id = int(content) if content else base_id
+        except FileNotFoundError:
+            last_id = base_id
+
+        first_id = last_id + 1
+        if first_id + count - 1 > 0xFFFF:
+            raise ValueError("device ID space (16 bits) exhausted; reset "
+                             f"{counter_file}")
+
+        # write-then-rename so a crash never leaves a truncated counter
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(first_id + count - 1))
+        os.replace(tmp_path, file_path)
+    finally:
+        _unlock(fd)
+        os.close(fd)
+
+    return first_id
@@ -0,0 +1,271 @@
+import json
+import math
+import os
+import time
+from array import array
+
+'''
+Live per-device statistics, updated as DATA packets arrive.
+
+Every update is O(1) with no allocation after a device's first packet:
+counters, Welford mean/variance of the inter-arrival time, RFC 3550
+interarrival jitter and a fixed-size latency histogram, per device and
+server-wide. Snapshots give loss and jitter figures without
+post-processing the CSV log:
+
+    <log>.live.json          server-wide summary from the running totals,
+                             on every stats report and on SIGUSR1; costs
+                             one float per device (jitter), no histograms
+    <log>.live.devices.json  per-device figures, walks every device's
+                             histogram (~1 s at 20k devices): only on
+                             SIGUSR2 and at shutdown, never periodically
+
+Server-wide totals include devices that were evicted since; per-device
+stats are dropped with the device.
+
+Latency is one-way transit, arrival - sender timestamp, minus the
+smallest transit seen from that device so far. The unknown clock offset
+between device and server cancels out, as in analysis/metrics.py
+--per-device. Samples taken before a new minimum was reached are not
+shifted afterwards.
+
+The histogram uses HDR-style log buckets. Values below 2 * SUB_BUCKETS ms
+are exact. Above that, every power of two is split into SUB_BUCKETS
+linear buckets, so a recorded value is off by at most 1/SUB_BUCKETS
+(6%). With MAX_LATENCY_MS at about 4.6 hours this takes 336 counters per
+device.
+'''
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS                 # linear buckets per power of two
+MAX_LATENCY_MS = (1 << 24) - 1
+HIST_BUCKETS = (MAX_LATENCY_MS.bit_length() - SUB_BITS) * SUB_BUCKETS + SUB_BUCKETS
+JITTER_GAIN = 1 / 16                        # RFC 3550 6.4.1
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# ===========================================================
+# LOG-BUCKET HISTOGRAM
+# ===========================================================
+def bucket_index(value):
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_value(index):
+    """Midpoint of the values that land in bucket `index`."""
+    if index < 2 * SUB_BUCKETS:
+        return float(index)
+    shift = index // SUB_BUCKETS - 1
+    low = (index - shift * SUB_BUCKETS) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * HIST_BUCKETS))
+        self.total = 0
+
+    def record(self, value):
+        if value > MAX_LATENCY_MS:
+            value = MAX_LATENCY_MS
+        self.counts[bucket_index(value)] += 1
+        self.total += 1
+
+    def record_with(self, value, other):
+        """record(value) here and in `other`, computing the bucket once."""
+        if value > MAX_LATENCY_MS:
+            value = MAX_LATENCY_MS
+        index = bucket_index(value)
+        self.counts[index] += 1
+        self.total += 1
+        other.counts[index] += 1
+        other.total += 1
+
+    def merge(self, other):
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        self.total += other.total
+
+    def quantile(self, q):
+        if self.total == 0:
+            return None
+        rank = q * (self.total - 1)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen > rank:
+                return bucket_value(index)
+        return bucket_value(HIST_BUCKETS - 1)
+
+
+# ===========================================================
+# PER-DEVICE STATISTICS
+# ===========================================================
+class DeviceStats:
+    __slots__ = ("packets", "bytes", "duplicates", "reorders", "missing",
+                 "first_arrival", "last_arrival", "gap_count", "gap_mean", "gap_m2",
+                 "min_transit", "last_transit", "jitter", "latency")
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.reorders = 0
+        self.missing = 0           # seqs skipped over by gap detection
+
+        # inter-arrival time (ms), Welford running mean / variance
+        self.first_arrival = None
+        self.last_arrival = None
+        self.gap_count = 0
+        self.gap_mean = 0.0
+        self.gap_m2 = 0.0
+
+        self.min_transit = None
+        self.last_transit = None
+        self.jitter = 0.0
+        self.latency = LatencyHistogram()
+
+    def record(self, arrival, sent, size, duplicate, reordered, missing, total):
+        """Returns False for a duplicate; latency also goes into `total`."""
+        self.packets += 1
+        self.bytes += size
+        if duplicate:
+            self.duplicates += 1
+            return False           # a copy says nothing about timing
+        if reordered:
+            self.reorders += 1
+        self.missing += missing
+
+        last = self.last_arrival
+        if last is None:
+            self.first_arrival = arrival
+        else:
+            n = self.gap_count = self.gap_count + 1
+            delta = (arrival - last) - self.gap_mean
+            self.gap_mean += delta / n
+            self.gap_m2 += delta * ((arrival - last) - self.gap_mean)
+        self.last_arrival = arrival
+
+        transit = arrival - sent
+        if self.min_transit is None or transit < self.min_transit:
+            self.min_transit = transit
+        if self.last_transit is not None:
+            d = transit - self.last_transit
+            self.jitter += ((d if d >= 0 else -d) - self.jitter) * JITTER_GAIN
+        self.last_transit = transit
+        self.latency.record_with(transit - self.min_transit, total)
+        return True
+
+    def snapshot(self):
+        expected = self.packets - self.duplicates + self.missing
+        variance = self.gap_m2 / (self.gap_count - 1) if self.gap_count > 1 else 0.0
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "duplicates": self.duplicates,
+            "reorders": self.reorders,
+            "missing": self.missing,
+            "loss": self.missing / expected if expected else 0.0,
+            "interarrival_mean_ms": self.gap_mean,
+            "interarrival_std_ms": math.sqrt(variance),
+            "jitter_ms": self.jitter,
+            "latency_ms": {f"p{q * 100:g}": self.latency.quantile(q) for q in QUANTILES},
+        }
+
+
+# ===========================================================
+# SERVER-WIDE TABLE
+# ===========================================================
+class LiveStats:
+    def __init__(self, path=None):
+        self.path = path           # summary file (JSON), None = report only
+        self.devices_path = None if path is None else \
+            os.path.splitext(path)[0] + ".devices.json"
+        self.devices = {}
+        self.snapshots = 0
+
+        # running server-wide totals: a summary never touches per-device histograms
+        self.latency = LatencyHistogram()
+        self.packets = 0
+        self.duplicates = 0
+        self.missing = 0
+        self.evicted = 0
+
+    def record(self, deviceID, arrival, sent, size, duplicate, reordered, missing):
+        stats = self.devices.get(deviceID)
+        if stats is None:
+            stats = self.devices[deviceID] = DeviceStats()
+        if not stats.record(arrival, sent, size, duplicate, reordered, missing, self.latency):
+            self.duplicates += 1
+        self.packets += 1
+        self.missing += missing
+
+    def remove(self, deviceID):
+        """Drops an evicted device's stats (the totals keep its packets)."""
+        if self.devices.pop(deviceID, None) is not None:
+            self.evicted += 1
+
+    def snapshot(self):
+        """Server-wide figures: O(1) plus one jitter value per device."""
+        jitters = sorted([stats.jitter for stats in self.devices.values()])
+        expected = self.packets - self.duplicates + self.missing
+        latency = self.latency
+        return {
+            "time": time.time(),
+            "devices": len(self.devices),
+            "evicted": self.evicted,
+            "packets": self.packets,
+            "missing": self.missing,
+            "loss": self.missing / expected if expected else 0.0,
+            "jitter_ms": {
+                "median_device": jitters[len(jitters) // 2] if jitters else None,
+                "worst_device": jitters[-1] if jitters else None,
+            },
+            "latency_ms": {f"p{q * 100:g}": latency.quantile(q) for q in QUANTILES},
+        }
+
+    def device_snapshot(self):
+        """Per-device figures; the cost is a histogram walk per device."""
+        return {str(deviceID): stats.snapshot() for deviceID, stats in self.devices.items()}
+
+    @staticmethod
+    def _dump(path, snapshot):
+        # write-then-rename: readers never see a half-written snapshot
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def write(self, snapshot=None):
+        if snapshot is None:
+            snapshot = self.snapshot()
+        if self.path is None:
+            return snapshot
+        self._dump(self.path, snapshot)
+        self.snapshots += 1
+        return snapshot
+
+    def write_devices(self):
+        if self.devices_path is None:
+            return
+        self._dump(self.devices_path, {"time": time.time(), "per_device": self.device_snapshot()})
+        print(f"[LIVE] per-device stats ({len(self.devices)} devices) -> {self.devices_path}")
+
+    def report(self):
+        snapshot = self.write()
+        latency = snapshot["latency_ms"]
+        jitter = snapshot["jitter_ms"]
+
+        def ms(value):
+            return "n/a" if value is None else f"{value:.1f}"
+
+        print(f"[LIVE] devices={snapshot['devices']} packets={snapshot['packets']} | "
+              f"loss={snapshot['loss']:.2%} | jitter median={ms(jitter['median_device'])}ms "
+              f"worst={ms(jitter['worst_device'])}ms | latency p50={ms(latency['p50'])} "
+              f"p99={ms(latency['p99'])}ms"
+              f"{'' if self.path is None else ' -> ' + self.path}")
@@ -0,0 +1,147 @@
+from console_log import ConsoleLog, INFO
+
+'''
+Device liveness tracking on a hashed timer wheel.
+
+Every device has exactly one pending deadline in the wheel. Packets do not
+touch the wheel at all: DATA and HEARTBEAT arrivals only refresh
+state.last_seen. When a deadline fires the monitor looks at last_seen and
+either re-arms the timer (device was heard from), counts a missed
+heartbeat interval, or declares the device dead and evicts its state.
+An eviction (disconnect or shard handover) is reported to on_evict before
+the state is dropped, so the server can log it as an event row.
+
+Scheduling and cancelling are O(1) dict operations on one slot, and a tick
+only visits the entries hashed into its own slot, so the cost of a tick
+does not grow with the number of devices online.
+'''
+
+TICK_MS = 100              # wheel resolution
+WHEEL_SLOTS = 128          # one rotation = 12.8 s > heartbeat interval
+
+
+# ===========================================================
+# HASHED TIMER WHEEL
+# ===========================================================
+class TimerWheel:
+    def __init__(self, now_ms, tick_ms=TICK_MS, slots=WHEEL_SLOTS):
+        self.tick_ms = tick_ms
+        self.slots = [{} for _ in range(slots)]
+        self.where = {}                      # key -> slot index (for cancel)
+        self.current_tick = now_ms // tick_ms - 1     # last processed tick
+
+    def __len__(self):
+        return len(self.where)
+
+    def schedule(self, key, deadline_ms):
+        if key in self.where:
+            self.cancel(key)
+
+        # never schedule into a slot that has already been processed
+        tick = max(deadline_ms // self.tick_ms, self.current_tick + 1)
+        index = tick % len(self.slots)
+        self.slots[index][key] = deadline_ms
+        self.where[key] = index
+
+    def cancel(self, key):
+        index = self.where.pop(key, None)
+        if index is not None:
+            del self.slots[index][key]
+
+    def advance(self, now_ms):
+        """
+        Returns [(key, deadline)] for every timer due at or before now_ms.
+        A slot is processed once its whole tick has elapsed, so timers fire
+        at most one tick late and never early.
+        """
+        target = now_ms // self.tick_ms - 1          # last fully elapsed tick
+        if target <= self.current_tick:
+            return []
+
+        expired = []
+        nslots = len(self.slots)
+
+        # after a long stall, one full rotation covers every slot
+        first = max(self.current_tick + 1, target - nslots + 1)
+        for tick in range(first, target + 1):
+            slot = self.slots[tick % nslots]
+            if not slot:
+                continue
+
+            # entries more than one rotation away stay in place
+            due = [(key, deadline) for key, deadline in slot.items() if deadline <= now_ms]
+            for key, deadline in due:
+                del slot[key]
+                del self.where[key]
+            expired.extend(due)
+
+        self.current_tick = target
+        return expired
+
+
+# ===========================================================
+# LIVENESS MONITOR
+# ===========================================================
+class LivenessMonitor:
+    def __init__(self, device_state, now_ms, interval_ms, max_missed,
+                 shard=None, tick_ms=TICK_MS, slots=WHEEL_SLOTS, on_evict=None, log=None):
+        self.device_state = device_state
+        # on_evict(deviceID, state, now_ms, event) just before the state is
+        # dropped; event is "disconnect" or "handover"
+        self.on_evict = on_evict
+        self.log = log if log is not None else ConsoleLog(INFO)
+        self.interval_ms = interval_ms
+        self.max_missed = max_missed
+        self.shard = shard
+        self.wheel = TimerWheel(now_ms, tick_ms, slots)
+
+        self.disconnects = 0
+        self.handovers = 0
+
+    def watch(self, deviceID, now_ms):
+        """Called once when the server creates state for a device."""
+        self.wheel.schedule(deviceID, now_ms + self.interval_ms)
+
+    def tick(self, now_ms):
+        for deviceID, _ in self.wheel.advance(now_ms):
+            state = self.device_state.get(deviceID)
+            if state is None:
+                continue
+
+            # device now hashed onto another SO_REUSEPORT worker
+            if self.shard is not None and not self.shard.owns(deviceID):
+                self.handovers += 1
+                self._evict(deviceID, state, now_ms, "handover")
+                continue
+
+            missed = (now_ms - state.last_seen) // self.interval_ms
+            state.missed_heartbeats = missed
+
+            if missed >= self.max_missed:
+                self._disconnect(deviceID, state, now_ms)
+                continue
+
+            # heard from since the timer was armed (missed == 0) or still
+            # within budget: next check one interval after the next miss
+            self.wheel.schedule(deviceID, state.last_seen + (missed + 1) * self.interval_ms)
+
+    def _disconnect(self, deviceID, state, now_ms):
+        state.connected = False
+        self.disconnects += 1
+        # rate-limited: a mass timeout must not flood stdout (the event rows
+        # in the log still record every disconnect)
+        if self.log.allow(INFO, "DISCONNECT"):
+            print(f"[DISCONNECT] Device {deviceID} missed {state.missed_heartbeats} heartbeats "
+                  f"(silent {(now_ms - state.last_seen) / 1000:.1f}s, last seq={state.last_seq}, "
+                  f"gaps={state.gaps}) → state evicted")
+        self._evict(deviceID, state, now_ms, "disconnect")
+
+    def _evict(self, deviceID, state, now_ms, event):
+        # callback first: a DeviceTable slot is reset by the delete
+        if self.on_evict is not None:
+            self.on_evict(deviceID, state, now_ms, event)
+        del self.device_state[deviceID]
+
+    def report(self):
+        print(f"[LIVENESS] watched={len(self.wheel)} | disconnects={self.disconnects} | "
+              f"handovers={self.handovers}")
@@ -0,0 +1,400 @@
+import argparse
+import asyncio
+import heapq
+import random
+import socket
+import time
+
+from protocol import PacketDecoder, ENCODINGS, encode_readings, encoding_flags, parse_config
+from device_ids import allocate_device_ids
+from send_queue import SendQueue, QUEUE_DEPTH
+
+'''
+Single-process load generator: emulates thousands of telemetry devices
+from one asyncio event loop.
+
+Every simulated device runs the same protocol as oop_client.py with its own
+state machine and sequence counters:
+
+    INIT -> CONFIG (MODE=..;ENC=..) -> DATA every interval
+                                     + HEARTBEAT when no data for 5 s
+    CONFIG is re-sent until the server echoes it; batch devices switch to
+    the requested encoding only after the echo, like the real client.
+
+There is one thread and no per-device task. A single heap of absolute
+deadlines drives all devices, so send times do not drift and the loop only
+wakes when something is due. Everything a pass of the loop sends is
+queued per socket (SendQueue) and flushed with one sendmmsg() call per
+QUEUE_DEPTH datagrams. Sockets are non-blocking: datagrams the kernel
+refuses are counted as send errors rather than silently queued, so the
+achieved rate is what actually left the process.
+
+Target rate is integrated over time from the number of running devices
+(ramp-up included); achieved rate counts successful sendto() calls.
+'''
+
+PORT = 8576
+VERSION = 1
+
+MSG_INIT = 0
+MSG_DATA = 1
+MSG_HEARTBEAT = 2
+MSG_CONFIG = 3
+
+FLAG_BATCH = 0x04
+
+HEARTBEAT_INTERVAL = 5.0
+SAMPLES_PER_INTERVAL = 5          # readings per batch packet (as oop_client)
+CONFIG_RETRY = 2.0                # seconds before an unanswered CONFIG is re-sent
+CONFIG_ATTEMPTS = 3
+REPORT_INTERVAL = 5.0
+SOCKET_BUFFER = 4 * 1024 * 1024
+
+
+# ===========================================================
+# SIMULATED DEVICE
+# ===========================================================
+class SimDevice:
+    __slots__ = ("deviceID", "queue", "mode", "requested_encoding", "encoding",
+                 "data_seq", "hb_seq", "cfg_seq", "next_data", "next_heartbeat",
+                 "acked", "config_attempts", "config_retry")
+
+    def __init__(self, deviceID, queue, mode, encoding):
+        self.deviceID = deviceID
+        self.queue = queue
+        self.mode = mode
+        self.requested_encoding = encoding if mode == "batch" else "text"
+        self.encoding = "text"               # until the server echoes ENC
+
+        # same seq ranges as oop_client.py
+        self.data_seq = 1
+        self.hb_seq = 50000
+        self.cfg_seq = 60000
+
+        self.next_data = 0.0
+        self.next_heartbeat = 0.0
+        self.acked = False
+        self.config_attempts = 0
+        self.config_retry = 0.0
+
+    def config_request(self):
+        if self.requested_encoding == "text":
+            return f"MODE={self.mode}"
+        return f"MODE={self.mode};ENC={self.requested_encoding}"
+
+
+# ===========================================================
+# LOAD GENERATOR
+# ===========================================================
+class LoadGenerator:
+    def __init__(self, server_address, devices, first_id, ramp_rate=100.0,
+                 batch_fraction=0.5, interval=1.0, encoding="text", sockets=1,
+                 duration=None, seed=1, report_interval=REPORT_INTERVAL,
+                 use_sendmmsg=True):
+        self.server_address = server_address
+        self.interval = interval
+        self.ramp_rate = ramp_rate
+        self.duration = duration
+        self.report_interval = report_interval
+        self.rng = random.Random(seed)
+
+        # several local ports spread devices across SO_REUSEPORT workers
+        self.sockets = []
+        self.queues = []
+        for _ in range(max(1, sockets)):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+            sock.bind(("", 0))
+            sock.setblocking(False)
+            self.sockets.append(sock)
+            self.queues.append(SendQueue(sock, QUEUE_DEPTH, use_sendmmsg=use_sendmmsg))
+
+        self.pending = []
+        for i in range(devices):
+            mode = "batch" if self.rng.random() < batch_fraction else "single"
+            queue = self.queues[i % len(self.queues)]
+            self.pending.append(SimDevice((first_id + i) & 0xFFFF, queue, mode, encoding))
+        self.pending.reverse()                  # pop() starts devices in ID order
+        self.devices = {}
+        self.batch_devices = sum(1 for d in self.pending if d.mode == "batch")
+
+        self.heap = []
+        self.decoder = PacketDecoder()
+
+        # totals
+        self.sent = 0
+        self.data_sent = 0
+        self.heartbeats = 0
+        self.readings = 0
+        self.send_errors = 0
+        self.skipped = 0
+        self.target = 0.0                       # integrated data packets due
+        self.acks = 0
+
+        # report window
+        self._window = self._new_window()
+
+    @staticmethod
+    def _new_window():
+        return {"data": 0, "target": 0.0, "lag_total": 0.0, "lag_max": 0.0,
+                "errors": 0}
+
+    # ---------- sending ----------
+    def _send(self, device, msgType, seq, flags, payload, wall_ms, readings=0):
+        """Queues one datagram; counted as sent until the flush says otherwise."""
+        device.queue.add((VERSION << 4) | msgType, device.deviceID, seq, wall_ms, flags,
+                         payload, self.server_address, (msgType, readings))
+        self.sent += 1
+
+    def _flush(self):
+        for queue in self.queues:
+            queue.flush()
+            for msgType, readings in queue.take_failed():
+                # kernel refused it (full buffer, ICMP error): take it back out
+                self.sent -= 1
+                self.send_errors += 1
+                self._window["errors"] += 1
+                if msgType == MSG_DATA:
+                    self.data_sent -= 1
+                    self.readings -= readings
+                    self._window["data"] -= 1
+
+    def _send_config(self, device, now, wall_ms):
+        payload = device.config_request().encode()
+        self._send(device, MSG_CONFIG, device.cfg_seq, 0, payload, wall_ms)
+        device.cfg_seq += 1
+        device.config_attempts += 1
+        device.config_retry = now + CONFIG_RETRY
+
+    def _start_device(self, device, now, wall_ms):
+        self._send(device, MSG_INIT, 0, 0, b"", wall_ms)
+        self._send_config(device, now, wall_ms)
+        self.devices[device.deviceID] = device
+
+        # spread first sends over one interval so devices do not fire in lockstep
+        device.next_data = now + self.rng.random() * self.interval
+        device.next_heartbeat = now + HEARTBEAT_INTERVAL
+        self._push(device)
+
+    def _push(self, device):
+        wake = min(device.next_data, device.next_heartbeat)
+        if not device.acked and device.config_attempts < CONFIG_ATTEMPTS:
+            wake = min(wake, device.config_retry)
+        heapq.heappush(self.heap, (wake, device.deviceID, device))
+
+    def _send_data(self, device, wall_ms):
+        if device.mode == "single":
+            value = round(self.rng.uniform(20.0, 30.0), 2)
+            payload = f"Reading={value}".encode()
+            flags = 0
+            count = 1
+        else:
+            # one interval's worth of samples, first sample one interval ago
+            step = self.interval * 1000 / SAMPLES_PER_INTERVAL
+            values = [round(self.rng.uniform(20.0, 30.0), 2) for _ in range(SAMPLES_PER_INTERVAL)]
+            offsets = [int(k * step) for k in range(SAMPLES_PER_INTERVAL)]
+            wall_ms -= offsets[-1]
+            payload = encode_readings(values, device.encoding, offsets)
+            flags = FLAG_BATCH | encoding_flags(device.encoding)
+            count = SAMPLES_PER_INTERVAL
+
+        self._send(device, MSG_DATA, device.data_seq, flags, payload, wall_ms, count)
+        self.data_sent += 1
+        self.readings += count
+        self._window["data"] += 1
+        device.data_seq += 1
+
+    def _fire(self, device, now, wall_ms):
+        if not device.acked and device.config_attempts < CONFIG_ATTEMPTS \
+                and now >= device.config_retry:
+            self._send_config(device, now, wall_ms)
+
+        if now >= device.next_data:
+            lag = now - device.next_data
+            window = self._window
+            window["lag_total"] += lag
+            window["lag_max"] = max(window["lag_max"], lag)
+
+            self._send_data(device, wall_ms)
+
+            # absolute schedule; slots the loop fell a whole interval behind are skipped
+            device.next_data += self.interval
+            if device.next_data <= now:
+                behind = int((now - device.next_data) // self.interval) + 1
+                self.skipped += behind
+                device.next_data += behind * self.interval
+            device.next_heartbeat = now + HEARTBEAT_INTERVAL
+
+        elif now >= device.next_heartbeat:
+            self._send(device, MSG_HEARTBEAT, device.hb_seq, 0, b"", wall_ms)
+            self.heartbeats += 1
+            device.hb_seq += 1
+            device.next_heartbeat = now + HEARTBEAT_INTERVAL
+
+        self._push(device)
+
+    # ---------- CONFIG replies ----------
+    def _on_readable(self, sock):
+        decoder = self.decoder
+        while True:
+            try:
+                packet, _ = decoder.recv(sock)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue                      # ICMP error surfaced on recv
+
+            header = decoder.header(packet)
+            if header is None or (header[0] & 0x0F) != MSG_CONFIG:
+                continue
+            device = self.devices.get(header[1])
+            if device is None:
+                continue
+
+            config = parse_config(decoder.payload_text(packet))
+            if "MODE" in config:
+                if not device.acked:
+                    self.acks += 1
+                device.acked = True
+                device.mode = config["MODE"]
+                encoding = config.get("ENC", "text")
+                device.encoding = encoding if encoding in ENCODINGS else "text"
+
+    # ---------- reporting ----------
+    def report(self, elapsed, window_elapsed):
+        window = self._window
+        data = window["data"]
+        target = window["target"]
+        achieved = data / max(window_elapsed, 1e-9)
+        target_rate = target / max(window_elapsed, 1e-9)
+        lag_avg = window["lag_total"] / max(data + window["errors"], 1) * 1000
+
+        print(f"[LOADGEN] t={elapsed:.1f}s | devices={len(self.devices)}/"
+              f"{len(self.devices) + len(self.pending)} (acked {self.acks}) | "
+              f"data target={target_rate:.1f} pkt/s achieved={achieved:.1f} pkt/s "
+              f"({data / max(target, 1e-9):.1%}) | send errors={window['errors']} | "
+              f"lag avg={lag_avg:.2f}ms max={window['lag_max'] * 1000:.1f}ms", flush=True)
+        self._window = self._new_window()
+
+    def summary(self, elapsed):
+        print(f"\n[LOADGEN SUMMARY] {elapsed:.1f}s | devices={len(self.devices)} "
+              f"(batch {self.batch_devices}) | packets={self.sent} data={self.data_sent} "
+              f"heartbeats={self.heartbeats} readings={self.readings}")
+        print(f"[LOADGEN SUMMARY] data target={self.target / elapsed:.1f} pkt/s "
+              f"achieved={self.data_sent / elapsed:.1f} pkt/s "
+              f"({self.data_sent / max(self.target, 1e-9):.1%}) | "
+              f"send errors={self.send_errors} skipped slots={self.skipped} | "
+              f"config acks={self.acks}/{len(self.devices)}", flush=True)
+        messages = sum(q.messages for q in self.queues)
+        syscalls = sum(q.syscalls for q in self.queues)
+        print(f"[LOADGEN SUMMARY] {'sendmmsg' if self.queues[0].use_sendmmsg else 'sendto loop'} | "
+              f"syscalls={syscalls} ({syscalls / max(messages, 1) * 1000:.1f} per 1000 messages)",
+              flush=True)
+
+    # ---------- main loop ----------
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sock in self.sockets:
+            loop.add_reader(sock.fileno(), self._on_readable, sock)
+
+        start = last = loop.time()
+        next_start = start
+        next_report = start + self.report_interval
+        window_start = start
+        end = start + self.duration if self.duration else float("inf")
+        heap = self.heap
+        per_device = 1.0 / self.interval
+
+        try:
+            while True:
+                now = loop.time()
+                if now >= end:
+                    break
+                wall_ms = int(time.time() * 1000)
+
+                # target = data packets the running devices should have sent
+                due = len(self.devices) * (now - last) * per_device
+                self.target += due
+                self._window["target"] += due
+                last = now
+
+                # ---------- RAMP UP ----------
+                while self.pending and next_start <= now:
+                    self._start_device(self.pending.pop(), now, wall_ms)
+                    next_start += 1.0 / self.ramp_rate
+
+                # ---------- DUE DEVICES ----------
+                while heap and heap[0][0] <= now:
+                    _, _, device = heapq.heappop(heap)
+                    self._fire(device, now, wall_ms)
+                self._flush()
+
+                if now >= next_report:
+                    self.report(now - start, now - window_start)
+                    window_start = now
+                    next_report += self.report_interval
+
+                wake = min(heap[0][0] if heap else end, next_report, end)
+                if self.pending:
+                    wake = min(wake, next_start)
+                await asyncio.sleep(max(0.0, wake - loop.time()))
+        finally:
+            for sock in self.sockets:
+                loop.remove_reader(sock.fileno())
+
+            now = loop.time()
+            self.target += len(self.devices) * (now - last) * per_device
+            self.summary(now - start)
+
+    def close(self):
+        for sock in self.sockets:
+            sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-device telemetry load generator")
+    parser.add_argument("--server-ip", type=str, default="127.0.0.1")
+    parser.add_argument("--server-port", type=int, default=PORT)
+    parser.add_argument("--devices", type=int, default=1000,
+                        help="Number of simulated devices")
+    parser.add_argument("--ramp-rate", type=float, default=200.0,
+                        help="Devices started per second")
+    parser.add_argument("--batch-fraction", type=float, default=0.5,
+                        help="Share of devices in batch mode (rest are single)")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Per-device reporting interval in seconds")
+    parser.add_argument("--encoding", type=str, default="text", choices=list(ENCODINGS),
+                        help="Encoding batch devices request from the server")
+    parser.add_argument("--sockets", type=int, default=1,
+                        help="Local UDP ports to spread devices over")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Seconds to run (default: until Ctrl+C)")
+    parser.add_argument("--first-id", type=int, default=None,
+                        help="First device ID (default: reserve a block in client_ids.txt)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL)
+    parser.add_argument("--send-loop", action="store_true",
+                        help="One sendto() per datagram instead of sendmmsg()")
+    args = parser.parse_args()
+
+    first_id = args.first_id
+    if first_id is None:
+        first_id = allocate_device_ids(args.devices)
+    print(f"[LOADGEN] {args.devices} devices (IDs {first_id}..{first_id + args.devices - 1}) "
+          f"→ {args.server_ip}:{args.server_port} | interval={args.interval}s "
+          f"ramp={args.ramp_rate}/s batch={args.batch_fraction:.0%} enc={args.encoding}",
+          flush=True)
+
+    generator = LoadGenerator(
+        (args.server_ip, args.server_port), args.devices, first_id,
+        ramp_rate=args.ramp_rate, batch_fraction=args.batch_fraction,
+        interval=args.interval, encoding=args.encoding, sockets=args.sockets,
+        duration=args.duration, seed=args.seed, report_interval=args.report_interval,
+        use_sendmmsg=not args.send_loop,
+    )
+    try:
+        asyncio.run(generator.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        generator.close()
@@ -0,0 +1,216 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+'''
+Group-commit log writer.
+
+The receive loop only enqueues rows; a background thread commits them to
+the sink in groups, either when COMMIT_ROWS rows are waiting or when the
+oldest row in the group has waited COMMIT_LATENCY seconds, whichever comes
+first. One write+flush per group instead of one per datagram.
+
+When the bounded queue is full the configured policy decides:
+    block  -> the receive loop waits for the writer (no rows lost)
+    drop   -> the row is discarded and counted
+    spill  -> the row is appended synchronously to a side file on disk,
+              <log root>.spill<ext>, in the same format as the log
+
+A commit that fails (disk full, a sink error) is counted and reported and
+its rows are lost; the writer keeps draining. Should the writer thread
+die anyway, write() and close() stop waiting for it after PUT_TIMEOUT /
+CLOSE_STALL seconds instead of hanging the receive loop.
+'''
+
+COMMIT_ROWS = 512          # rows per group commit
+COMMIT_LATENCY = 0.050     # max seconds a row waits before it is committed
+QUEUE_SIZE = 65536         # rows buffered between receive loop and writer
+POLICIES = ("block", "drop", "spill")
+PUT_TIMEOUT = 1.0          # "block": recheck that the writer is alive this often
+CLOSE_STALL = 5.0          # close() gives up after this long without progress
+
+_STOP = object()
+
+
+# ===========================================================
+# SINKS
+# ===========================================================
+class CsvSink:
+    def __init__(self, filename, header):
+        self.filename = filename
+        self.file = open(filename, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# ===========================================================
+# GROUP COMMIT WRITER
+# ===========================================================
+class GroupCommitWriter:
+    def __init__(self, sink, header, commit_rows=COMMIT_ROWS,
+                 commit_latency=COMMIT_LATENCY, queue_size=QUEUE_SIZE,
+                 policy="block", spill_filename=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown overflow policy {policy!r}, expected one of {POLICIES}")
+
+        self.sink = sink
+        self.header = header
+        self.commit_rows = commit_rows
+        self.commit_latency = commit_latency
+        self.policy = policy
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        if spill_filename is None and getattr(sink, "filename", None):
+            root, ext = os.path.splitext(sink.filename)
+            spill_filename = f"{root}.spill{ext}"
+        self.spill_filename = spill_filename
+        self._spill = None
+
+        # counters (written by the writer thread, read by reporters)
+        self.rows_written = 0
+        self.commits = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.commit_time_total = 0.0
+        self.commit_time_max = 0.0
+        self.group_latency_max = 0.0
+        self.failed_commits = 0
+        self.failed_rows = 0
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- PRODUCER SIDE ----------
+    def write(self, row):
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            if self.policy == "block":
+                self._wait_put(row)
+            elif self.policy == "drop":
+                self.dropped += 1
+            else:
+                self._spill_row(row)
+
+    def _wait_put(self, row):
+        # "block", but not on a writer thread that is gone
+        while self._thread.is_alive():
+            try:
+                self.queue.put(row, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+        self.dropped += 1
+
+    def _spill_row(self, row):
+        if self._spill is None:
+            # same sink type as the log: a binary log spills binary records
+            self._spill = type(self.sink)(self.spill_filename, self.header)
+            print(f"[WRITER] Queue full, spilling rows to {self.spill_filename}")
+        self._spill.writerows((row,))
+        self.spilled += 1
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    # ---------- WRITER THREAD ----------
+    def _run(self):
+        get = self.queue.get
+        while True:
+            row = get()
+            if row is _STOP:
+                return
+
+            # oldest row of the group has just been taken off the queue
+            group_start = time.monotonic()
+            deadline = group_start + self.commit_latency
+            group = [row]
+            stop = False
+
+            while len(group) < self.commit_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    row = get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                group.append(row)
+
+            self._commit(group, group_start)
+            if stop:
+                return
+
+    def _commit(self, group, group_start):
+        t0 = time.monotonic()
+        try:
+            self.sink.writerows(group)
+            self.sink.flush()
+        except Exception as exc:
+            self.failed_commits += 1
+            self.failed_rows += len(group)
+            if self.last_error is None:
+                print(f"[WRITER] commit failed, {len(group)} rows lost: {exc!r}")
+            self.last_error = repr(exc)
+            return
+        t1 = time.monotonic()
+
+        self.rows_written += len(group)
+        self.commits += 1
+        self.commit_time_total += t1 - t0
+        self.commit_time_max = max(self.commit_time_max, t1 - t0)
+        self.group_latency_max = max(self.group_latency_max, t1 - group_start)
+
+    # ---------- STATS / SHUTDOWN ----------
+    def report(self):
+        avg_ms = self.commit_time_total / max(self.commits, 1) * 1000
+        print(f"[WRITER] depth={self.queue_depth} | rows={self.rows_written} | "
+              f"commits={self.commits} ({self.rows_written / max(self.commits, 1):.1f} rows/commit) | "
+              f"commit avg={avg_ms:.2f}ms max={self.commit_time_max * 1000:.2f}ms | "
+              f"group latency max={self.group_latency_max * 1000:.1f}ms | "
+              f"dropped={self.dropped} spilled={self.spilled}")
+        if self.failed_commits:
+            print(f"[WRITER] failed commits={self.failed_commits} ({self.failed_rows} rows lost) | "
+                  f"last error: {self.last_error}")
+        if not self._thread.is_alive():
+            print("[WRITER] writer thread is not running: rows are no longer logged")
+
+    def close(self):
+        """Drains everything still queued, then closes the sink."""
+        thread = self._thread
+        while thread.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=PUT_TIMEOUT)
+                break
+            except queue.Full:
+                pass
+
+        # wait as long as the writer is still making progress
+        written = -1
+        while thread.is_alive() and self.rows_written + self.failed_rows != written:
+            written = self.rows_written + self.failed_rows
+            thread.join(CLOSE_STALL)
+        if thread.is_alive():
+            print(f"[WRITER] writer stalled, {self.queue_depth} rows not written")
+        else:
+            try:
+                self.sink.close()
+            except Exception as exc:
+                print(f"[WRITER] closing {getattr(self.sink, 'filename', 'sink')} failed: {exc!r}")
+        if self._spill is not None:
+            self._spill.close()
+            print(f"[WRITER] {self.spilled} rows spilled to {self.spill_filename}")
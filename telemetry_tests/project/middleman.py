@@ -1,71 +1,555 @@
 import socket
+import selectors
+import signal
 import random
+import heapq
+import json
 import time
 import argparse
+from collections import deque, OrderedDict
 
 BUFFER = 2048
 
+'''
+UDP impairment proxy, a user-space replacement for `tc qdisc ... netem`
+that needs no root and can run many copies side by side on different
+ports.
 
-def udp_proxy(listen_ip, listen_port, server_ip, server_port,
-              loss_rate=0.0, duplicate_rate=0.0, delay_ms=0, reorder_rate=0.0):
+Traffic is relayed both ways, NAT style. Each client address gets a flow
+with its own upstream socket, so the server sees one source address per
+device and its replies (CONFIG) are relayed back to the right client.
+Flows with no traffic for FLOW_IDLE seconds are closed, and at most
+MAX_FLOWS are open at once (each one holds a file descriptor): a new
+client past the cap evicts the least recently active flow. Client -> server
+and server -> client traffic are impaired independently: each direction
+has its own Impairment (state, link queue, RNG) and reorder holds.
 
-    print("\n===============================")
-    print(" UDP IMPAIRMENT PROXY STARTED ")
-    print("===============================")
-    print(f"Listening on       {listen_ip}:{listen_port}")
-    print(f"Forwarding to      {server_ip}:{server_port}")
-    print(f"Loss rate          = {loss_rate * 100}%")
-    print(f"Duplicate rate     = {duplicate_rate * 100}%")
-    print(f"Reorder rate       = {reorder_rate * 100}%")
-    print(f"Delay per packet   = {delay_ms} ms")
-    print("================================\n")
+Packets are never slept on. Each datagram gets its own release time on
+the monotonic clock (delay + jitter, plus a hold for reordered packets)
+and goes into a min-heap. One selector loop receives and releases: it
+waits on all sockets until the earliest release time, drains every queued
+datagram when readable, and sends everything due. A 50 ms delay
+therefore adds 50 ms to every packet without limiting throughput.
+
+The selector wakes up to a millisecond late (epoll timeouts are in ms),
+so the last RELEASE_SPIN seconds before a release are polled instead.
+Lateness of every release is measured and reported.
+
+Impairments, in the order a packet meets them:
+    loss        Bernoulli (`loss`) or Gilbert-Elliott burst loss: a
+                good/bad Markov chain with transition probabilities
+                ge_p (good -> bad) and ge_r (bad -> good), and loss
+                probabilities ge_loss_good / ge_loss_bad in each state
+    duplicate   a second copy, with its own delay
+    link        optional bottleneck of `rate` bytes/s with a FIFO of at
+                most `queue_limit` packets (tail drop when full)
+    delay       `delay` ms plus jitter drawn from jitter_dist
+                (uniform, normal, exponential or pareto tail)
+    reorder     the packet is held until `reorder_depth` later packets
+                have been sent past it (at most reorder_hold ms)
+
+Every random decision comes from one seeded RNG, drawn in the same order
+for every packet. With a seed, a given packet sequence gets the same
+drops, copies, delays and reorderings on every run and on every machine.
+The only exception is the link queue, which depends on arrival timing.
+
+Settings come from command-line flags or from a JSON profile
+(--profile tests/profiles/loss_5.json) whose keys are the flag names.
+Flags given explicitly override the profile. --reverse_profile sets the
+server -> client impairments; by default they are the same settings with
+seed + 1.
+'''
+
+DRAIN_BATCH = 256           # datagrams received per wakeup
+RELEASE_SPIN = 0.0005       # poll (don't sleep) the last 0.5 ms before a release
+STATS_INTERVAL = 5.0
+RCVBUF = 4 << 20            # proxy receive buffer (capped by net.core.rmem_max)
+FLOW_IDLE = 60.0            # seconds without traffic before a flow is closed
+MAX_FLOWS = 1000            # open flows (upstream sockets), below the usual 1024 fd limit
+REORDER_HOLD_MS = 1000.0    # longest a reordered packet waits for overtakers
+PARETO_ALPHA = 3.0          # tail index of the pareto jitter
+JITTER_DISTRIBUTIONS = ("uniform", "normal", "exponential", "pareto")
+
+# profile / command-line keys and their defaults
+DEFAULTS = {
+    "loss": 0.0,
+    "ge_p": 0.0,
+    "ge_r": 1.0,
+    "ge_loss_good": 0.0,
+    "ge_loss_bad": 1.0,
+    "duplicate": 0.0,
+    "delay": 0.0,
+    "jitter": 0.0,
+    "jitter_dist": "uniform",
+    "reorder": 0.0,
+    "reorder_depth": 1,
+    "reorder_hold": REORDER_HOLD_MS,
+    "rate": 0.0,
+    "queue_limit": 0,
+    "seed": None,
+}
+
+
+# ===========================================================
+# IMPAIRMENT DECISIONS
+# ===========================================================
+class Impairment:
+    def __init__(self, loss=0.0, ge_p=0.0, ge_r=1.0, ge_loss_good=0.0, ge_loss_bad=1.0,
+                 duplicate=0.0, delay=0.0, jitter=0.0, jitter_dist="uniform",
+                 reorder=0.0, reorder_depth=1, reorder_hold=REORDER_HOLD_MS,
+                 rate=0.0, queue_limit=0, seed=None):
+        if jitter_dist not in JITTER_DISTRIBUTIONS:
+            raise ValueError(f"unknown jitter distribution {jitter_dist!r}")
+        self.loss_rate = loss
+        self.ge_p = ge_p
+        self.ge_r = ge_r
+        self.ge_loss = (ge_loss_good, ge_loss_bad)
+        self.ge_bad = False
+        self.duplicate_rate = duplicate
+        self.delay = delay / 1000.0
+        self.jitter = jitter / 1000.0
+        self.jitter_dist = jitter_dist
+        self.reorder_rate = reorder
+        self.reorder_depth = max(1, int(reorder_depth))
+        self.reorder_hold = reorder_hold / 1000.0
+        self.rate = rate
+        self.queue_limit = int(queue_limit)
+        self.rng = random.Random(seed)
+
+        # bottleneck link: departure times of packets still in its queue
+        self.link_queue = deque()
+        self.link_free = 0.0
+
+        self.dropped = 0           # loss model
+        self.queue_dropped = 0     # link queue full
+        self.duplicated = 0
+        self.reordered = 0
+
+    def describe(self):
+        if self.ge_p:
+            good, bad = self.ge_loss
+            share = self.ge_p / (self.ge_p + self.ge_r)
+            loss = (f"Gilbert-Elliott p={self.ge_p} r={self.ge_r} loss good={good} bad={bad} "
+                    f"(mean {(share * bad + (1 - share) * good) * 100:.2f}%, "
+                    f"bad bursts of {1 / self.ge_r:.1f} packets)")
+        else:
+            loss = f"{self.loss_rate * 100}%"
+        link = "unlimited"
+        if self.rate:
+            link = f"{self.rate:g} bytes/s, queue {self.queue_limit or 'unlimited'}"
+        return [
+            f"Loss               = {loss}",
+            f"Duplicate rate     = {self.duplicate_rate * 100}%",
+            f"Reorder rate       = {self.reorder_rate * 100}% (depth {self.reorder_depth}, "
+            f"held at most {self.reorder_hold * 1000:g} ms)",
+            f"Delay per packet   = {self.delay * 1000:g} ms",
+            f"Jitter             = {self.jitter * 1000:g} ms ({self.jitter_dist})",
+            f"Link               = {link}",
+        ]
+
+    def lost(self):
+        rng = self.rng
+        if not self.ge_p:
+            return rng.random() < self.loss_rate
+        # state transition first, then loss in the new state
+        if self.ge_bad:
+            self.ge_bad = rng.random() >= self.ge_r
+        else:
+            self.ge_bad = rng.random() < self.ge_p
+        return rng.random() < self.ge_loss[self.ge_bad]
+
+    def sample_delay(self):
+        """One packet's delay in seconds (never negative)."""
+        jitter = self.jitter
+        if not jitter:
+            return self.delay
+        if self.jitter_dist == "uniform":
+            delay = self.delay + self.rng.uniform(-jitter, jitter)
+        elif self.jitter_dist == "normal":
+            delay = self.rng.gauss(self.delay, jitter)
+        elif self.jitter_dist == "exponential":   # tail above the base delay
+            delay = self.delay + self.rng.expovariate(1.0 / jitter)
+        else:                                      # heavy tail, mean `jitter` above the base
+            excess = self.rng.paretovariate(PARETO_ALPHA) - 1
+            delay = self.delay + jitter * excess * (PARETO_ALPHA - 1)
+        return delay if delay > 0 else 0.0
+
+    def link_departure(self, size, now):
+        """When the bottleneck finishes sending this packet, or None if tail-dropped."""
+        if not self.rate:
+            return now
+        queue = self.link_queue
+        while queue and queue[0] <= now:
+            queue.popleft()
+        if self.queue_limit and len(queue) >= self.queue_limit:
+            self.queue_dropped += 1
+            return None
+        departure = max(now, self.link_free) + size / self.rate
+        self.link_free = departure
+        queue.append(departure)
+        return departure
+
+    def decide(self, size, now):
+        """
+        (release times of the copies, reordered) for one packet arriving at
+        `now`. No release times means it was dropped.
+        """
+        rng = self.rng
+        # fixed draw order: loss, duplicate, delays, reorder
+        if self.lost():
+            self.dropped += 1
+            return [], False
+        copies = 2 if rng.random() < self.duplicate_rate else 1
+        if copies == 2:
+            self.duplicated += 1
+        delays = [self.sample_delay() for _ in range(copies)]
+        reordered = rng.random() < self.reorder_rate
+        if reordered:
+            self.reordered += 1
+
+        releases = []
+        for delay in delays:
+            departure = self.link_departure(size, now)
+            if departure is not None:
+                releases.append(departure + delay)
+        return releases, reordered
+
+
+def load_profile(path):
+    with open(path) as f:
+        profile = json.load(f)
+    profile.pop("description", None)
+    unknown = set(profile) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"{path}: unknown impairment settings {sorted(unknown)}")
+    return profile
+
+
+# ===========================================================
+# FLOWS AND DIRECTIONS
+# ===========================================================
+class Direction:
+    """One direction of traffic: its own impairment, reorder holds and counters."""
+
+    def __init__(self, name, impairment):
+        self.name = name
+        self.impairment = impairment
+        # reordered packets: [packets still to overtake, hold deadline, releases, datagram, socket, address]
+        self.held = []
+        self.received = 0
+        self.forwarded = 0
+
+
+class Flow:
+    """
+    One client address, NAT style: the proxy talks to the server from a
+    socket of its own for each client, so the server sees one source
+    address per device and its replies can be told apart.
+    """
+    __slots__ = ("client", "upstream", "last_active")
+
+    def __init__(self, client, upstream, now):
+        self.client = client
+        self.upstream = upstream
+        self.last_active = now
+
+
+# ===========================================================
+# PROXY LOOP
+# ===========================================================
+class ImpairmentProxy:
+    def __init__(self, listen_ip, listen_port, server_ip, server_port, impairment,
+                 reverse_impairment=None, quiet=False, stats_interval=STATS_INTERVAL,
+                 flow_idle=FLOW_IDLE, max_flows=MAX_FLOWS):
+        self.server = (server_ip, server_port)
+        self.quiet = quiet
+        self.stats_interval = stats_interval
+        self.flow_idle = flow_idle
+        self.max_flows = max_flows
 
-    # Socket to receive from client
-    proxy = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    proxy.bind((listen_ip, listen_port))
+        # Socket to receive from clients (and to send server replies back on)
+        self.proxy = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.proxy.bind((listen_ip, listen_port))
+        self.proxy.setblocking(False)
+        # bursts arriving while a release batch is being sent must not overflow
+        self.proxy.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
 
-    # Socket to forward to server
-    forwarder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.proxy, selectors.EVENT_READ)
 
-    reorder_buffer = None
+        self.uplink = Direction("client->server", impairment)
+        self.downlink = Direction("server->client", reverse_impairment or Impairment())
 
-    print("[READY] Waiting for packets...\n")
+        # client address -> Flow, least recently active first; each flow's
+        # upstream socket is registered with the selector with the Flow as its data
+        self.flows = OrderedDict()
+        self.flows_opened = 0
+        self.flows_expired = 0
+        self.flows_evicted = 0     # closed to stay under max_flows
+        self.flow_errors = 0       # datagrams dropped: no upstream socket (EMFILE, ...)
 
-    while True:
-        data, addr = proxy.recvfrom(BUFFER)
+        # (release time, arrival order, datagram, socket, address)
+        self.pending = []
+        self._order = 0
 
-        # --------- LOSS ----------
-        if random.random() < loss_rate:
-            print("[DROP] Packet dropped")
-            continue
+        self.late_total = 0.0
+        self.late_max = 0.0
+        self.peak_pending = 0
+        self.send_errors = 0
 
-        # --------- DELAY ----------
-        if delay_ms > 0:
-            time.sleep(delay_ms / 1000.0)
-            print(f"[DELAY] {delay_ms} ms")
+    def _push(self, release, data, sock, address):
+        self._order += 1
+        heapq.heappush(self.pending, (release, self._order, data, sock, address))
 
-        # --------- REORDER ----------
-        if random.random() < reorder_rate:
-            if reorder_buffer is None:
-                reorder_buffer = data
-                print("[REORDER] Packet held for later")
+    # ---------- flows ----------
+    def _open_flow(self, client, now):
+        """New flow for `client`, or None if no upstream socket could be opened."""
+        if self.max_flows and len(self.flows) >= self.max_flows:
+            _, oldest = self.flows.popitem(last=False)
+            self._close_flow(oldest)
+            self.flows_evicted += 1
+            if not self.quiet:
+                print(f"[FLOW] {oldest.client[0]}:{oldest.client[1]} evicted (max {self.max_flows} flows)")
+
+        upstream = None
+        try:
+            upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            upstream.setblocking(False)
+            upstream.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+            # connected: the kernel only hands this socket datagrams from the server
+            upstream.connect(self.server)
+        except OSError as e:
+            # out of file descriptors (EMFILE) or ports: drop this datagram,
+            # keep relaying for the flows already open
+            if upstream is not None:
+                upstream.close()
+            if not self.flow_errors:
+                print(f"[FLOW] cannot open upstream socket ({e}): dropping datagrams "
+                      f"from new clients (see --max_flows)")
+            self.flow_errors += 1
+            return None
+
+        flow = self.flows[client] = Flow(client, upstream, now)
+        self.selector.register(upstream, selectors.EVENT_READ, flow)
+        self.flows_opened += 1
+        if not self.quiet:
+            print(f"[FLOW] {client[0]}:{client[1]} -> upstream port {upstream.getsockname()[1]}")
+        return flow
+
+    def expire_flows(self, now):
+        """Closes flows with no traffic in either direction for `flow_idle` seconds."""
+        idle = [flow for flow in self.flows.values() if now - flow.last_active > self.flow_idle]
+        for flow in idle:
+            del self.flows[flow.client]
+            self._close_flow(flow)
+            self.flows_expired += 1
+            if not self.quiet:
+                print(f"[FLOW] {flow.client[0]}:{flow.client[1]} expired")
+
+    def _close_flow(self, flow):
+        # datagrams still in flight on this socket count as send errors
+        self.selector.unregister(flow.upstream)
+        flow.upstream.close()
+
+    # ---------- receive ----------
+    def drain_clients(self, now):
+        recvfrom = self.proxy.recvfrom
+        flows = self.flows
+        for _ in range(DRAIN_BATCH):
+            try:
+                data, client = recvfrom(BUFFER)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:       # ICMP from an earlier send (Windows)
                 continue
+            flow = flows.get(client)
+            if flow is None:
+                flow = self._open_flow(client, now)
+                if flow is None:
+                    continue
             else:
-                print("[REORDER] Releasing stored packet")
-                forwarder.sendto(reorder_buffer, (server_ip, server_port))
-                reorder_buffer = data
+                flows.move_to_end(client)
+            flow.last_active = now
+            self._admit(self.uplink, data, flow.upstream, self.server, now)
+
+    def drain_server(self, flow, now):
+        if flow.upstream.fileno() < 0:
+            return                             # evicted earlier in this batch of events
+        self.flows.move_to_end(flow.client)
+        recv = flow.upstream.recv
+        for _ in range(DRAIN_BATCH):
+            try:
+                data = recv(BUFFER)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionRefusedError:     # ICMP: nothing listens on the server port
                 continue
+            flow.last_active = now
+            self._admit(self.downlink, data, self.proxy, flow.client, now)
 
-        # --------- DUPLICATE ----------
-        if random.random() < duplicate_rate:
-            print("[DUPLICATE] Sending 2 copies")
-            forwarder.sendto(data, (server_ip, server_port))
-            forwarder.sendto(data, (server_ip, server_port))
-        else:
-            print("[FORWARD] Normal packet")
-            forwarder.sendto(data, (server_ip, server_port))
+    def _admit(self, direction, data, sock, address, now):
+        direction.received += 1
+        impairment = direction.impairment
+        releases, reordered = impairment.decide(len(data), now)
+        if not releases:
+            if not self.quiet:
+                print(f"[DROP] Packet dropped ({direction.name})")
+            return
+        if reordered:
+            direction.held.append([impairment.reorder_depth, now + impairment.reorder_hold,
+                                   releases, data, sock, address])
+            if not self.quiet:
+                print(f"[REORDER] Packet held for later ({direction.name})")
+            return
+
+        for release in releases:
+            self._push(release, data, sock, address)
+        if direction.held:
+            self._overtaken(direction, max(releases))
+
+    def _overtaken(self, direction, release):
+        """One more packet went past the held ones: release those that are due."""
+        still_held = []
+        for entry in direction.held:
+            entry[0] -= 1
+            if entry[0] > 0:
+                still_held.append(entry)
+                continue
+            # right behind the packet that overtook it
+            _, _, releases, data, sock, address = entry
+            for own_release in releases:
+                self._push(max(release, own_release), data, sock, address)
+        direction.held = still_held
+
+    def _expire_holds(self, direction, now):
+        """Traffic stopped: held packets go out at their hold deadline."""
+        if all(entry[1] > now for entry in direction.held):
+            return
+        still_held = []
+        for entry in direction.held:
+            if entry[1] > now:
+                still_held.append(entry)
+                continue
+            _, _, releases, data, sock, address = entry
+            for release in releases:
+                self._push(max(now, release), data, sock, address)
+        direction.held = still_held
+
+    # ---------- release ----------
+    def release(self, now):
+        pending = self.pending
+        uplink, downlink = self.uplink, self.downlink
+        proxy = self.proxy
+        while pending and pending[0][0] <= now:
+            due, _, data, sock, address = heapq.heappop(pending)
+            late = now - due
+            self.late_total += late
+            if late > self.late_max:
+                self.late_max = late
+            try:
+                sock.sendto(data, address)
+            except OSError:                    # includes a flow closed meanwhile
+                self.send_errors += 1
+                continue
+            if sock is proxy:
+                downlink.forwarded += 1
+            else:
+                uplink.forwarded += 1
+            if not self.quiet:
+                print(f"[FORWARD] after {(now - due) * 1000:.2f} ms late")
+
+    def run(self):
+        clock = time.monotonic
+        select = self.selector.select
+        proxy = self.proxy
+        directions = (self.uplink, self.downlink)
+        next_report = clock() + self.stats_interval
+
+        print("[READY] Waiting for packets...\n")
+        try:
+            while True:
+                now = clock()
+                timeout = next_report - now
+                if self.pending:
+                    timeout = min(timeout, self.pending[0][0] - now - RELEASE_SPIN)
+                for direction in directions:
+                    if direction.held:
+                        timeout = min(timeout, min(entry[1] for entry in direction.held) - now)
+                timeout = timeout if timeout > 0 else 0
 
-        
+                events = select(timeout)
+                if events:
+                    now = clock()
+                    for key, _ in events:
+                        if key.fileobj is proxy:
+                            self.drain_clients(now)
+                        else:
+                            self.drain_server(key.data, now)
+                    if len(self.pending) > self.peak_pending:
+                        self.peak_pending = len(self.pending)
+                for direction in directions:
+                    if direction.held:
+                        self._expire_holds(direction, clock())
+                self.release(clock())
+
+                if now >= next_report:
+                    self.expire_flows(now)
+                    self.report()
+                    next_report = now + self.stats_interval
+        except KeyboardInterrupt:
+            self.report()
+            print("[PROXY EXIT]")
+
+    def report(self):
+        avg = self.late_total / max(self.uplink.forwarded + self.downlink.forwarded, 1)
+        for direction in (self.uplink, self.downlink):
+            imp = direction.impairment
+            print(f"[PROXY] {direction.name} received={direction.received} "
+                  f"forwarded={direction.forwarded} | dropped={imp.dropped} "
+                  f"queue_dropped={imp.queue_dropped} duplicated={imp.duplicated} "
+                  f"reordered={imp.reordered} held={len(direction.held)}")
+        print(f"[PROXY] flows active={len(self.flows)} opened={self.flows_opened} "
+              f"expired={self.flows_expired} evicted={self.flows_evicted} "
+              f"errors={self.flow_errors} | in flight={len(self.pending)} "
+              f"(peak {self.peak_pending}) | send errors={self.send_errors} | "
+              f"release late avg={avg * 1000:.3f}ms max={self.late_max * 1000:.3f}ms", flush=True)
+
+
+def udp_proxy(listen_ip, listen_port, server_ip, server_port, quiet=False,
+              stats_interval=STATS_INTERVAL, flow_idle=FLOW_IDLE, max_flows=MAX_FLOWS,
+              reverse=None, **settings):
+    """
+    `settings` impair client -> server traffic, `reverse` (same keys)
+    server -> client traffic. Without `reverse` both directions use the
+    same settings, each with its own state and random stream.
+    """
+    if reverse is None:
+        reverse = dict(settings)
+        if reverse.get("seed") is not None:
+            reverse["seed"] += 1
+    impairment = Impairment(**settings)
+    reverse_impairment = Impairment(**reverse)
+
+    print("\n===============================")
+    print(" UDP IMPAIRMENT PROXY STARTED ")
+    print("===============================")
+    print(f"Listening on       {listen_ip}:{listen_port}")
+    print(f"Forwarding to      {server_ip}:{server_port}")
+    print(f"Idle flows expire  after {flow_idle:g} s")
+    print(f"Max open flows     {max_flows or 'no limit'}")
+    print("--- client -> server ---")
+    for line in impairment.describe():
+        print(line)
+    print(f"Seed               = {settings.get('seed')}")
+    print("--- server -> client ---")
+    for line in reverse_impairment.describe():
+        print(line)
+    print(f"Seed               = {reverse.get('seed')}")
+    print("================================\n")
+
+    ImpairmentProxy(listen_ip, listen_port, server_ip, server_port, impairment,
+                    reverse_impairment, quiet=quiet, stats_interval=stats_interval,
+                    flow_idle=flow_idle, max_flows=max_flows).run()
 
 
 def main():
@@ -75,22 +559,70 @@ def main():
     parser.add_argument("--listen_port", type=int, required=True)
     parser.add_argument("--server_ip", required=True)
     parser.add_argument("--server_port", type=int, required=True)
-    parser.add_argument("--loss", type=float, default=0.0)
-    parser.add_argument("--duplicate", type=float, default=0.0)
-    parser.add_argument("--delay", type=int, default=0)
-    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--profile", type=str, default=None,
+                        help="JSON impairment profile (keys = the option names below)")
+    parser.add_argument("--reverse_profile", type=str, default=None,
+                        help="JSON impairment profile for server -> client traffic "
+                             "(default: same settings as client -> server)")
+
+    # impairments: default None so only flags given explicitly override the profile
+    parser.add_argument("--loss", type=float, help="Bernoulli loss probability")
+    parser.add_argument("--ge_p", type=float, help="Gilbert-Elliott P(good -> bad) per packet")
+    parser.add_argument("--ge_r", type=float, help="Gilbert-Elliott P(bad -> good) per packet")
+    parser.add_argument("--ge_loss_good", type=float, help="Loss probability in the good state")
+    parser.add_argument("--ge_loss_bad", type=float, help="Loss probability in the bad state")
+    parser.add_argument("--duplicate", type=float)
+    parser.add_argument("--delay", type=float, help="Base delay per packet (ms)")
+    parser.add_argument("--jitter", type=float,
+                        help="Jitter (ms): half-width (uniform), std dev (normal) "
+                             "or mean excess (exponential, pareto)")
+    parser.add_argument("--jitter_dist", type=str, choices=JITTER_DISTRIBUTIONS)
+    parser.add_argument("--reorder", type=float, help="Probability a packet is held back")
+    parser.add_argument("--reorder_depth", type=int,
+                        help="Later packets that overtake a held packet")
+    parser.add_argument("--reorder_hold", type=float,
+                        help="Longest a held packet waits for overtakers (ms)")
+    parser.add_argument("--rate", type=float, help="Bottleneck link rate (bytes/s, 0 = none)")
+    parser.add_argument("--queue_limit", type=int,
+                        help="Packets queued at the bottleneck before tail drop (0 = no limit)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible impairments")
+
+    parser.add_argument("--flow_idle", type=float, default=FLOW_IDLE,
+                        help="Seconds without traffic before a client flow is closed")
+    parser.add_argument("--max_flows", "--max-flows", type=int, default=MAX_FLOWS,
+                        help="Open client flows (one upstream socket each) before the least "
+                             "recently active one is evicted (0 = no limit)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="No per-packet console output (for high rates)")
+    parser.add_argument("--stats_interval", type=float, default=STATS_INTERVAL)
 
     args = parser.parse_args()
 
+    settings = dict(DEFAULTS)
+    if args.profile:
+        settings.update(load_profile(args.profile))
+    settings.update({key: getattr(args, key) for key in DEFAULTS
+                     if getattr(args, key) is not None})
+
+    reverse = None
+    if args.reverse_profile:
+        reverse = dict(DEFAULTS)
+        reverse.update(load_profile(args.reverse_profile))
+
+    # `kill <pid>` (as used by the test scripts) stops like Ctrl+C, with a final report
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
     udp_proxy(
         args.listen_ip,
         args.listen_port,
         args.server_ip,
         args.server_port,
-        args.loss,
-        args.duplicate,
-        args.delay,
-        args.reorder
+        quiet=args.quiet,
+        stats_interval=args.stats_interval,
+        flow_idle=args.flow_idle,
+        max_flows=args.max_flows,
+        reverse=reverse,
+        **settings,
     )
 
 
@@ -2,11 +2,16 @@ import socket
 import struct
 import time
 import random
-import os
 import threading
 import argparse
 from itertools import count
 
+from protocol import PacketDecoder, ENCODINGS, parse_config
+from batcher import AdaptiveBatcher, BYTE_BUDGET, MAX_AGE_MS
+from device_ids import allocate_device_ids
+from pacing import Pacer
+from send_queue import SendQueue
+
 data_seq = count(1)       # for DATA packets only
 hb_seq = count(50000)     # heartbeat in separate range to avoid conflict
 cfg_seq = count(60000)    # config replies
@@ -25,10 +30,12 @@ B = > 1 byte (8 bits): flags
 HEADER_FORMAT = "!B H H I B"
 HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
 PORT = 8576                     # Server port
+SERVER_IP = "192.168.208.237"   # your laptop IP (--server-ip)
+SERVER_PORT = PORT              # --server-port, e.g. the impairment proxy
 BUFFER = 2048
 FORMAT = "utf-8"
 
-BATCH_SIZE = 5
+SAMPLES_PER_INTERVAL = 5       # sensor readings per reporting interval in batch mode
 VERSION = 1
 
 MSG_INIT = 0
@@ -38,6 +45,7 @@ MSG_CONFIG = 3
 
 FLAG_BATCH = 0x04
 HEARTBEAT_INTERVAL = 5.0
+SEND_DELAY = 0.005             # --send-batch: longest a DATA message waits for the next ones (s)
 
 # --- UDP CLIENT SETUP ---
 client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -48,48 +56,49 @@ client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 client.bind(("", 0))
 print(f"[CLIENT] Using local UDP port {client.getsockname()[1]}", flush=True)
 
+# Outbound queue: headers packed in place, DATA flushed every `coalesce`
+# messages (one sendmmsg call on Linux); control messages flush immediately
+outbox = SendQueue(client)
+coalesce = 1
+# ...but a queued DATA message is never held more than send_delay seconds
+# waiting for the next one (see the sensor loop)
+send_delay = SEND_DELAY
+
 # Shared mode variable (thread-safe)
 current_mode = "batch"
 mode_lock = threading.Lock()
 
+# Batch payload encoding: requested via CONFIG, used once the server echoes it
+requested_encoding = "text"
+current_encoding = "text"
+
+# per-packet console lines (off with --quiet for kHz rates)
+log_packets = True
+
 # ==============================
 # DEVICE ID HANDLING
 # ==============================
 
 def get_next_device_id(base_id=1000, counter_file="client_ids.txt"):
-    dir_path = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(dir_path, counter_file)
-
-    if not os.path.exists(file_path):
-        last_id = base_id
-    else:
-        with open(file_path, "r") as f:
-            content = f.read().strip()
-            last_id = int(content) if content else base_id
-
-    new_id = last_id + 1
-
-    with open(file_path, "w") as f:
-        f.write(str(new_id))
-
-    return new_id
+    # locked read-modify-write: concurrent clients never share an ID
+    return allocate_device_ids(1, base_id, counter_file)
 
 deviceID = get_next_device_id()
 
 # ==============================
-# PACK HEADER
+# SEND MESSAGE
 # ==============================
 
-def pack_header(version, msgType, deviceID, seqNum, timestamp, flags):
-    version_type = (version << 4) | (msgType & 0x0F)
-    return struct.pack(
-        HEADER_FORMAT,
-        version_type,
-        deviceID & 0xFFFF,
-        seqNum & 0xFFFF,
-        timestamp & 0xFFFFFFFF,
-        flags & 0xFF
-    )
+def send_message(msgType, seqNum, timestamp, flags, payload, address, flush=True):
+    """
+    Queues one message; the header is packed straight into the send queue.
+    DATA passes flush=False and goes out once `coalesce` messages are queued,
+    or before the sensor loop waits past its send_delay.
+    """
+    version_type = (VERSION << 4) | (msgType & 0x0F)
+    outbox.add(version_type, deviceID, seqNum, timestamp, flags, payload, address)
+    if flush or len(outbox) >= coalesce:
+        outbox.flush()
 
 # ==============================
 # SENSOR SIMULATOR
@@ -102,28 +111,45 @@ def virtual_sensor():
 # RECEIVE THREAD - CONFIG Handler
 # ==============================
 
+def mode_request(mode):
+    """CONFIG payload; ENC is only sent when a binary encoding is wanted."""
+    if requested_encoding == "text":
+        return f"MODE={mode}"
+    return f"MODE={mode};ENC={requested_encoding}"
+
+
 def config_listener():
-    global current_mode
+    global current_mode, current_encoding
+
+    decoder = PacketDecoder(BUFFER)
 
     while True:
         try:
-            data, _ = client.recvfrom(BUFFER)
-            if len(data) < HEADER_SIZE:
+            packet, _ = decoder.recv(client)
+            header = decoder.header(packet)
+            if header is None:
                 continue
 
-            version_type, devID, seq, ts, flags = struct.unpack(HEADER_FORMAT, data[:HEADER_SIZE])
+            version_type, devID, seq, ts, flags = header
             msgType = version_type & 0x0F
 
             if msgType == MSG_CONFIG:
-                payload = data[HEADER_SIZE:].decode(FORMAT).strip()
+                config = parse_config(decoder.payload_text(packet))
 
-                if payload.startswith("MODE="):
-                    new_mode = payload.split("=")[1].lower()
+                if "MODE" in config:
+                    new_mode = config["MODE"]
+                    # a reply without ENC means the server only speaks text
+                    new_encoding = config.get("ENC", "text")
+                    if new_encoding not in ENCODINGS:
+                        new_encoding = "text"
 
                     with mode_lock:
                         if new_mode != current_mode:
                             current_mode = new_mode
                             print(f"\n[CONFIG RECEIVED] Server set mode to: {new_mode.upper()}\n", flush=True)
+                        if new_encoding != current_encoding:
+                            current_encoding = new_encoding
+                            print(f"[CONFIG RECEIVED] Batch encoding: {new_encoding.upper()}", flush=True)
 
         except Exception:
             continue
@@ -141,13 +167,26 @@ def heartbeat_loop(address, stop_event, last_data_time):
             seqNum = next(hb_seq)
             timestamp = int(time.time() * 1000) & 0xFFFFFFFF
 
-            header = pack_header(VERSION, MSG_HEARTBEAT, deviceID, seqNum, timestamp, 0)
-            client.sendto(header, address)
+            send_message(MSG_HEARTBEAT, seqNum, timestamp, 0, b"", address)
 
             print(f"[HEARTBEAT SENT] seq={seqNum}", flush=True)
             last_data_time[0] = time.time()  # Reset timer
 
 
+# ==============================
+# BATCH SENDER
+# ==============================
+
+def send_batch(packet, address):
+    """Sends one closed batch from AdaptiveBatcher."""
+    timestamp, payload, flags, count = packet
+    seq = next(data_seq)
+
+    send_message(MSG_DATA, seq, timestamp, FLAG_BATCH | flags, payload, address, flush=False)
+    if log_packets:
+        print(f"[CLIENT BATCH] seq={seq} readings={count} bytes={len(payload)}", flush=True)
+
+
 # ==============================
 # KEYBOARD LISTENER (RUNTIME MODE CHANGE)
 # ==============================
@@ -164,18 +203,9 @@ def keyboard_listener(address):
             if cmd in ("single", "batch"):
                 timestamp = int(time.time() * 1000) & 0xFFFFFFFF
                 seq = next(cfg_seq)
-                payload = f"MODE={cmd}".encode(FORMAT)
-
-                header = pack_header(
-                    VERSION,
-                    MSG_CONFIG,
-                    deviceID,
-                    seq,
-                    timestamp,
-                    0
-                )
-
-                client.sendto(header + payload, address)
+                payload = mode_request(cmd).encode(FORMAT)
+
+                send_message(MSG_CONFIG, seq, timestamp, 0, payload, address)
                 print(f"[CLIENT] Requested MODE={cmd.upper()}", flush=True)
 
             else:
@@ -189,26 +219,26 @@ def keyboard_listener(address):
 # MAIN CLIENT LOOP
 # ==============================
 
-def start(reporting_interval=1, mode="single"):
-    global current_mode
+def start(reporting_interval=1, mode="single", encoding="text",
+          batch_budget=BYTE_BUDGET, batch_age_ms=MAX_AGE_MS, burst=None,
+          server_ip=SERVER_IP, server_port=SERVER_PORT):
+    global current_mode, requested_encoding
     current_mode = mode
+    requested_encoding = encoding
 
     print(f"[CLIENT] Starting in mode = {mode}", flush=True)
 
-    # ---------- FIXED: DIRECT CONNECTION ----------
-    SERVER_IP = "192.168.208.237"    # your laptop IP
-    SERVER_PORT = 8576             # your fixed server port
-    ADDRESS = (SERVER_IP, SERVER_PORT)
+    # ---------- DIRECT CONNECTION (or through middleman.py) ----------
+    ADDRESS = (server_ip, server_port)
 
-    print(f"[CLIENT] Connecting directly to {SERVER_IP}:{SERVER_PORT}", flush=True)
+    print(f"[CLIENT] Connecting directly to {server_ip}:{server_port}", flush=True)
 
 
 
     # ---------- SEND INIT ----------
     seqNum = 0
     timestamp = int(time.time() * 1000) & 0xFFFFFFFF
-    header = pack_header(VERSION, MSG_INIT, deviceID, seqNum, timestamp, 0)
-    client.sendto(header, ADDRESS)
+    send_message(MSG_INIT, seqNum, timestamp, 0, b"", ADDRESS)
 
     print(f"[INIT SENT] deviceID={deviceID}, seq={seqNum}", flush=True)
 
@@ -218,12 +248,11 @@ def start(reporting_interval=1, mode="single"):
     # ---------- SEND INITIAL CONFIG ----------
     timestamp = int(time.time() * 1000) & 0xFFFFFFFF
     seq_cfg = next(cfg_seq)
-    payload_str = f"MODE={current_mode}"  # or mode, same value
+    payload_str = mode_request(current_mode)
     payload = payload_str.encode(FORMAT)
 
-    header = pack_header(VERSION, MSG_CONFIG, deviceID, seq_cfg, timestamp, 0)
-    client.sendto(header + payload, ADDRESS)
-    print(f"[CLIENT] Sent initial CONFIG: MODE={current_mode.upper()}", flush=True)
+    send_message(MSG_CONFIG, seq_cfg, timestamp, 0, payload, ADDRESS)
+    print(f"[CLIENT] Sent initial CONFIG: {payload_str.upper()}", flush=True)
 
     # START CONFIG LISTENER
     threading.Thread(target=config_listener, daemon=True).start()
@@ -244,45 +273,73 @@ def start(reporting_interval=1, mode="single"):
 
 
     # SENSOR LOOP
-    batch = []
+    # batch mode samples SAMPLES_PER_INTERVAL readings per interval and sends
+    # whenever the batcher closes a batch (byte budget or max age reached)
+    batcher = None
+
+    # sends are paced on absolute deadlines, not sleep() after the work
+    pacer = None
+
+    def close_batcher():
+        if batcher is not None:
+            packet = batcher.flush(int(time.time() * 1000))
+            if packet is not None:
+                send_batch(packet, ADDRESS)
+            batcher.report()
 
     try:
         while True:
             with mode_lock:
                 mode_now = current_mode
+                encoding_now = current_encoding
+
+            rate = 1.0 / reporting_interval
+            if mode_now != "single":
+                rate *= SAMPLES_PER_INTERVAL
+            if pacer is None:
+                pacer = Pacer(rate, burst)
+            elif rate != pacer.rate:
+                pacer.report()
+                pacer.set_rate(rate)
+            # --send-batch: queued DATA only waits for the next slot if that
+            # slot is within send_delay of the oldest queued message
+            if len(outbox) and pacer.next_slot - outbox.first_added > send_delay:
+                outbox.flush()
+            pacer.wait()
 
             if mode_now == "single":
+                if batcher is not None:
+                    close_batcher()
+                    batcher = None
+
                 value = virtual_sensor()
                 timestamp = int(time.time() * 1000) & 0xFFFFFFFF
                 seq = next(data_seq)
                 payload = f"Reading={value}".encode(FORMAT)
 
-                header = pack_header(VERSION, MSG_DATA, deviceID, seq, timestamp, 0)
-                client.sendto(header + payload, ADDRESS)
-                print(f"[CLIENT SINGLE] seq={seq} value={value}", flush=True)
+                send_message(MSG_DATA, seq, timestamp, 0, payload, ADDRESS, flush=False)
+                if log_packets:
+                    print(f"[CLIENT SINGLE] seq={seq} value={value}", flush=True)
                 last_data_time[0] = time.time()  # Update last data time
 
-                time.sleep(reporting_interval)
-
             else:  # BATCH MODE
-                timestamp = int(time.time() * 1000) & 0xFFFFFFFF
-
-                for _ in range(BATCH_SIZE):
-                    batch.append(virtual_sensor())
-
-                seq = next(data_seq)
-                payload = ";".join(str(v) for v in batch).encode(FORMAT)
+                # encoding changed by the server reply: send what was built so far
+                if batcher is None or batcher.encoding != encoding_now:
+                    close_batcher()
+                    batcher = AdaptiveBatcher(encoding_now, batch_budget, batch_age_ms)
 
-                header = pack_header(VERSION, MSG_DATA, deviceID, seq, timestamp, FLAG_BATCH)
-                client.sendto(header + payload, ADDRESS)
-
-                print(f"[CLIENT BATCH] seq={seq} values={batch}", flush=True)
-                last_data_time[0] = time.time()  # Update last data time
-
-                batch.clear()
-                time.sleep(reporting_interval)
+                now = int(time.time() * 1000)
+                for packet in (batcher.add(virtual_sensor(), now), batcher.poll(now)):
+                    if packet is not None:
+                        send_batch(packet, ADDRESS)
+                        last_data_time[0] = time.time()  # Update last data time
 
     except KeyboardInterrupt:
+        close_batcher()
+        outbox.flush()
+        if pacer is not None:
+            pacer.report()
+        outbox.report()
         stop_event.set()
         hb_thread.join()
         print("\n[CLIENT EXIT]")
@@ -290,11 +347,38 @@ def start(reporting_interval=1, mode="single"):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
+    parser.add_argument("--server-ip", type=str, default=SERVER_IP,
+                        help="Server (or impairment proxy) address")
+    parser.add_argument("--server-port", type=int, default=SERVER_PORT,
+                        help="Server (or impairment proxy) UDP port")
     parser.add_argument("--mode", type=str, default="single",
                         choices=["batch", "single"],
                         help="Initial sending mode for the client")
     parser.add_argument("--interval", type=float, default=1.0,
                         help="Reporting interval in seconds")
+    parser.add_argument("--encoding", type=str, default="text",
+                        choices=list(ENCODINGS),
+                        help="Batch payload encoding to negotiate with the server")
+    parser.add_argument("--batch-budget", type=int, default=BYTE_BUDGET,
+                        help="Max batch payload bytes (capped to fit a 1500-byte MTU)")
+    parser.add_argument("--batch-age-ms", type=int, default=MAX_AGE_MS,
+                        help="Max time the oldest reading waits in a batch")
+    parser.add_argument("--burst", type=int, default=None,
+                        help="Overdue send slots that may go out back-to-back (default: 10 ms worth)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="No per-packet console output (for high rates)")
+    parser.add_argument("--send-batch", type=int, default=1,
+                        help="DATA messages coalesced per send call (1 = send each at once); "
+                             "a reading is held at most --send-delay-ms for the next ones, "
+                             "so coalescing only happens at rates above 1000/send-delay-ms per second")
+    parser.add_argument("--send-delay-ms", type=float, default=SEND_DELAY * 1000,
+                        help="Longest a queued DATA message waits for --send-batch to fill")
     args = parser.parse_args()
 
-    start(reporting_interval=args.interval, mode=args.mode)
+    log_packets = not args.quiet
+    coalesce = max(1, min(args.send_batch, outbox.depth))
+    send_delay = args.send_delay_ms / 1000
+
+    start(reporting_interval=args.interval, mode=args.mode, encoding=args.encoding,
+          batch_budget=args.batch_budget, batch_age_ms=args.batch_age_ms, burst=args.burst,
+          server_ip=args.server_ip, server_port=args.server_port)
@@ -1,10 +1,24 @@
 import socket
+import select
+import signal
+import asyncio
 import struct
 import time
-import csv
 import os
 from datetime import datetime
 
+from log_writer import GroupCommitWriter, CsvSink, COMMIT_ROWS, COMMIT_LATENCY, QUEUE_SIZE
+from binlog import BinarySink
+from protocol import PacketDecoder, ENCODINGS, parse_config, clamp_mode
+from liveness import LivenessMonitor
+from live_stats import LiveStats
+from rx_queue import (LoadShedder, OverflowReceiver, read_kernel_drops,
+                      size_receive_buffer, RX_BURST)
+from console_log import ConsoleLog, LEVELS, DEBUG, INFO, WARNING, RATE_LIMIT
+from profiling import (StageTimer, PROFILERS, PROFILE_SECONDS, STAGE_RECV, STAGE_HEADER,
+                       STAGE_STATE, STAGE_CONTROL, STAGE_DECODE, STAGE_LIVE, STAGE_LOG,
+                       STAGE_CONSOLE, STAGE_HOUSEKEEPING)
+
 # ===========================================================
 # PROTOCOL CONSTANTS
 # ===========================================================
@@ -34,6 +48,21 @@ FLAG_BATCH = 0x04
 HEARTBEAT_INTERVAL_MS = 6000
 MAX_MISSED_HEARTBEATS = 5
 
+# CSV log columns
+CSV_HEADER = [
+    "device_id", "seq", "timestamp", "arrival_time",
+    "duplicate_flag", "gap_flag", "reorder_flag", "payload_size",
+    "is_batch", "mode", "sample_weight", "event"
+]
+
+# Sequence tracking: anti-replay style bitmap of the last SEQ_WINDOW seqs
+SEQ_WINDOW = 64
+WINDOW_MASK = (1 << SEQ_WINDOW) - 1
+
+# Receive loop tuning
+DRAIN_BATCH = 256          # max datagrams drained per wakeup (bulk engine)
+STATS_INTERVAL = 5.0       # seconds between receive-rate reports
+
 
 # ===========================================================
 # DEVICE STATE
@@ -43,20 +72,82 @@ class DeviceState:
         self.last_seq = None
         self.last_timestamp = None
         self.last_full_timestamp = None
-        self.received_seqs = set()
-        self.duplicate_seqs = set()
+        # bit i set <=> seq (last_seq - i) was received (DTLS/IPsec anti-replay window)
+        self.seq_window = 0
+        self.duplicates = 0
+        self.late = 0          # too old for the window: can't tell duplicate from reorder
         self.gaps = 0
         self.mode = "unknown"
         self.address = None
 
         self.last_heartbeat = None
+        self.last_seen = None
         self.missed_heartbeats = 0
         self.connected = True
 
+    def seq_delta(self, seq):
+        # Signed distance from last_seq in 16-bit serial arithmetic (RFC 1982):
+        # 65535 -> 0 is +1, not -65535
+        return ((seq - self.last_seq + 0x8000) & 0xFFFF) - 0x8000
+
+    def reset_seq(self, seq):
+        self.last_seq = seq
+        self.seq_window = 1
+        self.gaps = 0
+        self.duplicates = 0
+        self.late = 0
+
     def update_last(self, seq, timestamp):
+        if self.last_seq is None:
+            self.seq_window = 1
+        else:
+            delta = self.seq_delta(seq)
+            if delta >= SEQ_WINDOW:
+                self.seq_window = 1
+            elif delta > 0:
+                self.seq_window = ((self.seq_window << delta) | 1) & WINDOW_MASK
+
         self.last_seq = seq
         self.last_timestamp = timestamp
 
+    def classify(self, seq):
+        """
+        Duplicate / reorder check against the window anchored at last_seq.
+        Returns (duplicate, reordered). Packets ahead of last_seq are neither;
+        the caller advances the window with update_last().
+        """
+        if self.last_seq is None:
+            return False, False
+
+        offset = -self.seq_delta(seq)
+        if offset < 0:
+            return False, False
+
+        if offset >= SEQ_WINDOW:
+            # older than the window: arrived out of order, duplicate unknown
+            self.late += 1
+            return False, True
+
+        bit = 1 << offset
+        if self.seq_window & bit:
+            self.duplicates += 1
+            return True, False
+
+        self.seq_window |= bit
+        return False, True
+
+    def track(self, seq, flags, timestamp):
+        """
+        Full DATA-packet sequence step: (duplicate, reordered, gap). Gap
+        detection and the window advance only apply to in-order packets.
+        """
+        duplicate, reordered = self.classify(seq)
+        if duplicate or reordered:
+            return duplicate, reordered, False
+
+        gap = self.detect_gap(seq, flags)
+        self.update_last(seq, timestamp)
+        return False, False, gap
 
     def detect_gap(self, seq, flags=None):
         BATCH_FLAG = 0x04
@@ -64,81 +155,256 @@ class DeviceState:
         if self.last_seq is None:
             return False
 
+        delta = self.seq_delta(seq)
+
         # Batch packets: ignore normal jumps
         if flags is not None and (flags & BATCH_FLAG):
-            # Only detect wrap-around or backward jumps
-            if seq <= self.last_seq and (self.last_seq - seq) < 30000:
+            # Only detect backward jumps
+            if delta <= 0:
                 self.gaps += 1
                 return True
             return False
 
         # Normal (single-mode) expected behaviour
-        expected = (self.last_seq + 1) & 0xFFFF
-
-        if seq == expected:
+        if delta == 1 or delta <= 0:
             return False
 
-        # Real forward gap
-        if seq > self.last_seq:
-            self.gaps += (seq - self.last_seq - 1)
-        else:
-            # wrap-around
-            self.gaps += ((0xFFFF - self.last_seq) + seq)
-
+        # Real forward gap (wrap-around included)
+        self.gaps += delta - 1
         return True
 
 
+# ===========================================================
+# DEFAULT LOG LOCATION
+# ===========================================================
+def default_csv_filename(log_format="csv"):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = "D:/Uni projects/senior 1/networks/Project/IoT-Telemetry-Protocol/telemetry_tests/project"
+    os.makedirs(base, exist_ok=True)
+    return os.path.join(base, f"telemetry_log_{timestamp}.{log_format}")
+
+
+# ===========================================================
+# RECEIVE STATISTICS
+# ===========================================================
+class ReceiveStats:
+    """
+    Packets/s and kernel drop counts, reported every `interval` seconds so
+    the receive loops can be compared under the same load. Missing DATA
+    seqs are split into local drops (our receive queue overflowed) and
+    network loss (everything the kernel counters cannot account for).
+    """
+
+    def __init__(self, sock, interval=STATS_INTERVAL):
+        self.sock = sock
+        self.interval = interval
+        self.packets = 0
+        self.wakeups = 0
+        self.readings = 0          # readings decoded from binary batches
+        self.missing = 0           # DATA seqs skipped over by gap detection
+        self.overflow = None       # OverflowReceiver when SO_RXQ_OVFL is in use
+        self.started = time.monotonic()
+        self.base_drops = read_kernel_drops(sock)
+        self._last_drops = None
+        self.reporters = []        # extra report() callables (e.g. log writer)
+
+        self._window_start = self.started
+        self._window_packets = 0
+        self._window_wakeups = 0
+
+    def count(self, n):
+        self.packets += n
+        self.wakeups += 1
+        self._window_packets += n
+        self._window_wakeups += 1
+
+    def kernel_drops(self):
+        if self.overflow is not None:
+            # carried in-band by every datagram: no /proc scan needed
+            self._last_drops = self.overflow.dropped - (self.base_drops or 0)
+            return self._last_drops
+
+        drops = read_kernel_drops(self.sock)
+        if drops is None or self.base_drops is None:
+            # socket already closed (e.g. by the asyncio transport): keep last reading
+            return self._last_drops
+        self._last_drops = drops - self.base_drops
+        return self._last_drops
+
+    def attribute_gaps(self, drops):
+        """(local, network) split of the missing seqs seen so far."""
+        if drops is None:
+            return None, None
+        # a dropped datagram shows up as a gap once the device's next
+        # packet arrives; drops beyond that were INIT/HEARTBEAT/CONFIG or
+        # are not detected yet
+        local = min(self.missing, drops)
+        return local, self.missing - local
+
+    def maybe_report(self):
+        now = time.monotonic()
+        if now - self._window_start >= self.interval:
+            self.report(now)
+
+    def report(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        elapsed = max(now - self._window_start, 1e-9)
+        pps = self._window_packets / elapsed
+        per_wakeup = self._window_packets / max(self._window_wakeups, 1)
+        drops = self.kernel_drops()
+
+        print(f"[STATS] {pps:.0f} pkt/s | {per_wakeup:.1f} pkt/wakeup | "
+              f"total={self.packets} | binary_readings={self.readings} | kernel_drops="
+              f"{'n/a' if drops is None else drops}")
+        local, network = self.attribute_gaps(drops)
+        print(f"[DROPS] missing seqs={self.missing} | local (rx queue overflow)="
+              f"{'n/a' if local is None else local} | network="
+              f"{'n/a' if network is None else network}")
+        for reporter in self.reporters:
+            reporter()
+
+        self._window_start = now
+        self._window_packets = 0
+        self._window_wakeups = 0
+
+
 class TelemetryServer:
-    def __init__(self, port=PORT, csv_filename=None):
+    def __init__(self, port=PORT, csv_filename=None, stats_interval=STATS_INTERVAL,
+                 reuse_port=False, shard=None, commit_rows=COMMIT_ROWS,
+                 commit_latency=COMMIT_LATENCY, log_queue=QUEUE_SIZE, log_policy="block",
+                 log_format="csv", device_table=False, rx_burst=RX_BURST,
+                 rx_overflow=False, shed=True, shed_rows=False, live_stats=True,
+                 log_level="debug",
+                 log_rate=RATE_LIMIT, stages=False, profile=None,
+                 profile_seconds=PROFILE_SECONDS):
         self.port = port
-        self.device_state = {}
+
+        # leveled, rate-limited per-packet console lines
+        self.log = ConsoleLog(log_level, log_rate)
+
+        # deviceID -> DeviceState, or the preallocated struct-of-arrays table
+        if device_table:
+            from device_table import DeviceTable
+            self.device_state = DeviceTable()
+        else:
+            self.device_state = {}
         print("[SERVER] State cleared.")
 
+        # Device ownership when running as one of several SO_REUSEPORT workers
+        self.shard = shard
+
         # UDP server
         self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if reuse_port:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server.bind(("0.0.0.0", self.port))
         self.server.settimeout(1.0)
         print(f"[SERVER] Listening on UDP port {self.port}")
 
+        # receive queue sized for a burst of rx_burst datagrams
+        self.rcvbuf = size_receive_buffer(self.server, rx_burst)
+
+        self.stats = ReceiveStats(self.server, stats_interval)
+        self.decoder = PacketDecoder(BUFFER)
+        self._unpack_header = self.decoder.unpack_header
+
+        # per-datagram drop counter for the blocking engines (SO_RXQ_OVFL)
+        self.overflow = None
+        if rx_overflow:
+            if OverflowReceiver.supported(self.server):
+                self.overflow = OverflowReceiver(self.server, BUFFER)
+            else:
+                print("[RXBUF] SO_RXQ_OVFL not available: polling /proc/net/udp")
+
+        # deliberate shedding under overload: console, then (opt-in) sampled logging
+        self.shedder = LoadShedder(self.server, self.rcvbuf, enabled=shed, sample_rows=shed_rows)
+        self.stats.reporters.append(self.shedder.report)
+        self.stats.reporters.append(self.log.report)
+
+        # Replaced by the transport's sendto when running on asyncio
+        self._sendto = self.server.sendto
+
+        # dead-device detection (hashed timer wheel, see liveness.py)
+        self.liveness = LivenessMonitor(
+            self.device_state, int(time.time() * 1000),
+            HEARTBEAT_INTERVAL_MS, MAX_MISSED_HEARTBEATS, shard=shard,
+            on_evict=self.evict_device, log=self.log,
+        )
+        self.stats.reporters.append(self.liveness.report)
+
 
         # CSV SETUP
         if csv_filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base = "D:/Uni projects/senior 1/networks/Project/IoT-Telemetry-Protocol/telemetry_tests/project"
-            os.makedirs(base, exist_ok=True)
-            csv_filename = os.path.join(base, f"telemetry_log_{timestamp}.csv")
+            csv_filename = default_csv_filename(log_format)
 
         os.makedirs(os.path.dirname(csv_filename), exist_ok=True)
-        self.csv_file = open(csv_filename, "w", newline="")
-        self.csv_writer = csv.writer(self.csv_file)
 
-        self.csv_writer.writerow([
-            "device_id", "seq", "timestamp", "arrival_time",
-            "duplicate_flag", "gap_flag", "reorder_flag", "payload_size",
-            "is_batch", "mode"
-        ])
+        # Same rows either way: text CSV or fixed-width binary records
+        if log_format == "bin":
+            sink = BinarySink(csv_filename, CSV_HEADER)
+        else:
+            sink = CsvSink(csv_filename, CSV_HEADER)
 
-        print(f"[CSV] Logging to {csv_filename}\n")
+        # Rows are committed in groups by a background writer thread
+        self.log_writer = GroupCommitWriter(
+            sink, CSV_HEADER,
+            commit_rows=commit_rows, commit_latency=commit_latency,
+            queue_size=log_queue, policy=log_policy,
+        )
+        self.stats.reporters.append(self.log_writer.report)
+
+        # live per-device stats, snapshot written next to the log
+        self.live = None
+        if live_stats:
+            self.live = LiveStats(os.path.splitext(csv_filename)[0] + ".live.json")
+            self.stats.reporters.append(self.live.report)
+
+        # `kill -USR1 <pid>`: summary now instead of at the next report;
+        # `kill -USR2 <pid>`: per-device stats (slow with many devices).
+        # The handlers only set a flag, housekeeping() does the work: a
+        # print from inside a handler can land in the middle of another one
+        self._report_requested = False
+        self._devices_requested = False
+        if self.live is not None and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request_report())
+            signal.signal(signal.SIGUSR2, lambda signum, frame: self.request_devices())
+
+        # per-stage timing; None keeps every hook down to one `if tick:` test
+        self.stages = StageTimer() if stages else None
+        self._tick = self.stages.tick if stages else None
+        if stages:
+            self.stats.reporters.append(self.stages.report)
+
+        # bounded profiling window, results written next to the log
+        self.profiler = None
+        if profile is not None:
+            self.profiler = PROFILERS[profile](os.path.splitext(csv_filename)[0] + ".profile",
+                                               profile_seconds)
+
+        print(f"[{log_format.upper()}] Logging to {csv_filename}\n")
 
     # =======================================================
     # SEND CONFIG REPLY TO CLIENT
     # =======================================================
-    def send_config(self, deviceID, mode):
+    def send_config(self, deviceID, mode, encoding=None):
         """
         Sends confirmation back to the client.
         Used ONLY as a reply (server does not choose the mode).
+        ENC is only echoed when the client asked for an encoding.
         """
 
         if deviceID not in self.device_state:
-            print(f"[CONFIG ERROR] Device {deviceID} not recognized")
+            self.log.log(WARNING, "CONFIG ERROR", f"Device {deviceID} not recognized")
             return
 
         state = self.device_state[deviceID]
         if state.address is None:
-            print(f"[CONFIG ERROR] No client address saved for {deviceID}")
+            self.log.log(WARNING, "CONFIG ERROR", f"No client address saved for {deviceID}")
             return
 
-        payload = f"MODE={mode}".encode(FORMAT)
+        reply = f"MODE={mode}" if encoding is None else f"MODE={mode};ENC={encoding}"
+        payload = reply.encode(FORMAT)
         timestamp = int(time.time() * 1000) & 0xFFFFFFFF
 
         header = struct.pack(
@@ -150,8 +416,9 @@ class TelemetryServer:
             0
         )
 
-        self.server.sendto(header + payload, state.address)
-        print(f"[CONFIG SENT] Device {deviceID} → MODE={mode.upper()}")
+        self._sendto(header + payload, state.address)
+        if self.log.allow(INFO, "CONFIG SENT"):
+            print(f"[CONFIG SENT] Device {deviceID} → {reply.upper()}")
 
     # =======================================================
     # Unwrap the timestamp
@@ -162,120 +429,408 @@ class TelemetryServer:
             state.last_full_timestamp = wrapped_ts
             return wrapped_ts
 
-        # If wrapped_ts looks too small (wraparound)
-        if wrapped_ts < (state.last_full_timestamp & 0xFFFFFFFF):
-            # add 2^32 to move to next wrap window
-            state.last_full_timestamp += (1 << 32)
+        # Signed distance from the newest timestamp seen (half-range rule, as
+        # for sequence numbers): a reordered packet is slightly older, not
+        # one wrap window newer
+        delta = (wrapped_ts - state.last_full_timestamp) & 0xFFFFFFFF
+        if delta >= (1 << 31):
+            delta -= (1 << 32)
+        full = state.last_full_timestamp + delta
 
-        # update lower 32 bits
-        state.last_full_timestamp = (state.last_full_timestamp & ~0xFFFFFFFF) | wrapped_ts
+        if delta > 0:
+            state.last_full_timestamp = full
+        return full
 
-        return state.last_full_timestamp
 
+    # =======================================================
+    # DEVICE LIFECYCLE
+    # =======================================================
+    def new_device(self, deviceID, client, arrival):
+        if isinstance(self.device_state, dict):
+            state = self.device_state[deviceID] = DeviceState()
+        else:
+            state = self.device_state.activate(deviceID)
+
+        if self.shard is not None:
+            self.shard.claim(deviceID, client)
+
+        # one liveness deadline per device; packets only refresh last_seen
+        self.liveness.watch(deviceID, arrival)
+        return state
+
+    def evict_device(self, deviceID, state, now_ms, event):
+        # liveness is about to drop the DeviceState: one event row in the log
+        # (sample_weight 0, not a packet) so offline analysis sees it too
+        last_seq = state.last_seq
+        timestamp = state.last_full_timestamp
+        self.log_writer.write((
+            deviceID, 0 if last_seq is None else last_seq,
+            0 if timestamp is None else timestamp, now_ms,
+            0, 0, 0, 0, 0, state.mode, 0, event
+        ))
+        if self.live is not None:
+            self.live.remove(deviceID)
+
+    def request_report(self):
+        self._report_requested = True
+
+    def request_devices(self):
+        self._devices_requested = True
+
+    def housekeeping(self):
+        # Blocking engines advance the liveness wheel from their receive loop;
+        # a call between ticks is a single comparison
+        self.liveness.tick(int(time.time() * 1000))
+        self.shedder.update()
+        if self.profiler is not None:
+            self.profiler.maybe_stop()
+        if self._report_requested or self._devices_requested:
+            self.serve_requests()
+
+    def serve_requests(self):
+        # SIGUSR1 / SIGUSR2, serviced between packets
+        if self._report_requested:
+            self._report_requested = False
+            self.live.report()
+        if self._devices_requested:
+            self._devices_requested = False
+            self.live.write_devices()
+
+    # =======================================================
+    # PACKET HANDLING (shared by every receive loop)
+    # =======================================================
+    def handle_packet(self, data, client, arrival):
+        # data may be bytes or a memoryview of a reused receive buffer
+        # tick(stage): time since the previous tick goes to `stage` (--stages)
+        tick = self._tick
+        if len(data) < HEADER_SIZE:
+            return
+        version_type, deviceID, seq, timestamp, flags = self._unpack_header(data)
+        msgType = version_type & 0x0F
+        if tick:
+            tick(STAGE_HEADER)
+
+        # get or create state
+        state = self.device_state.get(deviceID)
+        if state is None:
+            state = self.new_device(deviceID, client, arrival)
+        state.address = client
+        state.last_seen = arrival
+        timestamp_full = self.unwrap_timestamp(state, timestamp)
+
+        # per-packet console lines: debug level, rate-limited per tag, and
+        # none at all from shed level 1
+        log = self.log
+        shedder = self.shedder
+        verbose = log.verbose and not shedder.level
+        if tick:
+            tick(STAGE_STATE)
+        if verbose and log.allow(DEBUG, "RECV"):
+            print(f"[RECV] Packet from {client} | type={msgType} seq={seq} flags={flags}")
+        if tick:
+            tick(STAGE_CONSOLE)
+
+        # ---------- INIT ----------
+        if msgType == INIT_MSG:
+            if log.allow(INFO, "INIT"):
+                print(f"[INIT] Device {deviceID} connected.")
+
+            # RESET STATE FOR THIS DEVICE
+            state.reset_seq(seq)      # seq=0
+            state.last_timestamp = timestamp
+
+            if tick:
+                tick(STAGE_CONTROL)
+            return
+
+        # ---------- CONFIG FROM CLIENT ----------
+        if msgType == CONFIG_MSG:
+            # only CONFIG needs the payload as text
+            config = parse_config(self.decoder.payload_text(data))
+            if "MODE" in config:
+                # the name ends up in every log row: bounded, printable text only
+                new_mode = clamp_mode(config["MODE"])
+                if new_mode is None:
+                    log.log(WARNING, "CONFIG ERROR", f"Device {deviceID} sent an invalid MODE")
+                    if tick:
+                        tick(STAGE_CONTROL)
+                    return
+                state.mode = new_mode
+
+                # unknown encodings are refused by answering ENC=text
+                encoding = config.get("ENC")
+                if encoding is not None and encoding not in ENCODINGS:
+                    encoding = "text"
+
+                if log.allow(INFO, "CONFIG REQUEST"):
+                    print(f"[CONFIG REQUEST] Device {deviceID} → MODE={new_mode.upper()}"
+                          f"{'' if encoding is None else ' ENC=' + encoding.upper()}")
+                self.send_config(deviceID, new_mode, encoding)
+            if tick:
+                tick(STAGE_CONTROL)
+            return
+
+        # ---------- HEARTBEAT ----------
+        if msgType == HEARTBEAT_MSG:
+            state.last_heartbeat = arrival
+            state.missed_heartbeats = 0
+            if verbose and log.allow(DEBUG, "HEARTBEAT"):
+                print(f"[HEARTBEAT] Device={deviceID}")
+            if tick:
+                tick(STAGE_CONTROL)
+            return
+
+        # ---------- DATA PACKET ----------
+        # 1-4) DUPLICATE / REORDER / GAP detection (bitmap window, O(1));
+        #      last_seq/timestamp only advance for in-order packets
+        missing = 0
+        if msgType == DATA_MSG:
+            gaps_before = state.gaps
+            duplicate_flag, reordered_flag, gap_flag = state.track(seq, flags, timestamp)
+            if gap_flag:
+                missing = state.gaps - gaps_before
+                self.stats.missing += missing
+        else:
+            duplicate_flag, reordered_flag = state.classify(seq)
+            gap_flag = False
+
+        # 5) Batch flag & payload size
+        is_batch = 1 if (flags & FLAG_BATCH) else 0
+        payload_size = len(data) - HEADER_SIZE
+        if tick:
+            tick(STAGE_STATE)
+
+        # binary batches decode in one step into an array('f')
+        readings = self.decoder.readings(data, flags)
+        if readings is not None:
+            self.stats.readings += len(readings)
+        if tick:
+            tick(STAGE_DECODE)
+
+        # live per-device counters / jitter / latency histogram, O(1)
+        if self.live is not None and msgType == DATA_MSG:
+            self.live.record(deviceID, arrival, timestamp_full, len(data),
+                             duplicate_flag, reordered_flag, missing)
+            if tick:
+                tick(STAGE_LIVE)
+
+        # 6) QUEUE CSV ROW (group-committed by the log writer); with
+        #    --shed-rows, at shed level 2+ clean rows are sampled and a kept
+        #    one records how many rows it stands for
+        weight = 1
+        if shedder.sample_mask:
+            weight = shedder.row_weight(duplicate_flag or gap_flag or reordered_flag)
+        if weight:
+            self.log_writer.write((
+                deviceID, seq, timestamp_full, arrival,
+                int(duplicate_flag), int(gap_flag), int(reordered_flag),
+                payload_size, is_batch, state.mode, weight, ""
+            ))
+        if tick:
+            tick(STAGE_LOG)
+
+        if verbose and log.allow(DEBUG, "DATA"):
+            print(f"[DATA] Dev={deviceID} seq={seq} mode={state.mode} REORDER={reordered_flag} is_batch={is_batch} GAP={gap_flag}")
+        if tick:
+            tick(STAGE_CONSOLE)
 
     # =======================================================
     # SERVER LOOP
     # =======================================================
     def start(self):
+        # one reused receive buffer; data is a view into it
+        recv = self.decoder.recv
+        if self.overflow is not None:
+            recv = self.overflow.recv
+            self.stats.overflow = self.overflow
+        sock = self.server
+        tick = self._tick
+        self.start_profiler()
         try:
             while True:
                 try:
-                    data, client = self.server.recvfrom(BUFFER)
+                    data, client = recv(sock)
                 except socket.timeout:
+                    self.stats.maybe_report()
+                    self.housekeeping()
                     continue
 
                 arrival = int(time.time() * 1000)
+                if tick:
+                    tick(STAGE_RECV)
+                self.stats.count(1)
+                self.handle_packet(data, client, arrival)
+                self.stats.maybe_report()
+                self.housekeeping()
+                if tick:
+                    tick(STAGE_HOUSEKEEPING)
+
+        except KeyboardInterrupt:
+            self.shutdown()
 
-                if len(data) < HEADER_SIZE:
+    # =======================================================
+    # BULK-DRAIN SERVER LOOP
+    # =======================================================
+    def start_bulk(self, batch_size=DRAIN_BATCH):
+        """
+        High-throughput loop: wait until the socket is readable, then drain
+        every queued datagram into a preallocated buffer pool before
+        processing the whole batch. Buffers are reused, nothing is allocated
+        per datagram except the source address tuple.
+        """
+        pool = [bytearray(BUFFER) for _ in range(batch_size)]
+        views = [memoryview(buf) for buf in pool]
+        sizes = [0] * batch_size
+        clients = [None] * batch_size
+
+        if self.overflow is not None:
+            overflow = self.overflow
+            sock = self.server
+            self.stats.overflow = overflow
+            recv_into = lambda buf: (overflow.recv_into(sock, [buf]), overflow.address)  # noqa: E731
+        else:
+            recv_into = self.server.recvfrom_into
+        self.server.setblocking(False)
+        tick = self._tick
+        self.start_profiler()
+
+        try:
+            while True:
+                readable, _, _ = select.select([self.server], [], [], 1.0)
+                if not readable:
+                    self.stats.maybe_report()
+                    self.housekeeping()
                     continue
 
-                version_type, deviceID, seq, timestamp, flags = struct.unpack(
-                    HEADER_FORMAT, data[:HEADER_SIZE]
-                )
-                msgType = version_type & 0x0F
+                # ---------- DRAIN ----------
+                n = 0
+                while n < batch_size:
+                    try:
+                        sizes[n], clients[n] = recv_into(pool[n])
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    n += 1
 
-                # get or create state
-                state = self.device_state.setdefault(deviceID, DeviceState())
-                state.address = client
-                timestamp_full = self.unwrap_timestamp(state, timestamp)
+                if n == 0:
+                    continue
 
-                print(f"[RECV] Packet from {client} | type={msgType} seq={seq} flags={flags}")
+                # ---------- PROCESS BATCH ----------
+                arrival = int(time.time() * 1000)
+                if tick:
+                    tick(STAGE_RECV)
+                for i in range(n):
+                    self.handle_packet(views[i][:sizes[i]], clients[i], arrival)
 
-                payload = data[HEADER_SIZE:].decode(FORMAT, errors="ignore").strip()
+                self.stats.count(n)
+                self.stats.maybe_report()
+                self.housekeeping()
+                if tick:
+                    tick(STAGE_HOUSEKEEPING)
 
-                # ---------- INIT ----------
-                if msgType == INIT_MSG:
-                    print(f"[INIT] Device {deviceID} connected.")
+        except KeyboardInterrupt:
+            self.shutdown()
 
-                    # RESET STATE FOR THIS DEVICE
-                    state.last_seq = seq      # seq=0
-                    state.last_timestamp = timestamp
-                    state.received_seqs = set([seq])  # reset received seqs
-                    state.gaps = 0
-                    state.duplicate_seqs = set()
+    # =======================================================
+    # ASYNCIO SERVER
+    # =======================================================
+    def start_async(self):
+        self.start_profiler()
+        try:
+            asyncio.run(self._serve_async())
+        except KeyboardInterrupt:
+            pass
+        self.shutdown()
 
-                    continue
+    async def _serve_async(self):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: TelemetryProtocol(self), sock=self.server
+        )
+        self._sendto = transport.sendto
+
+        # the event loop owns SIGUSR1/SIGUSR2 while it runs (flags only, as above)
+        signals = []
+        if self.live is not None and hasattr(signal, "SIGUSR1"):
+            signals = [(signal.SIGUSR1, self.request_report),
+                       (signal.SIGUSR2, self.request_devices)]
+        for signum, request in signals:
+            loop.add_signal_handler(signum, request)
+
+        timers = [
+            asyncio.create_task(self._liveness_ticks()),
+            asyncio.create_task(self._report_stats()),
+        ]
+        try:
+            await asyncio.gather(*timers)
+        finally:
+            for task in timers:
+                task.cancel()
+            for signum, request in signals:
+                loop.remove_signal_handler(signum)
+                signal.signal(signum, lambda signum, frame, request=request: request())
+            self._sendto = self.server.sendto
+
+    async def _liveness_ticks(self):
+        while True:
+            await asyncio.sleep(self.liveness.wheel.tick_ms / 1000)
+            self.housekeeping()
+
+    async def _report_stats(self):
+        while True:
+            await asyncio.sleep(self.stats.interval)
+            self.stats.report()
+
+    def report_devices(self):
+        for deviceID, state in sorted(self.device_state.items(), key=lambda item: item[0]):
+            print(f"[DEVICE] {deviceID} mode={state.mode} last_seq={state.last_seq} "
+                  f"gaps={state.gaps} duplicates={state.duplicates} late={state.late}")
+
+    def serve(self, engine="loop", drain_batch=DRAIN_BATCH):
+        if engine == "bulk":
+            self.start_bulk(batch_size=drain_batch)
+        elif engine == "async":
+            self.start_async()
+        else:
+            self.start()
 
+    def start_profiler(self):
+        # on the receive thread: the stack sampler watches the thread that starts it
+        if self.profiler is not None:
+            self.profiler.start()
 
+    def shutdown(self):
+        print("\n[SHUTDOWN]")
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.stats.report()
+        self.report_devices()
+        if self.live is not None:
+            self.live.write_devices()
+        self.log_writer.close()
+        self.server.close()
 
-                # ---------- CONFIG FROM CLIENT ----------
-                if msgType == CONFIG_MSG:
-                    if payload.startswith("MODE="):
-                        new_mode = payload.split("=")[1].lower()
-                        state.mode = new_mode
 
-                        print(f"[CONFIG REQUEST] Device {deviceID} → MODE={new_mode.upper()}")
-                        self.send_config(deviceID, new_mode)
-                    continue
+# ===========================================================
+# ASYNCIO PROTOCOL
+# ===========================================================
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    """
+    Feeds datagrams from the event loop into TelemetryServer.handle_packet,
+    so the asyncio engine uses exactly the same dispatch and DeviceState
+    logic as the blocking loops.
+    """
 
-                # ---------- HEARTBEAT ----------
-                if msgType == HEARTBEAT_MSG:
-                    state.last_heartbeat = arrival
-                    state.missed_heartbeats = 0
-                    print(f"[HEARTBEAT] Device={deviceID}")
-                    continue
+    def __init__(self, server):
+        self.server = server
 
-                # ---------- DATA PACKET ----------
-                # 1) Duplicate detection
-                duplicate_flag = seq in state.received_seqs
-                if duplicate_flag:
-                    state.duplicate_seqs.add(seq)
-                state.received_seqs.add(seq)
-
-                # 2) REORDERING detection (seq < last_seq)
-                if state.last_seq is not None and not duplicate_flag:
-                    reordered_flag = seq < state.last_seq
-                else:
-                    reordered_flag = False
-
-                # 3) GAP DETECTION (only if not duplicate AND not reordered)
-                if msgType == DATA_MSG and not duplicate_flag and not reordered_flag:
-                    gap_flag = state.detect_gap(seq, flags)
-                else:
-                    gap_flag = False
-
-                # 4) Update last_seq/timestamp only if not duplicate AND not reordered
-                if msgType == DATA_MSG and not duplicate_flag and not reordered_flag:
-                    state.update_last(seq, timestamp)
-
-                # 5) Batch flag & payload size
-                is_batch = 1 if (flags & FLAG_BATCH) else 0
-                payload_size = len(payload.encode(FORMAT))
-
-                # 6) WRITE CSV
-                self.csv_writer.writerow([
-                    deviceID, seq, timestamp_full, arrival,
-                    int(duplicate_flag), int(gap_flag), int(reordered_flag),
-                    payload_size, is_batch, state.mode
-                ])
-                self.csv_file.flush()
-
-                print(f"[DATA] Dev={deviceID} seq={seq} mode={state.mode} REORDER={reordered_flag} is_batch={is_batch} GAP={gap_flag}")
+    def datagram_received(self, data, addr):
+        if self.server._tick:
+            self.server._tick(STAGE_RECV)
+        self.server.stats.count(1)
+        self.server.handle_packet(data, addr, int(time.time() * 1000))
 
-        except KeyboardInterrupt:
-            print("\n[SHUTDOWN]")
-            self.csv_file.close()
-            self.server.close()
+    def error_received(self, exc):
+        print(f"[ASYNC ERROR] {exc}")
 
 
 # ===========================================================
@@ -285,9 +840,92 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=PORT,
+                        help="UDP port to listen on")
     parser.add_argument("--csv", type=str, default=None,
                         help="Full path to CSV output file")
+    parser.add_argument("--log-format", type=str, default="csv",
+                        choices=["csv", "bin"],
+                        help="Text CSV log or compact binary log (see binlog.py)")
+    parser.add_argument("--engine", type=str, default="loop",
+                        choices=["loop", "bulk", "async"],
+                        help="Receive loop: one recvfrom per datagram, bulk drain, "
+                             "or asyncio event loop")
+    parser.add_argument("--drain-batch", type=int, default=DRAIN_BATCH,
+                        help="Max datagrams drained per wakeup in bulk mode")
+    parser.add_argument("--commit-rows", type=int, default=COMMIT_ROWS,
+                        help="Rows per group commit of the CSV log")
+    parser.add_argument("--commit-latency-ms", type=float, default=COMMIT_LATENCY * 1000,
+                        help="Max time a row waits before it is committed")
+    parser.add_argument("--log-queue", type=int, default=QUEUE_SIZE,
+                        help="Rows buffered between receive loop and log writer")
+    parser.add_argument("--log-policy", type=str, default="block",
+                        choices=["block", "drop", "spill"],
+                        help="What to do with rows when the log queue is full")
+    parser.add_argument("--device-table", action="store_true",
+                        help="Keep device state in a preallocated struct-of-arrays table "
+                             "(less memory only near 65k devices, slower per packet; "
+                             "see device_table.py)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of SO_REUSEPORT worker processes")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL,
+                        help="Seconds between packets/s + kernel drop reports")
+    parser.add_argument("--rx-burst", type=int, default=RX_BURST,
+                        help="Datagrams the socket receive buffer is sized to absorb")
+    parser.add_argument("--rx-overflow", action="store_true",
+                        help="Per-datagram kernel drop count via SO_RXQ_OVFL "
+                             "(loop/bulk engines; otherwise /proc/net/udp is polled)")
+    parser.add_argument("--no-shed", action="store_true",
+                        help="Keep full console output under overload")
+    parser.add_argument("--shed-rows", action="store_true",
+                        help="Under sustained overload also log only a sample of clean "
+                             "DATA rows (each kept row records its sample_weight)")
+    parser.add_argument("--no-live-stats", action="store_true",
+                        help="Do not keep live stats (<log>.live.json, per device on "
+                             "SIGUSR2 and at shutdown in <log>.live.devices.json)")
+    parser.add_argument("--log-level", type=str, default="debug", choices=list(LEVELS),
+                        help="Console level: debug = one line per packet, info = device "
+                             "INIT/CONFIG only")
+    parser.add_argument("--log-rate", type=float, default=RATE_LIMIT,
+                        help="Console lines per second per tag (0 = unlimited)")
+    parser.add_argument("--stages", action="store_true",
+                        help="Time every packet per stage and report it with the stats")
+    parser.add_argument("--profile", type=str, default=None, choices=list(PROFILERS),
+                        help="Profile a window of the run: cProfile or a stack sampler")
+    parser.add_argument("--profile-seconds", type=float, default=PROFILE_SECONDS,
+                        help="Length of the profiling window")
     args = parser.parse_args()
 
-    server = TelemetryServer(csv_filename=args.csv)
-    server.start()
\ No newline at end of file
+    server_options = dict(
+        port=args.port,
+        stats_interval=args.stats_interval,
+        commit_rows=args.commit_rows,
+        commit_latency=args.commit_latency_ms / 1000,
+        log_queue=args.log_queue,
+        log_policy=args.log_policy,
+        log_format=args.log_format,
+        device_table=args.device_table,
+        rx_burst=args.rx_burst,
+        rx_overflow=args.rx_overflow,
+        shed=not args.no_shed,
+        shed_rows=args.shed_rows,
+        live_stats=not args.no_live_stats,
+        log_level=args.log_level,
+        log_rate=args.log_rate,
+        stages=args.stages,
+        profile=args.profile,
+        profile_seconds=args.profile_seconds,
+    )
+
+    if args.workers > 1:
+        from sharded_server import run_workers
+        run_workers(args.workers, csv_filename=args.csv, engine=args.engine,
+                    drain_batch=args.drain_batch, **server_options)
+        raise SystemExit(0)
+
+    # `kill <pid>` (as used by the test scripts) shuts down like Ctrl+C so
+    # the log writer drains its queue
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    server = TelemetryServer(csv_filename=args.csv, **server_options)
+    server.serve(engine=args.engine, drain_batch=args.drain_batch)
@@ -0,0 +1,94 @@
+import time
+
+'''
+Drift-free send pacing.
+
+Send slots sit on an absolute grid, start + k * period, on the monotonic
+perf_counter clock. Waiting for slot k never depends on how long the work
+after slot k-1 took, so the average rate stays exact instead of drifting
+by send/print time every iteration.
+
+A token bucket bounds catch-up. If the sender falls behind (GC pause,
+slow print, descheduled), it may send up to `burst` slots back-to-back.
+Any slots older than that are skipped and counted. They are not replayed
+as an unbounded burst. By default the bucket holds BURST_WINDOW worth of
+slots, so a 50 kHz sender can absorb a 10 ms stall without losing rate
+and a 1 Hz sender never double-sends.
+
+Waiting is a sleep/spin hybrid. time.sleep() wakes up to a scheduler
+quantum late, so the last `spin` seconds before a deadline are
+busy-waited. Periods shorter than `spin` are pure spinning, which is what
+makes kHz rates reachable from Python.
+'''
+
+SPIN_THRESHOLD = 0.002        # busy-wait the last 2 ms before a deadline
+BURST_WINDOW = 0.010          # default bucket size, in seconds of slots
+
+
+class Pacer:
+    def __init__(self, rate, burst=None, spin=SPIN_THRESHOLD, clock=time.perf_counter):
+        self.clock = clock
+        self.fixed_burst = burst
+        self.spin = spin
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """Changes the rate and restarts the slot grid (stats are reset)."""
+        self.rate = rate
+        self.period = 1.0 / rate
+        burst = self.fixed_burst
+        if burst is None:
+            burst = int(rate * BURST_WINDOW)
+        self.burst = max(1, burst)
+        self.started = self.clock()
+        self.next_slot = self.started
+
+        self.sends = 0
+        self.skipped = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+        self.late_slots = 0           # slots served more than one period late
+
+    def wait(self):
+        """Blocks until the next send slot. Returns how late it is served (s)."""
+        clock = self.clock
+        deadline = self.next_slot
+        now = clock()
+
+        remaining = deadline - now
+        if remaining > 0:
+            if remaining > self.spin:
+                time.sleep(remaining - self.spin)
+            while clock() < deadline:
+                pass
+            now = clock()
+
+        lateness = now - deadline
+
+        # token bucket: at most `burst` overdue slots are still served
+        period = self.period
+        oldest = now - (self.burst - 1) * period
+        if deadline < oldest - period:
+            missed = int((oldest - deadline) // period)
+            self.skipped += missed
+            deadline += missed * period
+
+        self.sends += 1
+        self.late_total += lateness
+        if lateness > self.late_max:
+            self.late_max = lateness
+        if lateness > period:
+            self.late_slots += 1
+
+        self.next_slot = deadline + period
+        return lateness
+
+    def achieved_rate(self):
+        elapsed = self.clock() - self.started
+        return self.sends / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        avg = self.late_total / max(self.sends, 1)
+        print(f"[PACER] target={self.rate:.1f}/s achieved={self.achieved_rate():.1f}/s | "
+              f"sends={self.sends} skipped={self.skipped} | lateness avg={avg * 1e6:.1f}us "
+              f"max={self.late_max * 1e6:.1f}us | >1 period late={self.late_slots}", flush=True)
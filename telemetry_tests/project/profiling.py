@@ -0,0 +1,201 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from array import array
+
+'''
+Where the server's time goes.
+
+StageTimer (--stages) splits every packet's wall time into stages. Each
+call to tick(stage) charges the time since the previous tick to `stage`,
+so the stages add up to the whole loop:
+
+    recv          waiting for and receiving the datagram (includes idle
+                  time when the server keeps up; none when it falls behind)
+    header        header parse
+    state         device lookup, timestamp unwrap, sequence tracking
+    control       INIT / CONFIG / HEARTBEAT handling
+    decode        binary batch payload decode
+    live          live per-device statistics
+    log           queueing the log row
+    console       per-packet console lines
+    housekeeping  stats reports, liveness wheel, load shedder
+
+Each stage keeps a count, a total and a log2 histogram of durations in ns.
+When --stages is off the server holds None instead of a timer, and every
+hook is a single `if tick:` test.
+
+--profile runs a profiler for a bounded window and writes the result next
+to the log:
+    cprofile   deterministic, every call (slows the server down ~2x):
+               <log>.profile.pstats plus a text summary .profile.txt
+    sample     a thread samples the receive thread's stack every
+               SAMPLE_INTERVAL seconds (low overhead): collapsed stacks in
+               <log>.profile.folded (flamegraph.pl / speedscope input) plus
+               a text summary .profile.txt
+'''
+
+STAGES = ("recv", "header", "state", "control", "decode", "live", "log", "console",
+          "housekeeping")
+(STAGE_RECV, STAGE_HEADER, STAGE_STATE, STAGE_CONTROL, STAGE_DECODE, STAGE_LIVE,
+ STAGE_LOG, STAGE_CONSOLE, STAGE_HOUSEKEEPING) = range(len(STAGES))
+HIST_BITS = 40             # durations up to 2^40 ns (~18 min)
+
+PROFILE_SECONDS = 30.0     # profiling window
+SAMPLE_INTERVAL = 0.005    # stack sampler period
+PROFILE_TOP = 30           # functions in the text summaries
+
+
+# ===========================================================
+# PER-STAGE TIMING
+# ===========================================================
+class StageTimer:
+    def __init__(self):
+        self.totals = [0] * len(STAGES)
+        self.counts = [0] * len(STAGES)
+        self.histograms = [array("Q", bytes(8 * HIST_BITS)) for _ in STAGES]
+        self._clock = time.perf_counter_ns
+        self._last = self._clock()
+
+    def tick(self, stage):
+        now = self._clock()
+        elapsed = now - self._last
+        self._last = now
+        self.totals[stage] += elapsed
+        self.counts[stage] += 1
+        bucket = elapsed.bit_length()
+        self.histograms[stage][bucket if bucket < HIST_BITS else HIST_BITS - 1] += 1
+
+    def quantile(self, stage, q):
+        """Upper bound (ns) of the log2 bucket holding quantile q."""
+        counts = self.histograms[stage]
+        rank = q * (self.counts[stage] - 1)
+        seen = 0
+        for bucket, n in enumerate(counts):
+            seen += n
+            if seen > rank:
+                return (1 << bucket) - 1 if bucket else 0
+        return (1 << HIST_BITS) - 1
+
+    def report(self):
+        total = sum(self.totals) or 1
+        busy = total - self.totals[STAGE_RECV]
+        parts = []
+        for stage, name in enumerate(STAGES):
+            n = self.counts[stage]
+            if not n:
+                continue
+            parts.append(f"{name} {self.totals[stage] / n / 1000:.1f}us "
+                         f"(p99<{self.quantile(stage, 0.99) / 1000:.1f}us, "
+                         f"{self.totals[stage] / total:.0%})")
+        print(f"[STAGES] {' | '.join(parts)} | busy {busy / total:.0%} of wall time")
+
+
+# ===========================================================
+# BOUNDED-WINDOW PROFILERS
+# ===========================================================
+class _ProfileWindow:
+    def __init__(self, path, seconds=PROFILE_SECONDS):
+        self.path = path           # output path without extension
+        self.seconds = seconds
+        self.deadline = None
+        self.done = False
+
+    def start(self):
+        self.deadline = time.monotonic() + self.seconds
+        self._start()
+        print(f"[PROFILE] {type(self).__name__} running for {self.seconds:g}s")
+
+    def maybe_stop(self):
+        if not self.done and time.monotonic() >= self.deadline:
+            self.stop()
+
+    def stop(self):
+        if self.done or self.deadline is None:
+            return
+        self.done = True
+        outputs = self._stop()
+        print(f"[PROFILE] written: {', '.join(outputs)}")
+
+
+class CProfileWindow(_ProfileWindow):
+    def _start(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def _stop(self):
+        self.profiler.disable()
+        self.profiler.dump_stats(self.path + ".pstats")
+        text = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=text)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        stats.sort_stats("tottime").print_stats(PROFILE_TOP)
+        with open(self.path + ".txt", "w") as f:
+            f.write(text.getvalue())
+        return [self.path + ".pstats", self.path + ".txt"]
+
+
+class SamplingProfiler(_ProfileWindow):
+    """Samples the stack of the thread that called start()."""
+
+    def __init__(self, path, seconds=PROFILE_SECONDS, interval=SAMPLE_INTERVAL):
+        super().__init__(path, seconds)
+        self.interval = interval
+        self.stacks = {}           # "outer;...;inner" -> samples
+        self.samples = 0
+
+    def _start(self):
+        self.target = threading.get_ident()
+        self._stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        stacks = self.stacks
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            key = ";".join(reversed(names))
+            stacks[key] = stacks.get(key, 0) + 1
+            self.samples += 1
+            if time.monotonic() >= self.deadline:
+                break
+
+    def _stop(self):
+        self._stop_event.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+        with open(self.path + ".folded", "w") as f:
+            for key, n in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{key} {n}\n")
+
+        own, anywhere = {}, {}
+        for key, n in self.stacks.items():
+            names = key.split(";")
+            own[names[-1]] = own.get(names[-1], 0) + n
+            for name in set(names):
+                anywhere[name] = anywhere.get(name, 0) + n
+        total = max(self.samples, 1)
+        with open(self.path + ".txt", "w") as f:
+            f.write(f"{self.samples} samples every {self.interval * 1000:g} ms\n\n")
+            for title, table in (("self (innermost frame)", own),
+                                 ("inclusive (anywhere on the stack)", anywhere)):
+                f.write(f"{title}\n")
+                for name, n in sorted(table.items(), key=lambda item: -item[1])[:PROFILE_TOP]:
+                    f.write(f"  {n / total:6.1%}  {n:>7}  {name}\n")
+                f.write("\n")
+        return [self.path + ".folded", self.path + ".txt"]
+
+
+PROFILERS = {"cprofile": CProfileWindow, "sample": SamplingProfiler}
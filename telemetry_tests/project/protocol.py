@@ -0,0 +1,263 @@
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+'''
+Shared packet decoding for server and client.
+
+B = > 1 byte (8 bits): upper 4 bits = version, lower 4 bits = message type
+H = > 2 bytes (16 bits): device ID
+H = > 2 bytes (16 bits): sequence number
+I = > 4 bytes (32 bits): timestamp
+B = > 1 byte (8 bits): flags
+'''
+HEADER_FORMAT = "!B H H I B"
+HEADER = struct.Struct(HEADER_FORMAT)     # precompiled once
+HEADER_SIZE = HEADER.size
+BUFFER = 2048
+FORMAT = "utf-8"
+
+# Flags
+FLAG_BATCH = 0x04
+FLAG_BINARY = 0x08     # payload = count byte + packed big-endian readings
+FLAG_INT16 = 0x10      # with FLAG_BINARY: int16 readings scaled by INT16_SCALE
+FLAG_DELTA = 0x20      # with FLAG_BINARY: zigzag varint deltas (values + times)
+
+'''
+Batch payload encodings, negotiated with CONFIG "MODE=batch;ENC=<name>".
+The server echoes ENC back when it accepts it; until then (and with servers
+that do not know about ENC) the client keeps sending text.
+
+    text   "25.37;21.04;29.99"                  (no extra flags)
+    f32    count:B  value:f * count              (FLAG_BINARY)
+    i16    count:B  round(value * 100):h * count (FLAG_BINARY | FLAG_INT16),
+           saturated to +-327.67 (readings outside read back as the limit)
+    delta  count:varint, then per reading        (FLAG_BINARY | FLAG_DELTA)
+           zigzag(v[i] - v[i-1]), zigzag(t[i] - t[i-1]) as varints,
+           v = round(value * 100) with v[-1] = 0,
+           t = ms offset from the header timestamp with t[-1] = 0
+'''
+ENCODINGS = {
+    "text": 0,
+    "f32": FLAG_BINARY,
+    "i16": FLAG_BINARY | FLAG_INT16,
+    "delta": FLAG_BINARY | FLAG_DELTA,
+}
+INT16_SCALE = 100
+INT16_MIN, INT16_MAX = -0x8000, 0x7FFF
+DELTA_SCALE = 100
+MAX_READINGS = 0xFF
+MODE_NAME_SIZE = 16    # bytes of a CONFIG MODE= name that are kept (binlog mode table)
+
+_SWAP = sys.byteorder == "little"      # readings travel in network order
+_packers = {}
+
+
+# ===========================================================
+# PACKET DECODER
+# ===========================================================
+class PacketDecoder:
+    """
+    Receives into one reused buffer and parses the header in place with
+    Struct.unpack_from over a memoryview: no slicing copies, no per-packet
+    bytes objects. The payload is only turned into text when asked for
+    (CONFIG messages, or a sink that needs it); its size is just
+    len(packet) - HEADER_SIZE.
+
+    unpack_header is the precompiled Struct's bound unpack_from, for hot
+    loops that check len(packet) >= HEADER_SIZE themselves: calling it
+    directly skips a Python-level frame per packet, which is most of what
+    header() costs over a plain slice + struct.unpack.
+
+    A packet returned by recv() is a view of the shared buffer and is only
+    valid until the next recv().
+    """
+
+    def __init__(self, buffer_size=BUFFER):
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.unpack_header = HEADER.unpack_from
+
+    def recv(self, sock):
+        nbytes, addr = sock.recvfrom_into(self.buffer)
+        return self.view[:nbytes], addr
+
+    def header(self, packet):
+        """(version_type, deviceID, seq, timestamp, flags), or None if truncated."""
+        if len(packet) < HEADER_SIZE:
+            return None
+        return self.unpack_header(packet)
+
+    @staticmethod
+    def payload(packet):
+        return packet[HEADER_SIZE:]
+
+    @staticmethod
+    def payload_size(packet):
+        return len(packet) - HEADER_SIZE
+
+    @staticmethod
+    def payload_text(packet):
+        return str(packet[HEADER_SIZE:], FORMAT, "ignore").strip()
+
+    @staticmethod
+    def readings(packet, flags):
+        """Readings of a FLAG_BINARY batch as an array('f'), else None."""
+        if not flags & FLAG_BINARY:
+            return None
+        return decode_readings(packet[HEADER_SIZE:], flags)
+
+
+# ===========================================================
+# BATCH PAYLOADS
+# ===========================================================
+def encoding_flags(encoding):
+    """Header flag bits for a batch sent with this encoding."""
+    return ENCODINGS[encoding]
+
+
+def parse_config(text):
+    """ "MODE=batch;ENC=f32" -> {"MODE": "batch", "ENC": "f32"} """
+    config = {}
+    for item in text.split(";"):
+        key, sep, value = item.partition("=")
+        if sep:
+            config[key.strip().upper()] = value.strip().lower()
+    return config
+
+
+def clamp_mode(mode):
+    """
+    A client-supplied MODE name cut to MODE_NAME_SIZE UTF-8 bytes on a
+    character boundary, or None if nothing printable is left.
+    """
+    raw = mode.encode(FORMAT)
+    if len(raw) > MODE_NAME_SIZE:
+        mode = raw[:MODE_NAME_SIZE].decode(FORMAT, "ignore")
+    if not mode or not mode.isprintable():
+        return None
+    return mode
+
+
+def zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def varint_size(n):
+    """Bytes taken by an unsigned varint (7 bits per byte)."""
+    size = 1
+    while n > 0x7F:
+        n >>= 7
+        size += 1
+    return size
+
+
+def _put_varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def encode_delta(values, offsets):
+    """delta payload from readings and their ms offsets to the header timestamp."""
+    out = bytearray()
+    _put_varint(out, len(values))
+    last_v = last_t = 0
+    for value, t in zip(values, offsets):
+        v = round(value * DELTA_SCALE)
+        _put_varint(out, zigzag(v - last_v))
+        _put_varint(out, zigzag(t - last_t))
+        last_v, last_t = v, t
+    return bytes(out)
+
+
+def decode_delta(payload):
+    """
+    delta payload -> (values array('f'), offsets array('l')), or None if the
+    payload is truncated.
+    """
+    numbers = []
+    append = numbers.append
+    n = shift = 0
+    for byte in payload:
+        if byte < 0x80:
+            append(n | (byte << shift) if shift else byte)
+            n = shift = 0
+        else:
+            n |= (byte & 0x7F) << shift
+            shift += 7
+
+    if not numbers:
+        return None
+    count = numbers[0]
+    if len(numbers) < 1 + 2 * count:
+        return None
+
+    # un-zigzag, then running sums turn the deltas back into absolutes
+    deltas = [(x >> 1) ^ -(x & 1) for x in numbers[1:1 + 2 * count]]
+    scale = 1.0 / DELTA_SCALE
+    values = array("f", [v * scale for v in accumulate(deltas[0::2])])
+    offsets = array("l", accumulate(deltas[1::2]))
+    return values, offsets
+
+
+def encode_readings(values, encoding, offsets=None):
+    """
+    Builds the DATA payload for one batch of readings. Only the delta
+    encoding carries per-reading time offsets (ms after the header timestamp).
+    """
+    if encoding == "text":
+        return ";".join(str(v) for v in values).encode(FORMAT)
+
+    if encoding == "delta":
+        return encode_delta(values, offsets if offsets is not None else [0] * len(values))
+
+    count = len(values)
+    if count > MAX_READINGS:
+        raise ValueError(f"at most {MAX_READINGS} readings per packet")
+
+    if encoding == "i16":
+        values = [round(v * INT16_SCALE) for v in values]
+        # saturate instead of failing the whole batch on one outlier
+        if values and (min(values) < INT16_MIN or max(values) > INT16_MAX):
+            values = [min(max(v, INT16_MIN), INT16_MAX) for v in values]
+
+    key = (encoding, count)
+    packer = _packers.get(key)
+    if packer is None:
+        code = "h" if encoding == "i16" else "f"
+        packer = _packers[key] = struct.Struct(f"!B{count}{code}")
+    return packer.pack(count, *values)
+
+
+def decode_readings(payload, flags):
+    """
+    Decodes a binary batch payload straight into an array('f'), or None if
+    the payload is truncated. Text batches are not parsed here.
+    """
+    if not payload:
+        return None
+    if flags & FLAG_DELTA:
+        decoded = decode_delta(payload)
+        return None if decoded is None else decoded[0]
+
+    count = payload[0]
+
+    if flags & FLAG_INT16:
+        raw = array("h")
+    else:
+        raw = array("f")
+
+    end = 1 + count * raw.itemsize
+    if len(payload) < end:
+        return None
+    raw.frombytes(payload[1:end])
+    if _SWAP:
+        raw.byteswap()
+
+    if flags & FLAG_INT16:
+        scale = 1.0 / INT16_SCALE
+        return array("f", [v * scale for v in raw])
+    return raw
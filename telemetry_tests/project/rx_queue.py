@@ -0,0 +1,228 @@
+import os
+import socket
+import sys
+import time
+
+'''
+Server receive queue: sizing, kernel drop counters and load shedding.
+
+Sizing. SO_RCVBUF is derived from the burst (in datagrams) the queue has
+to absorb while the receive loop is busy. The kernel charges each queued
+datagram its skb "truesize", not its payload: 768-1280 bytes for the
+small telemetry packets here on x86-64 Linux. SO_RCVBUFFORCE (root or
+CAP_NET_ADMIN) is tried first so net.core.rmem_max does not cap the
+value; without it a clamped buffer is reported at startup.
+
+Drop counters. With SO_RXQ_OVFL every datagram carries the socket's
+cumulative drop count as ancillary data (OverflowReceiver). Without it the
+same counter is polled from /proc/net/udp. Either way the server can split
+missing sequence numbers into "dropped by our receive queue" and "lost
+before reaching this host".
+
+Shedding. LoadShedder polls the queue occupancy (rx_queue column of
+/proc/net/udp) and raises a level when it stays high or the kernel starts
+dropping:
+    level 1   no per-packet console lines
+    level 2+  only with sample_rows (--shed-rows): only 1 in 2^(level-1)
+              clean DATA rows is logged; rows with a duplicate/gap/reorder
+              flag are always kept
+A kept row carries its sample_weight (rows it stands for: 2^(level-1) for
+a sampled clean row, else 1), so the analysis scales packet and byte
+counts back up instead of reading sampled-out rows as loss. Sequence
+tracking never sheds, so gap statistics stay exact.
+'''
+
+RX_BURST = 4096             # datagrams the receive queue should absorb
+DATAGRAM_TRUESIZE = 1280    # kernel memory charged per queued small datagram
+
+SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33 if sys.platform.startswith("linux") else None)
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40 if sys.platform.startswith("linux") else None)
+
+SHED_POLL = 0.1             # seconds between occupancy samples
+SHED_HIGH = 0.5             # occupancy that raises the level
+SHED_LOW = 0.1              # occupancy that lowers it again
+SHED_MAX_LEVEL = 5          # 1 in 16 clean rows
+
+
+# ===========================================================
+# RECEIVE BUFFER SIZING
+# ===========================================================
+def size_receive_buffer(sock, burst=RX_BURST):
+    """
+    Sets SO_RCVBUF so that `burst` datagrams fit in the receive queue.
+    Returns the effective buffer size in bytes as read back from the kernel.
+    """
+    wanted = burst * DATAGRAM_TRUESIZE
+    # Linux doubles the requested value to cover its own bookkeeping and
+    # compares truesize against the doubled value
+    request = wanted // 2 if sys.platform.startswith("linux") else wanted
+
+    forced = False
+    if SO_RCVBUFFORCE is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, request)
+            forced = True
+        except OSError:
+            pass
+    if not forced:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, request)
+        except OSError as e:
+            print(f"[RXBUF] SO_RCVBUF not set: {e}")
+
+    effective = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    holds = effective // DATAGRAM_TRUESIZE
+    print(f"[RXBUF] target burst={burst} datagrams | rcvbuf={effective} bytes "
+          f"(~{holds} datagrams){' forced' if forced else ''}")
+    if effective < wanted:
+        print(f"[RXBUF] WARNING: receive buffer clamped to {effective} bytes; raise "
+              f"net.core.rmem_max to {request} or run with CAP_NET_ADMIN")
+    return effective
+
+
+# ===========================================================
+# KERNEL COUNTERS (/proc/net/udp)
+# ===========================================================
+def read_socket_queue(sock):
+    """
+    (rx_queue bytes, drops) for this UDP socket from /proc/net/udp, or None
+    where it is not available (non-Linux, closed socket).
+    """
+    try:
+        inode = str(os.fstat(sock.fileno()).st_ino)
+        for table in ("/proc/net/udp", "/proc/net/udp6"):
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[9] == inode:
+                        rx_queue = int(fields[4].split(":")[1], 16)
+                        return rx_queue, int(fields[-1])
+    except (OSError, ValueError, IndexError, StopIteration):
+        pass
+    return None
+
+
+def read_kernel_drops(sock):
+    """
+    Returns the kernel's receive-queue drop counter for this UDP socket
+    (last column of /proc/net/udp), or None where it is not available.
+    """
+    queue = read_socket_queue(sock)
+    return None if queue is None else queue[1]
+
+
+# ===========================================================
+# PER-DATAGRAM DROP COUNTER (SO_RXQ_OVFL)
+# ===========================================================
+class OverflowReceiver:
+    """
+    recvmsg_into() with SO_RXQ_OVFL enabled. `dropped` is the socket's
+    cumulative drop count as of the last datagram received. The kernel
+    only attaches the count once it is non-zero.
+    """
+
+    def __init__(self, sock, bufsize):
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        self.buffer = bytearray(bufsize)
+        self.view = memoryview(self.buffer)
+        self._buffers = [self.buffer]
+        self._space = socket.CMSG_SPACE(4)
+        self.dropped = 0
+
+    @staticmethod
+    def supported(sock):
+        if SO_RXQ_OVFL is None or not hasattr(socket, "CMSG_SPACE"):
+            return False
+        try:
+            sock.getsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL)
+        except OSError:
+            return False
+        return True
+
+    def recv(self, sock):
+        """Same contract as PacketDecoder.recv: (view of the datagram, address)."""
+        nbytes = self.recv_into(sock, self._buffers)
+        return self.view[:nbytes], self.address
+
+    def recv_into(self, sock, buffers):
+        nbytes, ancdata, _, self.address = sock.recvmsg_into(buffers, self._space)
+        for level, kind, data in ancdata:
+            if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+                self.dropped = int.from_bytes(data[:4], sys.byteorder)
+        return nbytes
+
+
+# ===========================================================
+# LOAD SHEDDING
+# ===========================================================
+class LoadShedder:
+    def __init__(self, sock, rcvbuf, enabled=True, sample_rows=False, poll=SHED_POLL,
+                 high=SHED_HIGH, low=SHED_LOW, max_level=SHED_MAX_LEVEL):
+        self.sock = sock
+        self.rcvbuf = max(rcvbuf, 1)
+        self.enabled = enabled
+        self.poll = poll
+        self.high = high
+        self.low = low
+        # without row sampling only the console is shed
+        self.max_level = max_level if sample_rows else min(max_level, 1)
+
+        self.level = 0
+        self.sample_mask = 0       # clean rows kept when (counter & mask) == 0
+        self.occupancy = 0.0
+        self.peak_occupancy = 0.0
+        self.peak_level = 0
+        self.shed_rows = 0
+        self._counter = 0
+        self._next_poll = 0.0
+        self._last_drops = None
+
+    def update(self, now=None):
+        """Samples the receive queue (at most every `poll` s) and adjusts the level."""
+        if now is None:
+            now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.poll
+
+        queue = read_socket_queue(self.sock)
+        if queue is None:
+            return
+        queued, drops = queue
+        self.occupancy = queued / self.rcvbuf
+        if self.occupancy > self.peak_occupancy:
+            self.peak_occupancy = self.occupancy
+
+        # new kernel drops mean the queue overflowed since the last sample
+        dropping = self._last_drops is not None and drops > self._last_drops
+        self._last_drops = drops
+        if not self.enabled:
+            return
+
+        if (dropping or self.occupancy >= self.high) and self.level < self.max_level:
+            self._set_level(self.level + 1)
+        elif self.occupancy <= self.low and not dropping and self.level > 0:
+            self._set_level(self.level - 1)
+
+    def _set_level(self, level):
+        direction = "up" if level > self.level else "down"
+        self.level = level
+        self.sample_mask = (1 << (level - 1)) - 1 if level > 1 else 0
+        self.peak_level = max(self.peak_level, level)
+        print(f"[SHED] level {direction} -> {level} | rx queue {self.occupancy:.0%} of rcvbuf"
+              f"{'' if level < 2 else f' | logging 1 in {self.sample_mask + 1} clean rows'}")
+
+    def row_weight(self, anomalous):
+        """sample_weight of a DATA row at the current level, 0 = not logged."""
+        if anomalous or not self.sample_mask:
+            return 1
+        self._counter += 1
+        if self._counter & self.sample_mask:
+            self.shed_rows += 1
+            return 0
+        return self.sample_mask + 1
+
+    def report(self):
+        print(f"[SHED] level={self.level} (peak {self.peak_level}) | rx queue "
+              f"{self.occupancy:.0%} (peak {self.peak_occupancy:.0%}) | shed rows={self.shed_rows}")
@@ -0,0 +1,263 @@
+import ctypes
+import ctypes.util
+import errno
+import socket
+import struct
+import sys
+import threading
+import time
+
+from protocol import HEADER_FORMAT, HEADER_SIZE, BUFFER
+
+'''
+Outbound datagram queue.
+
+Messages are built in place in one preallocated arena: header and payload
+are written by a single Struct.pack_into() (HEADER_FORMAT + "<n>s", cached
+per payload length), so no `header + payload` bytes object is created per
+message. flush() hands
+every queued datagram to the kernel with a single sendmmsg() call on
+Linux (through ctypes). Where sendmmsg() is not available (Windows, macOS,
+IPv6 destinations) flush() falls back to a tight sendto() loop over
+memoryviews of the same arena.
+
+`syscalls` counts kernel send calls, so "syscalls per 1000 messages" is
+syscalls / messages * 1000.
+'''
+
+QUEUE_DEPTH = 64          # datagrams per flush (and per sendmmsg call)
+MSG_DONTWAIT = 0x40
+
+
+# ===========================================================
+# sendmmsg() through ctypes (Linux only)
+# ===========================================================
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_sendmmsg():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+MMSG_SIZE = ctypes.sizeof(_MMsgHdr)
+SOCKADDR_IN_SIZE = 16
+_sendmmsg = _load_sendmmsg()
+HAVE_SENDMMSG = _sendmmsg is not None
+
+
+def _sockaddr_in(address):
+    """struct sockaddr_in for an IPv4 (host, port), or None."""
+    host, port = address[0], address[1]
+    try:
+        packed = socket.inet_aton(host)
+    except OSError:
+        try:
+            packed = socket.inet_aton(socket.gethostbyname(host))
+        except OSError:
+            return None
+    family = socket.AF_INET.to_bytes(2, sys.byteorder)
+    raw = family + port.to_bytes(2, "big") + packed + bytes(8)
+    return ctypes.create_string_buffer(raw, len(raw))
+
+
+# ===========================================================
+# SEND QUEUE
+# ===========================================================
+class SendQueue:
+    def __init__(self, sock, depth=QUEUE_DEPTH, slot_size=BUFFER, use_sendmmsg=True):
+        self.sock = sock
+        self.depth = depth
+        self.slot_size = slot_size
+        self.arena = bytearray(depth * slot_size)
+        self.view = memoryview(self.arena)
+        self.offsets = [i * slot_size for i in range(depth)]
+        self.lengths = [0] * depth
+        self.addresses = [None] * depth
+        self.tags = [None] * depth
+        self.count = 0
+        self.first_added = 0.0             # perf_counter() when the oldest queued datagram was added
+        self.lock = threading.Lock()       # client threads share one queue
+
+        self._packers = {}                 # datagram size -> Struct.pack_into
+        self.use_sendmmsg = use_sendmmsg and HAVE_SENDMMSG
+        if self.use_sendmmsg:
+            self._setup_mmsg()
+
+        self.messages = 0
+        self.syscalls = 0
+        self.failed_tags = []              # tags of datagrams the kernel refused
+
+    def _setup_mmsg(self):
+        base = ctypes.addressof(ctypes.c_char.from_buffer(self.arena))
+        self._iov = (_IOVec * self.depth)()
+        self._msgs = (_MMsgHdr * self.depth)()
+        self._msgs_addr = ctypes.addressof(self._msgs)
+        self._sockaddrs = {}
+        self._slot_address = [None] * self.depth
+        for i in range(self.depth):
+            self._iov[i].iov_base = base + i * self.slot_size
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iov[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_namelen = SOCKADDR_IN_SIZE
+
+        # word views of the ctypes arrays: per-flush updates are plain
+        # memoryview stores instead of ctypes attribute access
+        word = "Q" if ctypes.sizeof(ctypes.c_size_t) == 8 else "I"
+        size_t = ctypes.sizeof(ctypes.c_size_t)
+        self._iov_words = memoryview(self._iov).cast("B").cast(word)
+        self._iov_stride = ctypes.sizeof(_IOVec) // size_t
+        self._iov_len_at = _IOVec.iov_len.offset // size_t
+        self._msg_words = memoryview(self._msgs).cast("B").cast(word)
+        self._msg_stride = MMSG_SIZE // size_t
+
+    def __len__(self):
+        return self.count
+
+    # ---------- building ----------
+    def add(self, version_type, deviceID, seq, timestamp, flags, payload, address, tag=None):
+        """Queues one datagram; flushes first when the queue is full."""
+        size = HEADER_SIZE + len(payload)
+        pack_into = self._packers.get(size)
+        if pack_into is None:
+            if size > self.slot_size:
+                raise ValueError(f"datagram larger than {self.slot_size} bytes")
+            pack_into = self._packers[size] = \
+                struct.Struct(f"{HEADER_FORMAT} {size - HEADER_SIZE}s").pack_into
+
+        with self.lock:
+            i = self.count
+            if i == self.depth:
+                self._flush()
+                i = 0
+            if i == 0:
+                self.first_added = time.perf_counter()
+            pack_into(self.arena, self.offsets[i], version_type, deviceID & 0xFFFF,
+                      seq & 0xFFFF, timestamp & 0xFFFFFFFF, flags & 0xFF, payload)
+            self.lengths[i] = size
+            self.addresses[i] = address
+            self.tags[i] = tag
+            self.count = i + 1
+
+    def send(self, version_type, deviceID, seq, timestamp, flags, payload, address, tag=None):
+        """Queues one datagram and flushes the queue right away."""
+        self.add(version_type, deviceID, seq, timestamp, flags, payload, address, tag)
+        self.flush()
+
+    # ---------- flushing ----------
+    def flush(self):
+        """Sends everything queued. Returns the number of datagrams sent."""
+        with self.lock:
+            return self._flush()
+
+    def _flush(self):
+        n = self.count
+        if n == 0:
+            return 0
+        self.count = 0
+        self.messages += n
+
+        # a single datagram is cheaper through plain sendto() than ctypes
+        if self.use_sendmmsg and n > 1:
+            sent = self._flush_mmsg(n)
+        else:
+            sent = self._flush_loop(0, n)
+
+        if sent < n:
+            self.failed_tags.extend(self.tags[sent:n])
+        return sent
+
+    def _flush_loop(self, start, n):
+        sendto = self.sock.sendto
+        view = self.view
+        size = self.slot_size
+        lengths = self.lengths
+        for i in range(start, n):
+            offset = i * size
+            self.syscalls += 1
+            try:
+                sendto(view[offset:offset + lengths[i]], self.addresses[i])
+            except (BlockingIOError, InterruptedError):
+                return i
+            except OSError:
+                return i
+        return n
+
+    def _flush_mmsg(self, n):
+        addresses = self.addresses
+        slot_address = self._slot_address
+        lengths = self.lengths
+        iov_words = self._iov_words
+        iov_stride = self._iov_stride
+        iov_len_at = self._iov_len_at
+        msg_words = self._msg_words
+        msg_stride = self._msg_stride
+
+        for i in range(n):
+            address = addresses[i]
+            if address != slot_address[i]:
+                sockaddr = self._sockaddr(address)
+                if sockaddr is None:
+                    # not IPv4: send this batch the portable way
+                    return self._flush_loop(0, n)
+                msg_words[i * msg_stride] = ctypes.addressof(sockaddr)      # msg_name
+                slot_address[i] = address
+            iov_words[i * iov_stride + iov_len_at] = lengths[i]
+
+        fd = self.sock.fileno()
+        flags = 0 if self.sock.gettimeout() is None else MSG_DONTWAIT
+        sent = 0
+        while sent < n:
+            self.syscalls += 1
+            result = _sendmmsg(fd, self._msgs_addr + sent * MMSG_SIZE, n - sent, flags)
+            if result < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                # EAGAIN / ECONNREFUSED etc: the rest of the batch is dropped
+                break
+            sent += result
+        return sent
+
+    def _sockaddr(self, address):
+        sockaddr = self._sockaddrs.get(address)
+        if sockaddr is None and address not in self._sockaddrs:
+            sockaddr = self._sockaddrs[address] = _sockaddr_in(address)
+        return sockaddr
+
+    def take_failed(self):
+        failed = self.failed_tags
+        self.failed_tags = []
+        return failed
+
+    def report(self):
+        per_1000 = self.syscalls / max(self.messages, 1) * 1000
+        print(f"[SENDQ] {'sendmmsg' if self.use_sendmmsg else 'sendto loop'} | "
+              f"messages={self.messages} syscalls={self.syscalls} "
+              f"({per_1000:.1f} per 1000) | failed={len(self.failed_tags)}", flush=True)
@@ -0,0 +1,190 @@
+import csv
+import heapq
+import os
+import signal
+import multiprocessing as mp
+
+from binlog import BinarySink, BinaryLogReader, is_binary_log, CONVERT_CHUNK
+from oop_server import (
+    TelemetryServer, PORT, CSV_HEADER, DRAIN_BATCH, default_csv_filename
+)
+
+'''
+Multi-process server: N workers bind the same UDP port with SO_REUSEPORT
+and the kernel hashes each flow (source address + port) onto one of them.
+
+Every worker keeps its own DeviceState table and its own CSV log. A shared
+owner table (one slot per 16-bit device ID) records which worker a device
+landed on, so a device that shows up on a different worker (e.g. after a
+NAT rebind changed its source port) is detected and handed over. After
+shutdown the per-worker logs are merged into one combined log.
+'''
+
+NO_OWNER = -1
+DEVICE_ID_SPACE = 1 << 16
+ARRIVAL_COL = CSV_HEADER.index("arrival_time")
+
+
+# ===========================================================
+# DEVICE OWNERSHIP
+# ===========================================================
+class ShardOwnership:
+    def __init__(self, worker_id, owners, moves):
+        self.worker_id = worker_id
+        self.owners = owners          # shared Array('h'), deviceID -> worker
+        self.moves = moves            # shared Value('i'), total handovers
+
+    def claim(self, deviceID, client):
+        """
+        Called when a worker sees a device it has no state for. A device
+        owned by another worker means the kernel now hashes it elsewhere.
+        """
+        with self.owners.get_lock():
+            previous = self.owners[deviceID]
+            self.owners[deviceID] = self.worker_id
+
+        if previous == NO_OWNER or previous == self.worker_id:
+            return
+
+        with self.moves.get_lock():
+            self.moves.value += 1
+
+        print(f"[SHARD MOVE] Device {deviceID} moved worker {previous} → "
+              f"{self.worker_id} (now from {client}); state restarted")
+
+    def owns(self, deviceID):
+        return self.owners[deviceID] == self.worker_id
+
+
+# ===========================================================
+# WORKER PROCESS
+# ===========================================================
+def worker_csv_filename(csv_filename, worker_id):
+    root, ext = os.path.splitext(csv_filename)
+    return f"{root}.worker{worker_id}{ext or '.csv'}"
+
+
+_stopping = False
+
+
+def _interrupt(signum, frame):
+    # First Ctrl+C/kill wins; the supervisor forwarding it again (or the
+    # shell signalling the whole group) must not abort the shutdown itself
+    global _stopping
+    if _stopping:
+        return
+    _stopping = True
+    raise KeyboardInterrupt
+
+
+def _worker_main(worker_id, port, csv_filename, owners, moves,
+                 engine, drain_batch, server_options):
+    # Shut down cleanly on Ctrl+C or `kill`, even when started from a
+    # non-interactive shell that ignores SIGINT for background jobs
+    signal.signal(signal.SIGINT, _interrupt)
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    print(f"[WORKER {worker_id}] pid={os.getpid()}")
+    shard = ShardOwnership(worker_id, owners, moves)
+    server = TelemetryServer(port=port, csv_filename=csv_filename,
+                             reuse_port=True, shard=shard, **server_options)
+    server.serve(engine=engine, drain_batch=drain_batch)
+
+
+# ===========================================================
+# LOG MERGE
+# ===========================================================
+def _read_rows(path):
+    if is_binary_log(path):
+        reader = BinaryLogReader(path)
+        yield from reader.iter_rows()
+        reader.close()
+        return
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)            # header
+        for row in reader:
+            yield row
+
+
+def merge_worker_logs(paths, out_path):
+    """
+    Each worker log is already in arrival order, and a device only ever
+    writes to one worker at a time, so a k-way merge on arrival_time gives
+    one log that is ordered per device (and globally by arrival).
+    """
+    paths = [p for p in paths if os.path.exists(p)]
+    rows = 0
+    # the merged log keeps the workers' format (--csv names need not say which)
+    binary = any(is_binary_log(p) for p in paths)
+
+    merged = heapq.merge(*(_read_rows(p) for p in paths),
+                         key=lambda row: int(row[ARRIVAL_COL]))
+
+    if binary:
+        sink = BinarySink(out_path)
+        chunk = []
+        for row in merged:
+            chunk.append(row)
+            if len(chunk) >= CONVERT_CHUNK:
+                sink.writerows(chunk)
+                sink.flush()
+                rows += len(chunk)
+                chunk = []
+        sink.writerows(chunk)
+        sink.close()
+        return rows + len(chunk)
+
+    with open(out_path, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(CSV_HEADER)
+        for row in merged:
+            writer.writerow(row)
+            rows += 1
+
+    return rows
+
+
+# ===========================================================
+# SUPERVISOR
+# ===========================================================
+def run_workers(workers, port=PORT, csv_filename=None, engine="loop",
+                drain_batch=DRAIN_BATCH, **server_options):
+    if csv_filename is None:
+        csv_filename = default_csv_filename(server_options.get("log_format", "csv"))
+    paths = [worker_csv_filename(csv_filename, i) for i in range(workers)]
+
+    owners = mp.Array("h", [NO_OWNER] * DEVICE_ID_SPACE)
+    moves = mp.Value("i", 0)
+
+    procs = []
+    for i, path in enumerate(paths):
+        proc = mp.Process(
+            target=_worker_main,
+            args=(i, port, path, owners, moves, engine, drain_batch, server_options),
+        )
+        proc.start()
+        procs.append(proc)
+
+    print(f"[SHARDED] {workers} workers on UDP port {port} (SO_REUSEPORT)")
+
+    # `kill <pid>` may only reach the supervisor: forward it to the workers
+    signal.signal(signal.SIGINT, _interrupt)
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        # workers treat SIGTERM as a graceful stop
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join()
+
+    rows = merge_worker_logs(paths, csv_filename)
+
+    devices = sum(1 for owner in owners if owner != NO_OWNER)
+    print(f"[SHARDED] Merged {rows} rows from {workers} worker logs → {csv_filename}")
+    print(f"[SHARDED] {devices} devices seen, {moves.value} moved between workers")
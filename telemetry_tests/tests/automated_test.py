@@ -4,15 +4,25 @@ import os
 import time
 import subprocess
 import pathlib
+import socket
 import sys
 
 # Define paths for server and client scripts
-SERVER = pathlib.Path(__file__).parent.resolve() / "../oop/oop_server.py"
-CLIENT = pathlib.Path(__file__).parent.resolve() / "../oop/oop_client.py"
+PROJECT = pathlib.Path(__file__).parent.resolve() / "../project"
+SERVER = PROJECT / "oop_server.py"
+CLIENT = PROJECT / "oop_client.py"
+
+# Pick a free UDP port so the test never collides with a running server
+def free_udp_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
 
 # Generate expected device IDs based on number of clients
 def get_expected_device_ids(num_clients, base_id=1000):
-    counter_file = pathlib.Path(__file__).parent.resolve() / "client_ids.txt"
+    counter_file = PROJECT / "client_ids.txt"
     last_id = base_id
     if counter_file.exists():
         try:
@@ -24,7 +34,7 @@ def get_expected_device_ids(num_clients, base_id=1000):
 
 # Reset client ID counter file
 def reset_device_id_counter():
-    counter_file = pathlib.Path(__file__).parent.resolve() / "client_ids.txt"
+    counter_file = PROJECT / "client_ids.txt"
     try:
         os.remove(counter_file)
         print("[TEST] Reset client_ids.txt")
@@ -32,14 +42,15 @@ def reset_device_id_counter():
         pass
 
 # Start server process with logging
-def start_server(device_ids):
+def start_server(port):
     test_dir = pathlib.Path(__file__).parent.resolve() / "test_logs"
     test_dir.mkdir(exist_ok=True)
     run_date = int(time.time())
     log_path = test_dir / f"server_log_{run_date}.log"
     log_fp = open(log_path, "w", buffering=1, encoding="utf-8")
     proc = subprocess.Popen(
-        [sys.executable, "-u", str(SERVER), "--test-ids", ",".join(map(str, device_ids))],
+        [sys.executable, "-u", str(SERVER), "--port", str(port),
+         "--csv", str(test_dir / f"server_log_{run_date}.csv")],
         stdout=log_fp,
         stderr=subprocess.STDOUT,
         text=True,
@@ -48,14 +59,14 @@ def start_server(device_ids):
     return proc, log_fp
 
 # Start a client process with logging
-def start_client(index, total):
+def start_client(index, total, port):
     test_dir = pathlib.Path(__file__).parent.resolve() / "test_logs"
     test_dir.mkdir(exist_ok=True)
     run_date = int(time.time())
     log_path = test_dir / f"client_{index + 1}_log_{run_date}.log"
     log_fp = open(log_path, "w", buffering=1, encoding="utf-8")
     proc = subprocess.Popen(
-        [sys.executable, "-u", str(CLIENT)],
+        [sys.executable, "-u", str(CLIENT), "--server-ip", "127.0.0.1", "--server-port", str(port)],
         stdout=log_fp,
         stderr=subprocess.STDOUT,
         text=True,
@@ -81,14 +92,15 @@ def main():
     print(f"[TEST] Expected device IDs: {device_ids}")
 
     # Start server
-    server_proc, server_log_fp = start_server(device_ids)
+    port = free_udp_port()
+    server_proc, server_log_fp = start_server(port)
     time.sleep(2)  # Wait for server to initialize
 
     # Start clients with staggered launches
     clients = []
     print(f"[TEST] Launching {args.clients} client(s)...")
     for i in range(args.clients):
-        client_proc, client_log_fp = start_client(i, args.clients)
+        client_proc, client_log_fp = start_client(i, args.clients, port)
         clients.append((client_proc, client_log_fp))
         time.sleep(args.stagger)
 
@@ -119,7 +131,7 @@ def main():
         server_log_fp.close()
         for _, client_log_fp in clients:
             client_log_fp.close()
-        print("[TEST] Stopped. Messages logged to auto_script.csv")
+        print("[TEST] Stopped. Logs in test_logs/")
 
 # Entry point
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+# Benchmark: fixed 5-reading text batches vs AdaptiveBatcher
+# Simulates one device sampling SAMPLES_PER_INTERVAL readings per second
+# (with +-20% sample jitter) and reports, per configuration:
+#   packets/s on the wire, wire bytes per reading (payload + 10 B header +
+#   28 B IP/UDP), payload compression vs text, batching latency (how long the
+#   oldest reading of a batch waited), and server cost per packet/reading
+#   (TelemetryServer.handle_packet, console output to /dev/null).
+import argparse
+import contextlib
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve() / "../project"))
+
+from batcher import AdaptiveBatcher, IP_UDP_OVERHEAD  # noqa: E402
+from protocol import HEADER, HEADER_SIZE, FLAG_BATCH  # noqa: E402
+from oop_server import TelemetryServer  # noqa: E402
+
+SAMPLES_PER_INTERVAL = 5
+DURATION_S = 3600
+LEGACY_BATCH = 5
+
+# (encoding, byte budget, max age ms); None = legacy fixed batches
+CONFIGS = [
+    None,
+    ("text", 1200, 1000),
+    ("f32", 1200, 1000),
+    ("delta", 1200, 1000),
+    ("delta", 1200, 5000),
+    ("delta", 1200, 10000),
+    ("delta", 1200, 60000),
+]
+
+
+def make_readings(signal, duration_s, rng):
+    step_ms = 1000 / SAMPLES_PER_INTERVAL
+    t = 0.0
+    value = 25.0
+    readings = []
+    while t < duration_s * 1000:
+        t += step_ms * rng.uniform(0.8, 1.2)
+        if signal == "noise":               # oop_client.virtual_sensor()
+            value = round(rng.uniform(20.0, 30.0), 2)
+        else:                               # slowly drifting sensor
+            value = round(min(30.0, max(20.0, value + rng.gauss(0, 0.05))), 2)
+        readings.append((value, int(t)))
+    return readings
+
+
+def run_legacy(readings):
+    packets = []
+    latency = []
+    for i in range(0, len(readings), LEGACY_BATCH):
+        batch = readings[i:i + LEGACY_BATCH]
+        payload = ";".join(str(v) for v, _ in batch).encode()
+        packets.append((batch[0][1], payload, 0))
+        latency.append(batch[-1][1] - batch[0][1])
+    return packets, latency, len(readings)
+
+
+def run_adaptive(readings, encoding, budget, age):
+    batcher = AdaptiveBatcher(encoding, budget, age)
+    packets = []
+    latency = []
+    for value, t in readings:
+        for packet in (batcher.poll(t), batcher.add(value, t)):
+            if packet is not None:
+                packets.append(packet[:3])
+                latency.append(t - packet[0])
+    last = readings[-1][1]
+    packet = batcher.flush(last)
+    packets.append(packet[:3])
+    latency.append(last - packet[0])
+    return packets, latency, batcher.readings
+
+
+def server_cost(server, packets, deviceID):
+    """Seconds the server spends in handle_packet for these batches."""
+    wire = [HEADER.pack(0x11, deviceID, (i + 1) & 0xFFFF, ts & 0xFFFFFFFF,
+                        FLAG_BATCH | flags) + payload
+            for i, (ts, payload, flags) in enumerate(packets)]
+    handle = server.handle_packet
+    client = ("127.0.0.1", 40000)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        handle(HEADER.pack(0x10, deviceID, 0, 0, 0), client, 0)      # INIT
+        t0 = time.perf_counter()
+        for data in wire:
+            handle(memoryview(data), client, 0)
+        return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive batching benchmark")
+    parser.add_argument("--duration", type=int, default=DURATION_S,
+                        help="Simulated seconds of sensor data")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        server = TelemetryServer(port=0, csv_filename=os.path.join(tmp, "bench.csv"))
+    deviceID = 0
+
+    for signal in ("noise", "drift"):
+        readings = make_readings(signal, args.duration, random.Random(1))
+        text_bytes = sum(len(str(v)) for v, _ in readings) + len(readings)
+
+        print(f"\nsignal={signal}  readings={len(readings)}  "
+              f"({SAMPLES_PER_INTERVAL}/s for {args.duration}s)")
+        print(f"{'config':>18} | {'pkt/s':>6} | {'rd/pkt':>6} | {'B/rd wire':>9} | "
+              f"{'ratio':>5} | {'lat avg ms':>10} | {'lat max ms':>10} | "
+              f"{'us/pkt':>6} | {'us/rd':>5}")
+        print("-" * 100)
+        for config in CONFIGS:
+            if config is None:
+                name = "legacy text x5"
+                packets, latency, count = run_legacy(readings)
+            else:
+                name = "%s %dB %ds" % (config[0], config[1], config[2] // 1000)
+                packets, latency, count = run_adaptive(readings, *config)
+            assert count == len(readings)
+
+            payload = sum(len(p[1]) for p in packets)
+            wire = payload + len(packets) * (HEADER_SIZE + IP_UDP_OVERHEAD)
+            deviceID += 1
+            cost = server_cost(server, packets, deviceID)
+
+            print(f"{name:>18} | {len(packets) / args.duration:>6.3f} | "
+                  f"{count / len(packets):>6.1f} | {wire / count:>9.2f} | "
+                  f"{text_bytes / payload:>5.2f} | {sum(latency) / len(latency):>10.0f} | "
+                  f"{max(latency):>10} | {cost / len(packets) * 1e6:>6.2f} | "
+                  f"{cost / count * 1e6:>5.2f}")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        server.log_writer.close()
+    server.server.close()
+
+
+if __name__ == "__main__":
+    main()
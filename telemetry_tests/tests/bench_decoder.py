@@ -0,0 +1,64 @@
+# Microbenchmark: per-packet header/payload handling on the DATA path
+#   legacy  - slice header, struct.unpack with the format string, decode the
+#             whole payload, strip, re-encode for payload_size
+#   decoder - PacketDecoder: length check + bound Struct.unpack_from over a
+#             memoryview of the reused receive buffer, payload_size from
+#             the length (as in TelemetryServer.handle_packet)
+import argparse
+import pathlib
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve() / "../project"))
+
+from protocol import PacketDecoder, HEADER_FORMAT, HEADER_SIZE, FORMAT  # noqa: E402
+
+NUMBER = 200000
+
+SINGLE = struct.pack(HEADER_FORMAT, 0x11, 1001, 42, 123456789, 0) + b"Reading=25.37"
+BATCH = struct.pack(HEADER_FORMAT, 0x11, 1001, 42, 123456789, 0x04) + \
+    b"25.37;21.04;29.99;23.5;27.12"
+
+
+def legacy(data):
+    version_type, deviceID, seq, timestamp, flags = struct.unpack(
+        HEADER_FORMAT, data[:HEADER_SIZE]
+    )
+    payload = data[HEADER_SIZE:].decode(FORMAT, errors="ignore").strip()
+    return deviceID, seq, len(payload.encode(FORMAT))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packet decode microbenchmark")
+    parser.add_argument("--number", type=int, default=NUMBER)
+    args = parser.parse_args()
+
+    decoder = PacketDecoder()
+    unpack_header = decoder.unpack_header
+
+    print(f"{'packet':>7} | {'legacy ns':>9} | {'decoder ns':>10} | {'saved':>6}")
+    print("-" * 44)
+    for name, data in (("single", SINGLE), ("batch", BATCH)):
+        # the decoder path reads from its reused buffer, like the server loop
+        decoder.buffer[:len(data)] = data
+        packet = decoder.view[:len(data)]
+
+        def fast():
+            if len(packet) < HEADER_SIZE:
+                return None
+            version_type, deviceID, seq, timestamp, flags = unpack_header(packet)
+            return deviceID, seq, len(packet) - HEADER_SIZE
+
+        assert fast() == legacy(data)
+
+        t_legacy = min(timeit.repeat(lambda: legacy(data), number=args.number, repeat=5))
+        t_fast = min(timeit.repeat(fast, number=args.number, repeat=5))
+        ns_legacy = t_legacy / args.number * 1e9
+        ns_fast = t_fast / args.number * 1e9
+        print(f"{name:>7} | {ns_legacy:>9.0f} | {ns_fast:>10.0f} | "
+              f"{(1 - ns_fast / ns_legacy):>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Benchmark: dict of DeviceState objects vs the struct-of-arrays DeviceTable
+# Reports memory held by device state and per-packet state-update cost at
+# 1k, 10k and 65k active devices.
+import argparse
+import gc
+import pathlib
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve() / "../project"))
+
+from oop_server import DeviceState, TelemetryServer  # noqa: E402
+from device_table import DeviceTable  # noqa: E402
+
+DEVICE_COUNTS = [1000, 10000, 65000]
+PACKETS = 500000
+
+
+# Builds the device store the way TelemetryServer does: one INIT per device
+def build_dict(n):
+    store = {}
+    for deviceID in range(n):
+        state = store[deviceID] = DeviceState()
+        state.address = ("10.0.%d.%d" % (deviceID >> 8, deviceID & 0xFF), 40000)
+        state.reset_seq(0)
+        state.mode = "single"
+    return store
+
+
+def build_table(n):
+    store = DeviceTable()
+    for deviceID in range(n):
+        state = store.activate(deviceID)
+        state.address = ("10.0.%d.%d" % (deviceID >> 8, deviceID & 0xFF), 40000)
+        state.reset_seq(0)
+        state.mode = "single"
+    return store
+
+
+def measure_memory(builder, n):
+    gc.collect()
+    tracemalloc.start()
+    store = builder(n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, current
+
+
+# Same per-packet state work as TelemetryServer.handle_packet for a DATA packet
+def run_packets(store, packets):
+    unwrap = TelemetryServer.unwrap_timestamp
+    get = store.get
+    t0 = time.perf_counter()
+    for deviceID, seq, timestamp in packets:
+        state = get(deviceID)
+        state.last_seen = timestamp
+        unwrap(None, state, timestamp)
+        state.track(seq, 0, timestamp)
+        _ = state.mode
+    return time.perf_counter() - t0
+
+
+def make_packets(n, count):
+    rng = random.Random(1)
+    seqs = [0] * n
+    packets = []
+    for i in range(count):
+        deviceID = rng.randrange(n)
+        seqs[deviceID] = (seqs[deviceID] + 1) & 0xFFFF
+        packets.append((deviceID, seqs[deviceID], 1000 + i))
+    return packets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeviceState dict vs DeviceTable benchmark")
+    parser.add_argument("--packets", type=int, default=PACKETS)
+    args = parser.parse_args()
+
+    print(f"{'devices':>8} | {'store':>6} | {'memory':>10} | {'bytes/dev':>9} | {'ns/packet':>9}")
+    print("-" * 56)
+    for n in DEVICE_COUNTS:
+        packets = make_packets(n, args.packets)
+        for name, builder in (("dict", build_dict), ("table", build_table)):
+            store, mem = measure_memory(builder, n)
+            elapsed = run_packets(store, packets)
+            print(f"{n:>8} | {name:>6} | {mem / 1e6:>8.2f}MB | {mem / n:>9.0f} | "
+                  f"{elapsed / len(packets) * 1e9:>9.0f}")
+            del store
+        print("-" * 56)
+
+
+if __name__ == "__main__":
+    main()
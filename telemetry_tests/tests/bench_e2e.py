@@ -0,0 +1,459 @@
+# Benchmark: whole server under a stepped offered load
+# Starts TelemetryServer on a free port (as an oop_server.py subprocess, or
+# forked straight from the TelemetryServer class), drives it with N synthetic
+# devices at each rate in --steps and measures per step:
+#   received pkt/s   DATA packets the server handled (live stats snapshot)
+#   loss            1 - received / sent, plus kernel receive-queue drops
+#   CPU us/packet   server user+sys time (/proc/<pid>/stat) per packet
+#   RSS             server resident set, peak (VmHWM) at the end
+#   latency         CONFIG round trips of a probe device sent between the
+#                   DATA packets: queueing + processing inside the server
+# Results go to JSON. With a baseline file (--baseline, written by
+# --save-baseline) a regression beyond the tolerances in CHECKS exits 1.
+# Baselines only compare on the same machine and configuration: record a
+# new one with --save-baseline where the check runs. Linux only (/proc).
+import argparse
+import json
+import multiprocessing as mp
+import os
+import pathlib
+import platform
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT = pathlib.Path(__file__).parent.resolve() / "../project"
+sys.path.insert(0, str(PROJECT))
+
+from protocol import HEADER_FORMAT, HEADER_SIZE, BUFFER  # noqa: E402
+from send_queue import SendQueue, QUEUE_DEPTH  # noqa: E402
+
+STEPS = [1000, 2000, 5000, 10000, 20000, 40000]
+STEP_DURATION = 3.0
+DEVICES = 100
+FIRST_ID = 60000           # away from IDs handed out by client_ids.txt
+PROBE_ID = 59999
+PROBE_INTERVAL = 0.01      # seconds between latency probes
+PROBE_TIMEOUT = 1.0        # a probe without reply by then counts as lost
+DRAIN = 0.5                # seconds after a step before counting what arrived
+LOSS_OK = 0.01             # a step with more loss than this is saturated
+STARTUP_TIMEOUT = 10.0
+PAYLOAD = b"Reading=25.37"
+
+BASELINE = pathlib.Path(__file__).parent.resolve() / "bench_e2e_baseline.json"
+RESULTS_DIR = pathlib.Path(__file__).parent.resolve() / "../results/bench"
+
+# (summary key, better, allowed relative change in the worse direction)
+CHECKS = [
+    ("max_sustained_pps", "higher", 0.15),
+    ("cpu_us_per_packet", "lower", 0.20),
+    ("peak_rss_mb", "lower", 0.25),
+    ("latency_p99_ms", "lower", 1.00),   # tail latency on a shared box is noisy
+]
+
+
+# ===========================================================
+# SERVER PROCESS
+# ===========================================================
+def free_udp_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _serve_forked(port, csv_filename, engine, log_format):
+    sys.stdout = open(os.path.splitext(csv_filename)[0] + ".server.log", "w", buffering=1)
+    from oop_server import TelemetryServer
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    TelemetryServer(port=port, csv_filename=csv_filename, log_format=log_format).serve(engine)
+
+
+def start_server(mode, port, csv_filename, engine, log_format, extra_args):
+    if mode == "fork":
+        proc = mp.get_context("fork").Process(
+            target=_serve_forked, args=(port, csv_filename, engine, log_format))
+        proc.start()
+        return proc, proc.pid
+
+    log = open(os.path.splitext(csv_filename)[0] + ".server.log", "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-u", str(PROJECT / "oop_server.py"), "--port", str(port),
+         "--csv", csv_filename, "--engine", engine, "--log-format", log_format] + extra_args,
+        stdout=log, stderr=subprocess.STDOUT,
+    )
+    return proc, proc.pid
+
+
+def stop_server(proc):
+    proc.terminate()
+    if isinstance(proc, subprocess.Popen):
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    else:
+        proc.join(10)
+        if proc.is_alive():
+            proc.kill()
+
+
+def cpu_seconds(pid):
+    """User + system CPU time of a process (/proc/<pid>/stat, fields 14 and 15)."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def memory_mb(pid):
+    """(VmRSS, VmHWM) in MB."""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key, value = line.split(":")
+                values[key] = int(value.split()[0]) / 1024
+    return values.get("VmRSS", 0.0), values.get("VmHWM", 0.0)
+
+
+def udp_drops(port):
+    """Kernel drop counter of the UDP socket bound to `port` (/proc/net/udp)."""
+    suffix = f":{port:04X}"
+    try:
+        with open("/proc/net/udp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if fields[1].endswith(suffix):
+                    return int(fields[-1])
+    except (OSError, StopIteration):
+        pass
+    return 0
+
+
+def received_packets(pid, live_path, timeout=5.0):
+    """DATA packets handled so far: asks for a live stats snapshot (SIGUSR1)."""
+    try:
+        before = os.stat(live_path).st_mtime_ns
+    except FileNotFoundError:
+        before = None
+    os.kill(pid, signal.SIGUSR1)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if os.stat(live_path).st_mtime_ns != before:
+                with open(live_path) as f:
+                    return json.load(f)["packets"]
+        except (FileNotFoundError, ValueError):
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"server did not write {live_path}")
+
+
+# ===========================================================
+# LOAD
+# ===========================================================
+class Driver:
+    """Synthetic devices sending DATA round-robin, plus one latency probe device."""
+
+    def __init__(self, address, devices):
+        self.address = address
+        self.devices = devices
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
+        self.sock.setblocking(False)
+        self.queue = SendQueue(self.sock, QUEUE_DEPTH)
+        self.seqs = [1] * devices
+        self.next_device = 0
+
+        self.probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.probe.setblocking(False)
+        self.probe_sent_at = None
+        self.rtts = []
+        self.probes_lost = 0
+
+    def hello(self):
+        """INIT for every device so the server has their state before the first step."""
+        wall_ms = int(time.time() * 1000)
+        for i in range(self.devices):
+            self.queue.add(0x10, FIRST_ID + i, 0, wall_ms, 0, b"", self.address)
+        self.queue.flush()
+        self.probe.sendto(self._packet(0x10, PROBE_ID, 0, b""), self.address)
+
+    def _packet(self, version_type, deviceID, seq, payload):
+        header = struct.pack(HEADER_FORMAT, version_type, deviceID, seq,
+                             int(time.time() * 1000) & 0xFFFFFFFF, 0)
+        return header + payload
+
+    # ---------- latency probe ----------
+    def send_probe(self, now):
+        self.probe.sendto(self._packet(0x13, PROBE_ID, 0, b"MODE=single"), self.address)
+        self.probe_sent_at = now
+
+    def poll_probe(self, now):
+        """Collects the CONFIG reply to the outstanding probe. True when one arrived."""
+        if self.probe_sent_at is not None:
+            try:
+                reply = self.probe.recv(BUFFER)
+            except (BlockingIOError, InterruptedError, ConnectionRefusedError):
+                reply = None
+            if reply is not None and len(reply) >= HEADER_SIZE and reply[0] & 0x0F == 3:
+                self.rtts.append(now - self.probe_sent_at)
+                self.probe_sent_at = None
+                return True
+            if now - self.probe_sent_at > PROBE_TIMEOUT:
+                self.probes_lost += 1
+                self.probe_sent_at = None
+        return False
+
+    def wait_ready(self, timeout=STARTUP_TIMEOUT):
+        """The server is up once it answers a probe."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            now = time.monotonic()
+            if self.probe_sent_at is None:
+                self.hello()
+                self.send_probe(now)
+            if self.poll_probe(now):
+                self.rtts = []
+                return
+            time.sleep(0.01)
+        raise RuntimeError("server did not answer within "
+                           f"{timeout:.0f}s (see its .server.log)")
+
+    # ---------- one step ----------
+    def run(self, rate, duration):
+        """Sends `rate` DATA pkt/s on an absolute schedule. Returns (sent, seconds)."""
+        add = self.queue.add
+        address = self.address
+        seqs = self.seqs
+        devices = self.devices
+        clock = time.perf_counter
+        self.rtts = []
+        self.probes_lost = 0
+        self.queue.take_failed()
+
+        start = clock()
+        next_probe = start
+        sent = 0
+        while True:
+            now = clock()
+            elapsed = now - start
+            if elapsed >= duration:
+                break
+            wall_ms = int(time.time() * 1000)
+            due = min(int(elapsed * rate) - sent, 4 * QUEUE_DEPTH)
+            for _ in range(due):
+                i = self.next_device
+                add(0x11, FIRST_ID + i, seqs[i], wall_ms, 0, PAYLOAD, address)
+                seqs[i] = (seqs[i] + 1) & 0xFFFF
+                self.next_device = i + 1 if i + 1 < devices else 0
+            sent += due
+            self.queue.flush()
+
+            self.poll_probe(now)
+            if self.probe_sent_at is None and now >= next_probe:
+                self.send_probe(now)
+                next_probe = now + PROBE_INTERVAL
+
+            if due == 0:
+                time.sleep(min(1.0 / rate, 0.001))
+        seconds = clock() - start
+
+        # datagrams the kernel refused never left: not offered load
+        sent -= len(self.queue.take_failed())
+        # let the last probe come back
+        deadline = clock() + PROBE_TIMEOUT
+        while self.probe_sent_at is not None and clock() < deadline:
+            self.poll_probe(clock())
+            time.sleep(0.001)
+        return sent, seconds
+
+    def close(self):
+        self.sock.close()
+        self.probe.close()
+
+
+# ===========================================================
+# RESULTS
+# ===========================================================
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(steps):
+    """
+    Capacity figures. CPU per packet and latency are taken at the highest
+    step without saturation: at low rates CPU time is dominated by idle
+    wakeups rather than packets.
+    """
+    ok = [s for s in steps if s["loss"] <= LOSS_OK]
+    saturated = [s for s in steps if s["loss"] > LOSS_OK]
+    reference = max(ok, key=lambda s: s["offered_pps"]) if ok else None
+    return {
+        "max_sustained_pps": max((s["received_pps"] for s in ok), default=0.0),
+        "cpu_us_per_packet": reference["cpu_us_per_packet"] if reference else None,
+        "peak_rss_mb": max(s["peak_rss_mb"] for s in steps),
+        "latency_p50_ms": reference["latency_p50_ms"] if reference else None,
+        "latency_p99_ms": reference["latency_p99_ms"] if reference else None,
+        "saturation_offered_pps": saturated[0]["offered_pps"] if saturated else None,
+        "loss_at_saturation": saturated[0]["loss"] if saturated else None,
+    }
+
+
+def compare(summary, baseline):
+    """Regressions of `summary` against `baseline`, as printable lines."""
+    failures = []
+    print(f"\n{'metric':<20} | {'baseline':>10} | {'now':>10} | {'change':>8} | limit")
+    print("-" * 66)
+    for key, better, tolerance in CHECKS:
+        old, new = baseline.get(key), summary.get(key)
+        if old is None or new is None or old == 0:
+            print(f"{key:<20} | {str(old):>10} | {str(new):>10} | {'':>8} | skipped")
+            continue
+        change = new / old - 1
+        worse = -change if better == "higher" else change
+        failed = worse > tolerance
+        print(f"{key:<20} | {old:>10.2f} | {new:>10.2f} | {change:>+8.1%} | "
+              f"{'-' if better == 'higher' else '+'}{tolerance:.0%}{'  REGRESSION' if failed else ''}")
+        if failed:
+            failures.append(f"{key} {old:.2f} -> {new:.2f} ({change:+.1%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end server benchmark")
+    parser.add_argument("--server", type=str, default="subprocess", choices=["subprocess", "fork"],
+                        help="Run oop_server.py as a subprocess, or fork TelemetryServer directly")
+    parser.add_argument("--engine", type=str, default="loop", choices=["loop", "bulk", "async"])
+    parser.add_argument("--log-format", type=str, default="csv", choices=["csv", "bin"])
+    parser.add_argument("--server-args", type=str, default="",
+                        help="Extra oop_server.py flags (subprocess mode)")
+    parser.add_argument("--devices", type=int, default=DEVICES)
+    parser.add_argument("--steps", type=str, default=",".join(map(str, STEPS)),
+                        help="Offered DATA packets/s, comma separated")
+    parser.add_argument("--duration", type=float, default=STEP_DURATION,
+                        help="Seconds per step")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Results JSON (default: results/bench/bench_e2e_<time>.json)")
+    parser.add_argument("--baseline", type=str, default=str(BASELINE),
+                        help="Baseline JSON to compare against (skipped if missing)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Write this run's results as the new baseline")
+    args = parser.parse_args()
+
+    steps = [int(s) for s in args.steps.split(",") if s]
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    csv_filename = os.path.join(workdir, "logging." + args.log_format)
+    live_path = os.path.join(workdir, "logging.live.json")
+    port = free_udp_port()
+
+    proc, pid = start_server(args.server, port, csv_filename, args.engine,
+                             args.log_format, args.server_args.split())
+    driver = Driver(("127.0.0.1", port), args.devices)
+    results = []
+    try:
+        driver.wait_ready()
+        time.sleep(DRAIN)
+        packets = received_packets(pid, live_path)
+        drops = udp_drops(port)
+        cpu = cpu_seconds(pid)
+
+        print(f"[BENCH] server pid={pid} ({args.server}, engine={args.engine}, "
+              f"log={args.log_format}) on port {port} | {args.devices} devices | "
+              f"{args.duration:g}s per step | work dir {workdir}\n")
+        print(f"{'offered/s':>10} | {'sent/s':>9} | {'received/s':>10} | {'loss':>7} | "
+              f"{'kdrops':>7} | {'cpu us/pkt':>10} | {'lat p50 ms':>10} | {'lat p99 ms':>10} | "
+              f"{'rss MB':>7}")
+        print("-" * 104)
+        for rate in steps:
+            sent, seconds = driver.run(rate, args.duration)
+            time.sleep(DRAIN)
+            now_packets = received_packets(pid, live_path)
+            now_drops = udp_drops(port)
+            now_cpu = cpu_seconds(pid)
+            rss, hwm = memory_mb(pid)
+
+            received = now_packets - packets
+            rtts = sorted(rtt * 1000 for rtt in driver.rtts)
+            step = {
+                "offered_pps": rate,
+                "sent_pps": sent / seconds,
+                "received_pps": received / seconds,
+                "loss": max(0.0, 1 - received / sent) if sent else 0.0,
+                "kernel_drops": now_drops - drops,
+                "cpu_us_per_packet": (now_cpu - cpu) / max(received, 1) * 1e6,
+                "latency_p50_ms": percentile(rtts, 0.5),
+                "latency_p99_ms": percentile(rtts, 0.99),
+                "probes": len(rtts),
+                "probes_lost": driver.probes_lost,
+                "rss_mb": rss,
+                "peak_rss_mb": hwm,
+            }
+            results.append(step)
+            packets, drops, cpu = now_packets, now_drops, now_cpu
+
+            def ms(value):
+                return "n/a" if value is None else f"{value:.2f}"
+
+            print(f"{rate:>10} | {step['sent_pps']:>9.0f} | {step['received_pps']:>10.0f} | "
+                  f"{step['loss']:>7.2%} | {step['kernel_drops']:>7} | "
+                  f"{step['cpu_us_per_packet']:>10.1f} | {ms(step['latency_p50_ms']):>10} | "
+                  f"{ms(step['latency_p99_ms']):>10} | {rss:>7.1f}", flush=True)
+    finally:
+        driver.close()
+        stop_server(proc)
+
+    summary = summarize(results)
+    report = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "config": {"server": args.server, "engine": args.engine, "log_format": args.log_format,
+                   "server_args": args.server_args, "devices": args.devices,
+                   "duration": args.duration, "steps": steps},
+        "steps": results,
+        "summary": summary,
+    }
+
+    print("\n[SUMMARY] " + " | ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                                      for k, v in summary.items()))
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"bench_e2e_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] results -> {os.path.abspath(output)}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] baseline saved -> {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"[BENCH] no baseline at {args.baseline} (create one with --save-baseline)")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != report["config"]:
+        print("[BENCH] WARNING: baseline was recorded with a different configuration")
+    failures = compare(summary, baseline["summary"])
+    if failures:
+        print(f"\n[BENCH] FAILED: {len(failures)} regression(s): " + "; ".join(failures))
+        return 1
+    print("\n[BENCH] OK: no regression against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+# Microbenchmark: the per-packet primitives, one at a time
+# Reports for each:
+#   ns/op      best of --repeat timeit runs of --number calls
+#   peak B     largest memory in use during the calls, above the starting
+#              point and above what the same loop around an empty call
+#              needs (tracemalloc): what one call allocates transiently
+#   kept B/op  memory still held after the calls, per call (should be 0)
+# tracemalloc sees allocator calls, so objects served from CPython free
+# lists (small tuples, floats) do not show up in the memory columns.
+#
+# Where a primitive replaced an older one, both are measured:
+#   client header    struct.pack + concat (old pack_header)  vs  the
+#                    SendQueue Struct.pack_into into the arena
+#   server header    struct.unpack of a slice (old start())  vs  the length
+#                    check + bound Struct.unpack_from that handle_packet runs
+#   duplicates       `seq in received_seqs` on a 64k-entry set (old)  vs  the
+#                    64-bit anti-replay window (DeviceState.classify)
+# With --baseline, a benchmark more than --tolerance slower than the stored
+# ns/op exits 1 (--save-baseline records one; same machine only).
+import argparse
+import csv
+import itertools
+import json
+import pathlib
+import struct
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve() / "../project"))
+
+from protocol import PacketDecoder, HEADER_FORMAT, HEADER_SIZE  # noqa: E402
+from oop_server import DeviceState, TelemetryServer  # noqa: E402
+
+NUMBER = 200000
+REPEAT = 5
+TRACE_NUMBER = 20000
+TOLERANCE = 0.5           # single runs on a shared box vary by ~25%
+BASELINE = pathlib.Path(__file__).parent.resolve() / "bench_hotpath_baseline.json"
+
+PAYLOAD = b"Reading=25.37"
+PACKET = struct.pack(HEADER_FORMAT, 0x11, 1001, 42, 123456789, 0) + PAYLOAD
+ROW = (1001, 42, 1792301990562, 1792301990564, 0, 0, 0, 13, 0, "single", 1, "")
+COMMIT_ROWS = 512
+
+
+class NullFile:
+    """A file that discards writes: the cost measured is formatting only."""
+
+    def write(self, text):
+        return len(text)
+
+
+# ===========================================================
+# BENCHMARKS (each builder returns a zero-argument callable)
+# ===========================================================
+def client_header_legacy():
+    pack = struct.pack
+    return lambda: pack(HEADER_FORMAT, 0x11, 1001, 42, 123456789, 0) + PAYLOAD
+
+
+def client_header_pack_into():
+    # what SendQueue.add() runs per message
+    pack_into = struct.Struct(f"{HEADER_FORMAT} {len(PAYLOAD)}s").pack_into
+    arena = bytearray(2048)
+    return lambda: pack_into(arena, 0, 0x11, 1001, 42, 123456789, 0, PAYLOAD)
+
+
+def server_header_legacy():
+    unpack = struct.unpack
+    return lambda: unpack(HEADER_FORMAT, PACKET[:HEADER_SIZE])
+
+
+def server_header_decoder():
+    # what handle_packet runs on a view of the receive buffer
+    decoder = PacketDecoder()
+    decoder.buffer[:len(PACKET)] = PACKET
+    packet = decoder.view[:len(PACKET)]
+    unpack_header = decoder.unpack_header
+    return lambda: unpack_header(packet) if len(packet) >= HEADER_SIZE else None
+
+
+def _state(last_seq):
+    state = DeviceState()
+    state.reset_seq(last_seq)
+    return state
+
+
+def detect_gap_single():
+    detect_gap = _state(100).detect_gap
+    return lambda: detect_gap(101, 0)
+
+
+def detect_gap_batch():
+    detect_gap = _state(100).detect_gap
+    return lambda: detect_gap(101, 0x04)
+
+
+def detect_gap_wraparound():
+    detect_gap = _state(0xFFFF).detect_gap
+    return lambda: detect_gap(0, 0)
+
+
+def detect_gap_missing():
+    detect_gap = _state(100).detect_gap
+    return lambda: detect_gap(105, 0)
+
+
+def track_in_order():
+    # full DATA sequence step (classify + detect_gap + window advance);
+    # includes the counter that feeds it consecutive seqs
+    track = _state(0).track
+    seqs = itertools.count(1)
+    return lambda: track(next(seqs) & 0xFFFF, 0, 123456789)
+
+
+def unwrap_in_order():
+    unwrap = TelemetryServer.unwrap_timestamp
+    state = _state(0)
+    state.last_full_timestamp = 0
+    timestamps = itertools.count(1)
+    return lambda: unwrap(None, state, next(timestamps) & 0xFFFFFFFF)
+
+
+def unwrap_reordered():
+    unwrap = TelemetryServer.unwrap_timestamp
+    state = _state(0)
+    state.last_full_timestamp = 1 << 33
+    return lambda: unwrap(None, state, 0xFFFFFF00)
+
+
+def unwrap_wraparound():
+    # includes resetting the state to just before the wrap on every call
+    unwrap = TelemetryServer.unwrap_timestamp
+    state = _state(0)
+
+    def run():
+        state.last_full_timestamp = 0xFFFFFFF0
+        return unwrap(None, state, 5)
+    return run
+
+
+def duplicate_set_legacy():
+    received_seqs = set(range(65536))
+    return lambda: 40000 in received_seqs
+
+
+def duplicate_window():
+    # seq 10 behind last_seq, already received: a duplicate hit in the bitmap
+    state = _state(100)
+    for seq in range(101, 200):
+        state.update_last(seq, 0)
+    classify = state.classify
+    return lambda: classify(189)
+
+
+def csv_row():
+    writerow = csv.writer(NullFile()).writerow
+    return lambda: writerow(ROW)
+
+
+def csv_group_per_row():
+    # one group commit's writerows(), reported per row (run() divides)
+    writerows = csv.writer(NullFile()).writerows
+    group = [ROW] * COMMIT_ROWS
+    return lambda: writerows(group)
+
+
+def call_overhead():
+    # the timing loop around an empty call: part of every ns/op below
+    return lambda: None
+
+
+BENCHMARKS = [
+    # (name, builder, operations per call)
+    ("call_overhead", call_overhead, 1),
+    ("client_header_legacy", client_header_legacy, 1),
+    ("client_header_pack_into", client_header_pack_into, 1),
+    ("server_header_legacy", server_header_legacy, 1),
+    ("server_header_decoder", server_header_decoder, 1),
+    ("detect_gap_single", detect_gap_single, 1),
+    ("detect_gap_batch", detect_gap_batch, 1),
+    ("detect_gap_wraparound", detect_gap_wraparound, 1),
+    ("detect_gap_missing", detect_gap_missing, 1),
+    ("track_in_order", track_in_order, 1),
+    ("unwrap_in_order", unwrap_in_order, 1),
+    ("unwrap_reordered", unwrap_reordered, 1),
+    ("unwrap_wraparound", unwrap_wraparound, 1),
+    ("duplicate_set_legacy", duplicate_set_legacy, 1),
+    ("duplicate_window", duplicate_window, 1),
+    ("csv_row", csv_row, 1),
+    ("csv_group_per_row", csv_group_per_row, COMMIT_ROWS),
+]
+
+
+# ===========================================================
+# RUNNER
+# ===========================================================
+def measure(builder, per_call, number, repeat, trace_number, peak_floor=0):
+    fn = builder()
+    calls = max(1, number // per_call)
+    best = min(timeit.repeat(fn, number=calls, repeat=repeat))
+    ns = best / (calls * per_call) * 1e9
+
+    # memory on a fresh instance, after one warm-up call (lazy caches)
+    fn = builder()
+    fn()
+    calls = max(1, trace_number // per_call)
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(calls):
+        fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ns_per_op": ns,
+        "peak_bytes": max(0, peak - start - peak_floor),
+        "kept_bytes_per_op": (current - start) / (calls * per_call),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path microbenchmarks")
+    parser.add_argument("--number", type=int, default=NUMBER)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--only", type=str, default=None,
+                        help="Run benchmarks whose name contains this text")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON")
+    parser.add_argument("--baseline", type=str, default=str(BASELINE),
+                        help="Baseline JSON to compare against (skipped if missing)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Write this run's results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Allowed ns/op slowdown against the baseline (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.save_baseline and pathlib.Path(args.baseline).exists():
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"{'benchmark':<24} | {'ns/op':>8} | {'peak B':>7} | {'kept B/op':>9} | {'baseline':>8} | change")
+    print("-" * 80)
+    results = {}
+    regressions = []
+    # the measuring loop's own transient allocations (range ints etc.)
+    peak_floor = measure(call_overhead, 1, 1, 1, TRACE_NUMBER)["peak_bytes"]
+    for name, builder, per_call in BENCHMARKS:
+        if args.only and args.only not in name:
+            continue
+        result = results[name] = measure(builder, per_call, args.number, args.repeat,
+                                         TRACE_NUMBER, peak_floor)
+        ns = result["ns_per_op"]
+        line = (f"{name:<24} | {ns:>8.1f} | {result['peak_bytes']:>7} | "
+                f"{result['kept_bytes_per_op']:>9.2f}")
+        old = baseline.get(name, {}).get("ns_per_op")
+        if old:
+            change = ns / old - 1
+            line += f" | {old:>8.1f} | {change:>+6.1%}"
+            if change > args.tolerance:
+                line += "  REGRESSION"
+                regressions.append(f"{name} {old:.1f} -> {ns:.1f} ns/op ({change:+.1%})")
+        print(line, flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[BENCH] baseline saved -> {args.baseline}")
+    if regressions:
+        print(f"\n[BENCH] FAILED: {len(regressions)} regression(s) over "
+              f"{args.tolerance:.0%}: " + "; ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
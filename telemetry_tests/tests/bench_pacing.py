@@ -0,0 +1,76 @@
+# Benchmark: sleep-after-work loop vs Pacer (absolute deadlines + token bucket)
+# Each loop sends one small UDP datagram per slot to a local socket nobody
+# reads, then reports achieved rate and how late slots were served.
+import argparse
+import pathlib
+import socket
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve() / "../project"))
+
+from pacing import Pacer  # noqa: E402
+
+RATES = [1, 10, 100, 1000, 10000, 50000]
+DURATION = 2.0
+PAYLOAD = b"\x11" + b"\x00" * 9 + b"Reading=25.37"
+
+
+def open_sink():
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(("127.0.0.1", 0))
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    return rx, tx, rx.getsockname()
+
+
+def run_sleep(rate, duration, tx, address):
+    """The old client loop: work, then time.sleep(interval)."""
+    interval = 1.0 / rate
+    count = max(1, int(rate * duration))
+    start = time.perf_counter()
+    for _ in range(count):
+        tx.sendto(PAYLOAD, address)
+        time.sleep(interval)
+    elapsed = time.perf_counter() - start
+    return count / elapsed, None
+
+
+def run_pacer(rate, duration, tx, address, burst):
+    pacer = Pacer(rate, burst)
+    count = max(1, int(rate * duration))
+    for _ in range(count):
+        pacer.wait()
+        tx.sendto(PAYLOAD, address)
+    # rate over whole slots: the last slot starts one period before the end
+    elapsed = pacer.clock() - pacer.started
+    return count / (elapsed + pacer.period), pacer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send pacing benchmark")
+    parser.add_argument("--duration", type=float, default=DURATION,
+                        help="Seconds per rate (1 Hz always runs a few slots)")
+    parser.add_argument("--burst", type=int, default=None,
+                        help="Pacer token bucket size (default: 10 ms worth of slots)")
+    args = parser.parse_args()
+
+    rx, tx, address = open_sink()
+
+    print(f"{'target/s':>9} | {'sleep loop/s':>12} | {'error':>7} | {'pacer/s':>9} | "
+          f"{'error':>7} | {'late avg us':>11} | {'late max us':>11} | {'skipped':>7}")
+    print("-" * 96)
+    for rate in RATES:
+        duration = max(args.duration, 3.0 / rate)
+        sleep_rate, _ = run_sleep(rate, duration, tx, address)
+        pacer_rate, pacer = run_pacer(rate, duration, tx, address, args.burst)
+        avg = pacer.late_total / pacer.sends * 1e6
+        print(f"{rate:>9} | {sleep_rate:>12.1f} | {sleep_rate / rate - 1:>+7.2%} | "
+              f"{pacer_rate:>9.1f} | {pacer_rate / rate - 1:>+7.2%} | {avg:>11.1f} | "
+              f"{pacer.late_max * 1e6:>11.1f} | {pacer.skipped:>7}")
+
+    rx.close()
+    tx.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Benchmark: batch payload encodings
+#   text - ";".join(str(v)) on the client, split + float() on the server
+#   f32  - count byte + packed float32, decoded into array('f')
+#   i16  - count byte + int16 scaled by 100, decoded into array('f')
+# Reports bytes per reading and encode/decode cost per batch.
+import argparse
+import pathlib
+import random
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve() / "../project"))
+
+from protocol import ENCODINGS, FORMAT, encode_readings, decode_readings, encoding_flags  # noqa: E402
+
+BATCH_SIZES = [1, 5, 20, 100]
+NUMBER = 20000
+
+
+def decode_text(payload):
+    return [float(v) for v in str(payload, FORMAT).split(";")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch payload encoding benchmark")
+    parser.add_argument("--number", type=int, default=NUMBER)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+
+    print(f"{'batch':>5} | {'encoding':>8} | {'bytes':>5} | {'B/reading':>9} | "
+          f"{'encode us':>9} | {'decode us':>9} | {'Mreadings/s':>11}")
+    print("-" * 76)
+    for size in BATCH_SIZES:
+        values = [round(rng.uniform(20.0, 30.0), 2) for _ in range(size)]
+
+        for encoding in ENCODINGS:
+            payload = encode_readings(values, encoding)
+            view = memoryview(payload)
+            flags = encoding_flags(encoding)
+
+            if encoding == "text":
+                decode = lambda: decode_text(view)  # noqa: E731
+            else:
+                decode = lambda: decode_readings(view, flags)  # noqa: E731
+
+            decoded = decode()
+            assert len(decoded) == size
+            assert all(abs(a - b) < 1e-3 for a, b in zip(decoded, values))
+
+            t_enc = min(timeit.repeat(lambda: encode_readings(values, encoding),
+                                      number=args.number, repeat=3))
+            t_dec = min(timeit.repeat(decode, number=args.number, repeat=3))
+            us_enc = t_enc / args.number * 1e6
+            us_dec = t_dec / args.number * 1e6
+
+            print(f"{size:>5} | {encoding:>8} | {len(payload):>5} | "
+                  f"{len(payload) / size:>9.2f} | {us_enc:>9.2f} | {us_dec:>9.2f} | "
+                  f"{size / us_dec:>11.2f}")
+        print("-" * 76)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/bin/bash
+
+# Runs one impairment scenario through project/middleman.py (no tc/netem,
+# no sudo). Scenarios run side by side on different ports.
+#
+#   ./run_scenario.sh <profile>          profile = tests/profiles/<profile>.json
+#
+# Environment overrides: DURATION (s), SEED, SERVER_PORT (proxy uses +1),
+# DRAIN_WAIT (s the proxy keeps forwarding after the client stops; default:
+# the profile's delay + 4 x jitter + 1 s)
+
+PROFILE="$1"
+if [ -z "$PROFILE" ]; then
+    echo "usage: $0 <profile>   (one of: $(ls "$(dirname "$0")/profiles" | sed 's/\.json$//' | tr '\n' ' '))"
+    exit 1
+fi
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+ROOT_DIR="$(dirname "$SCRIPT_DIR")"
+PROFILE_FILE="$SCRIPT_DIR/profiles/$PROFILE.json"
+if [ ! -f "$PROFILE_FILE" ]; then
+    echo "[ERROR] No such profile: $PROFILE_FILE"
+    exit 1
+fi
+
+DURATION=${DURATION:-60}
+SERVER_PORT=${SERVER_PORT:-$((20000 + RANDOM % 20000))}
+PROXY_PORT=$((SERVER_PORT + 1))
+SEED_ARG=""
+if [ -n "$SEED" ]; then
+    SEED_ARG="--seed $SEED"
+fi
+DRAIN_WAIT=${DRAIN_WAIT:-$(python3 -c "
+import json, sys
+p = json.load(open(sys.argv[1]))
+print(int((p.get('delay', 0) + 4 * p.get('jitter', 0)) / 1000) + 1)" "$PROFILE_FILE")}
+RESULTS_DIR="$ROOT_DIR/results/${PROFILE}_$(date +%Y%m%d_%H%M%S)"
+
+mkdir -p "$RESULTS_DIR"
+echo "[INFO] Profile $PROFILE | server port $SERVER_PORT | proxy port $PROXY_PORT"
+echo "[INFO] Saving results to: $RESULTS_DIR"
+
+echo "[SERVER] Starting server..."
+python3 "$ROOT_DIR/project/oop_server.py" \
+    --port "$SERVER_PORT" \
+    --csv "$RESULTS_DIR/logging.csv" \
+    > "$RESULTS_DIR/server.log" 2>&1 &
+SERVER_PID=$!
+
+echo "[PROXY] Starting impairment proxy..."
+python3 "$ROOT_DIR/project/middleman.py" \
+    --listen_ip 127.0.0.1 --listen_port "$PROXY_PORT" \
+    --server_ip 127.0.0.1 --server_port "$SERVER_PORT" \
+    --profile "$PROFILE_FILE" $SEED_ARG --quiet \
+    > "$RESULTS_DIR/proxy.log" 2>&1 &
+PROXY_PID=$!
+sleep 1
+
+echo "[CLIENT] Starting client in SINGLE mode..."
+python3 "$ROOT_DIR/project/oop_client.py" \
+    --mode single \
+    --server-ip 127.0.0.1 --server-port "$PROXY_PORT" \
+    > "$RESULTS_DIR/client.log" 2>&1 &
+CLIENT_PID=$!
+
+echo "[TEST] Running for $DURATION seconds..."
+sleep "$DURATION"
+
+echo "[STOP] Stopping client, proxy and server..."
+kill $CLIENT_PID 2>/dev/null
+# let delayed packets still in the proxy reach the server before stopping it
+sleep "$DRAIN_WAIT"
+kill $PROXY_PID 2>/dev/null
+kill $SERVER_PID 2>/dev/null
+wait $PROXY_PID $SERVER_PID 2>/dev/null
+
+echo "[ANALYSIS] Running metrics..."
+python3 "$ROOT_DIR/analysis/metrics.py" \
+    --csv "$RESULTS_DIR/logging.csv"
+
+echo "===================================================="
+echo "[DONE] $PROFILE test complete."
+echo "CSV saved to: $RESULTS_DIR/logging.csv"
+echo "Server log:   $RESULTS_DIR/server.log"
+echo "Proxy log:    $RESULTS_DIR/proxy.log"
+echo "Client log:   $RESULTS_DIR/client.log"
+echo "===================================================="